@@ -0,0 +1,54 @@
+"""add_usage_totals
+
+Revision ID: b7e2c91d4f10
+Revises: a3718e12aba7
+Create Date: 2026-10-19 10:12:41.302917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c91d4f10'
+down_revision = 'a3718e12aba7'
+branch_labels = None
+depends_on = None
+
+# Must match PROCESSING_TIME_SOFT_CAP_SECONDS / PROCESSING_TIME_DEFAULT_SECONDS
+SOFT_CAP_SECONDS = 15.0
+DEFAULT_SECONDS = 4.0
+
+
+def upgrade() -> None:
+    op.create_table('usage_totals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('total_users', sa.BigInteger(), nullable=False),
+    sa.Column('total_images_processed', sa.BigInteger(), nullable=False),
+    sa.Column('total_processing_time', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # One-off normalization (previously redone on every admin dashboard view):
+    # totals above the soft cap are backfilled with the default per-image time.
+    op.execute(f"""
+        UPDATE users
+        SET total_processing_time = CASE
+            WHEN total_processing_time IS NULL THEN 0.0
+            ELSE LEAST({SOFT_CAP_SECONDS} * total_images_processed, {DEFAULT_SECONDS} * total_images_processed)
+        END
+        WHERE total_images_processed > 0
+          AND (total_processing_time IS NULL OR total_processing_time > {SOFT_CAP_SECONDS} * total_images_processed)
+    """)
+
+    # Seed the running totals from the normalized table
+    op.execute("""
+        INSERT INTO usage_totals (id, total_users, total_images_processed, total_processing_time)
+        SELECT 1, COUNT(id), COALESCE(SUM(total_images_processed), 0), COALESCE(SUM(total_processing_time), 0.0)
+        FROM users
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('usage_totals')
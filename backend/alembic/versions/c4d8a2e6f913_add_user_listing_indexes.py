@@ -0,0 +1,34 @@
+"""add_user_listing_indexes
+
+Revision ID: c4d8a2e6f913
+Revises: b7e2c91d4f10
+Create Date: 2026-10-19 14:05:17.884210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8a2e6f913'
+down_revision = 'b7e2c91d4f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+    op.create_index('ix_users_role_created_at_id', 'users', ['role', 'created_at', 'id'], unique=False)
+    op.create_index('ix_users_oauth_provider_created_at_id', 'users', ['oauth_provider', 'created_at', 'id'], unique=False)
+    op.create_index('ix_users_last_upload_date', 'users', ['last_upload_date'], unique=False)
+    # Lets LIKE 'prefix%' use an index regardless of the database collation
+    op.create_index('ix_users_email_pattern', 'users', ['email'], unique=False,
+                    postgresql_ops={'email': 'varchar_pattern_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_email_pattern', table_name='users')
+    op.drop_index('ix_users_last_upload_date', table_name='users')
+    op.drop_index('ix_users_oauth_provider_created_at_id', table_name='users')
+    op.drop_index('ix_users_role_created_at_id', table_name='users')
+    op.drop_index('ix_users_created_at_id', table_name='users')
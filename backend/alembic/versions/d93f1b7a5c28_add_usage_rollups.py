@@ -0,0 +1,45 @@
+"""add_usage_rollups
+
+Revision ID: d93f1b7a5c28
+Revises: c4d8a2e6f913
+Create Date: 2026-10-19 15:32:08.417736
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93f1b7a5c28'
+down_revision = 'c4d8a2e6f913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('usage_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('subject', sa.String(), nullable=False),
+    sa.Column('images', sa.BigInteger(), nullable=False),
+    sa.Column('processing_seconds', sa.Float(), nullable=False),
+    sa.Column('bytes_in', sa.BigInteger(), nullable=False),
+    sa.Column('bytes_out', sa.BigInteger(), nullable=False),
+    sa.Column('failures', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'subject')
+    )
+    op.create_index('ix_usage_daily_subject_day', 'usage_daily', ['subject', 'day'], unique=False)
+    op.create_table('usage_hourly',
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('images', sa.BigInteger(), nullable=False),
+    sa.Column('processing_seconds', sa.Float(), nullable=False),
+    sa.Column('bytes_in', sa.BigInteger(), nullable=False),
+    sa.Column('bytes_out', sa.BigInteger(), nullable=False),
+    sa.Column('failures', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('hour')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('usage_hourly')
+    op.drop_index('ix_usage_daily_subject_day', table_name='usage_daily')
+    op.drop_table('usage_daily')
@@ -0,0 +1,59 @@
+"""add_processing_events
+
+Revision ID: e6a4c0b8d215
+Revises: d93f1b7a5c28
+Create Date: 2026-10-19 16:48:51.092364
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a4c0b8d215'
+down_revision = 'd93f1b7a5c28'
+branch_labels = None
+depends_on = None
+
+
+def _month_start(day: date, months_ahead: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months_ahead
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    op.create_table('processing_events',
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('model', sa.String(), nullable=True),
+    sa.Column('output_format', sa.String(), nullable=True),
+    sa.Column('megapixels', sa.Float(), nullable=True),
+    sa.Column('bytes_in', sa.Integer(), nullable=True),
+    sa.Column('bytes_out', sa.Integer(), nullable=True),
+    sa.Column('total_ms', sa.Float(), nullable=False),
+    sa.Column('queue_ms', sa.Float(), nullable=True),
+    sa.Column('decode_ms', sa.Float(), nullable=True),
+    sa.Column('inference_ms', sa.Float(), nullable=True),
+    sa.Column('postprocess_ms', sa.Float(), nullable=True),
+    sa.Column('encode_ms', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('created_at', 'id'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    if is_postgres:
+        # Current and next two months; the API's maintenance task keeps creating them
+        today = date.today()
+        for offset in range(3):
+            lower, upper = _month_start(today, offset), _month_start(today, offset + 1)
+            op.execute(
+                f"CREATE TABLE IF NOT EXISTS processing_events_{lower:%Y%m} PARTITION OF processing_events "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+
+
+def downgrade() -> None:
+    # Dropping the parent drops every partition
+    op.drop_table('processing_events')
@@ -1,21 +1,27 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_db
 from app.db import crud
-from app.core.security import decode_token
-from app.db.models import User, UserRole
+from app.core.security import decode_token_cached
+from app.db.models import UserRole
+from app.services.user_cache import CurrentUser, get_cached_user, cache_user
 
 security = HTTPBearer()
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user."""
+    db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
+    """
+    Get current authenticated user.
+    
+    Verified tokens and user projections are cached, so the common path
+    skips both the signature check and the database lookup.
+    """
     token = credentials.credentials
-    payload = decode_token(token)
+    payload = decode_token_cached(token)
     
     if not payload:
         raise HTTPException(
@@ -32,19 +38,23 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = crud.get_user_by_id(db, user_id)
-    if not user:
+    user = get_cached_user(user_id)
+    if user:
+        return user
+    
+    db_user = await crud.get_user_by_id(db, user_id)
+    if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return user
+    return cache_user(db_user)
 
 
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     """Check if current user is admin."""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -1,29 +1,38 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import base64
+from redis.exceptions import RedisError
 from app.db.base import get_db
 from app.db import crud
 from app.schemas.auth import UserResponse
+from app.schemas.admin import UserPage, UsageDailyPoint, UsageHourlyPoint, UsageSubjectTotals
+from app.db.models import UserRole, GLOBAL_SUBJECT, USAGE_METRICS, EVENT_TIMINGS
+from app.core.config import settings
 from app.api.dependencies import get_current_admin_user
-from app.db.models import User
+from app.services.user_cache import CurrentUser
+from app.services.admission import inference_admission
+from app.services.background_removal import peak_rss_mb
+from app.services import profiling
 
 router = APIRouter()
 
+MAX_USERS_PAGE_SIZE = 200
+
 
 @router.get("/stats")
 async def get_stats(
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get admin dashboard statistics."""
-    from sqlalchemy import func
-    
-    # Normalize any stale processing spikes before aggregation
-    crud.normalize_all_users_processing_stats(db)
-    
-    total_users = db.query(func.count(User.id)).scalar()
-    total_images_processed = db.query(func.sum(User.total_images_processed)).scalar()
-    total_processing_time = db.query(func.sum(User.total_processing_time)).scalar()
+    # Running totals are maintained alongside user writes - no table scans here
+    totals = await crud.get_usage_totals(db)
+    total_users = totals.total_users
+    total_images_processed = totals.total_images_processed
+    total_processing_time = totals.total_processing_time
     
     return {
         "total_users": total_users or 0,
@@ -33,23 +42,271 @@ async def get_stats(
     }
 
 
-@router.get("/users", response_model=List[UserResponse])
+def _encode_cursor(key) -> str:
+    created_at, user_id = key
+    raw = f"{created_at.isoformat()}|{user_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, user_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), user_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+@router.get("/users", response_model=UserPage)
 async def get_users(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
-):
-    """Get all users with their stats (admin only)."""
-    users = crud.get_users(db, skip, limit)
-    return [
-        UserResponse(
-            id=user.id,
-            email=user.email,
-            name=user.name,
-            role=user.role,
-            created_at=user.created_at
-        )
-        for user in users
-    ]
+    limit: int = Query(50, ge=1, le=MAX_USERS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    email_prefix: Optional[str] = None,
+    role: Optional[UserRole] = None,
+    oauth_provider: Optional[str] = Query(None, description="Provider name, or 'none' for password accounts"),
+    active_since: Optional[date] = None,
+    active_until: Optional[date] = None,
+    include_total: bool = False,
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List users newest first (admin only).
+    
+    Keyset-paginated: pass `next_cursor` back as `cursor` to get the next
+    page. Cost per page does not grow with depth, unlike OFFSET.
+    """
+    filters = dict(
+        email_prefix=email_prefix,
+        role=role,
+        oauth_provider=oauth_provider,
+        active_since=active_since,
+        active_until=active_until
+    )
+    after = _decode_cursor(cursor) if cursor else None
+    users, last_key = await crud.get_users_page(db, limit, after, **filters)
+    
+    return UserPage(
+        items=[
+            UserResponse(
+                id=user.id,
+                email=user.email,
+                name=user.name,
+                role=user.role,
+                created_at=user.created_at
+            )
+            for user in users
+        ],
+        next_cursor=_encode_cursor(last_key) if last_key else None,
+        total_estimate=await crud.estimate_user_count(db, **filters) if include_total else None
+    )
+
+
+@router.get("/metrics")
+async def get_metrics(
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """Runtime metrics for this API process (inference queue depth, shed counts, peak memory)."""
+    return {
+        "admission": inference_admission.metrics(),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def _usage_range(start: Optional[date], end: Optional[date]) -> tuple:
+    """Default to the last 30 days; reject inverted or oversized ranges."""
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days >= settings.USAGE_QUERY_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range must run forwards and span at most {settings.USAGE_QUERY_MAX_DAYS} days"
+        )
+    return start, end
+
+
+def _usage_metrics(row) -> dict:
+    metrics = {metric: getattr(row, metric) or 0 for metric in USAGE_METRICS}
+    metrics["avg_processing_seconds"] = (
+        round(metrics["processing_seconds"] / metrics["images"], 3) if metrics["images"] else None
+    )
+    return metrics
+
+
+@router.get("/usage/daily", response_model=List[UsageDailyPoint])
+async def get_usage_daily(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    subject: str = Query(GLOBAL_SUBJECT, description="User id, 'anonymous', or '*' for all traffic"),
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Daily usage series (inclusive range, days without traffic omitted)."""
+    start, end = _usage_range(start, end)
+    rows = await crud.get_usage_daily(db, start, end, subject)
+    return [UsageDailyPoint(day=row.day, **_usage_metrics(row)) for row in rows]
+
+
+@router.get("/usage/hourly", response_model=List[UsageHourlyPoint])
+async def get_usage_hourly(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Global hourly usage series for [start, end), default the last 48 hours."""
+    end = end or datetime.now()
+    start = start or end - timedelta(hours=48)
+    if start > end or end - start > timedelta(days=settings.USAGE_HOURLY_RETENTION_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range must run forwards and span at most {settings.USAGE_HOURLY_RETENTION_DAYS} days"
+        )
+    rows = await crud.get_usage_hourly(db, start, end)
+    return [UsageHourlyPoint(hour=row.hour, **_usage_metrics(row)) for row in rows]
+
 
+@router.get("/usage/top-users", response_model=List[UsageSubjectTotals])
+async def get_usage_top_users(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Users with the most images processed in the range."""
+    start, end = _usage_range(start, end)
+    rows = await crud.get_top_usage_subjects(db, start, end, limit)
+    return [UsageSubjectTotals(subject=row.subject, email=row.email, **_usage_metrics(row)) for row in rows]
+
+
+def _latency_window(start: Optional[datetime], end: Optional[datetime]) -> tuple:
+    """Default to the last 24 hours; reject inverted windows or ones past event retention."""
+    end = end or datetime.now()
+    start = start or end - timedelta(hours=24)
+    if start >= end or end - start > timedelta(days=settings.PROCESSING_EVENTS_RETENTION_DAYS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Window must run forwards and span at most {settings.PROCESSING_EVENTS_RETENTION_DAYS} days"
+        )
+    return start, end
+
+
+@router.get("/latency")
+async def get_latency(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    model: Optional[str] = None,
+    event_status: str = Query("ok", alias="status", pattern="^(ok|failed)$"),
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """p50/p95/p99/max of each processing stage (ms) over [start, end), from raw per-request events."""
+    start, end = _latency_window(start, end)
+    percentiles = await crud.get_latency_percentiles(
+        db, start, end, user_id=user_id, model=model, status=event_status
+    )
+    return {"start": start, "end": end, **percentiles}
+
+
+@router.get("/latency/series")
+async def get_latency_series(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = Query("hour", pattern="^(hour|day)$"),
+    timing: str = Query("total_ms", description=f"One of {', '.join(EVENT_TIMINGS)}"),
+    user_id: Optional[str] = None,
+    model: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Per-bucket p50/p95/p99/max of one stage timing (successful requests)."""
+    if timing not in EVENT_TIMINGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"timing must be one of {', '.join(EVENT_TIMINGS)}"
+        )
+    start, end = _latency_window(start, end)
+    return await crud.get_latency_series(db, start, end, bucket, timing, user_id=user_id, model=model)
+
+
+async def _acquire_profiling(user_id: str):
+    usage = await profiling.profiling_limiter.acquire(user_id)
+    if not usage.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"At most {usage.limit} profiles per hour",
+            headers={"Retry-After": str(usage.retry_after)}
+        )
+    return usage
+
+
+def _profile_response(samples, output_format: str, name: str, interval: float) -> Response:
+    body, media_type, filename = profiling.render(samples, output_format, name, interval)
+    return Response(content=body, media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.post("/profiling/sample")
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=settings.PROFILING_MAX_SECONDS),
+    interval_ms: float = Query(settings.PROFILING_DEFAULT_INTERVAL_MS, ge=1, le=100),
+    output_format: str = Query(profiling.COLLAPSED, alias="format", pattern="^(collapsed|speedscope)$"),
+    idle: bool = Query(False, description="Include threads blocked waiting for work"),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """
+    Sample the stacks of every thread in the worker serving this request for
+    `seconds`, and return them as collapsed stacks (flamegraph.pl) or a
+    speedscope flame graph. Only this worker process is profiled.
+    """
+    usage = await _acquire_profiling(current_user.id)
+    try:
+        samples = await profiling.sample_process(seconds, interval_ms / 1000, idle)
+    except profiling.ProfilerBusy:
+        await profiling.profiling_limiter.release(current_user.id, usage.token)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running in this worker"
+        )
+    name = f"quickbg-worker-{datetime.now():%Y%m%d-%H%M%S}"
+    return _profile_response(samples, output_format, name, interval_ms / 1000)
+
+
+@router.post("/profiling/token")
+async def create_profiling_token(
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """
+    Token for the X-Profile-Token header: a /process request from this admin
+    carrying it is profiled, and its X-Profile-Id response header names the result.
+    """
+    token, expires = profiling.sign_profile_token(current_user.id)
+    return {"header": profiling.PROFILE_TOKEN_HEADER, "token": token, "expires_at": datetime.fromtimestamp(expires)}
+
+
+@router.get("/profiling/results/{profile_id}")
+async def get_profiling_result(
+    profile_id: str,
+    output_format: str = Query(profiling.COLLAPSED, alias="format", pattern="^(collapsed|speedscope)$"),
+    current_user: CurrentUser = Depends(get_current_admin_user)
+):
+    """A per-request profile recorded through X-Profile-Token (kept for PROFILING_RESULT_TTL_SECONDS)."""
+    try:
+        samples = await profiling.load_profile(profile_id)
+    except RedisError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Profile store unavailable"
+        )
+    if samples is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found or expired"
+        )
+    return _profile_response(samples, output_format, f"quickbg-request-{profile_id}",
+                             settings.PROFILING_DEFAULT_INTERVAL_MS / 1000)
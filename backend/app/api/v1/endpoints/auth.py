@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_db
 from app.db import crud
-from app.core.security import verify_password, create_access_token
+from app.core.security import verify_and_update_password, get_password_hash_async, create_access_token
 from app.schemas.auth import (
     LoginResponse, RegisterRequest, UserResponse,
     ForgotPasswordRequest, ResetPasswordRequest, 
@@ -16,22 +16,22 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=UserResponse)
-async def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db)):
     """Register a new user."""
     # Check if user already exists
-    existing_user = crud.get_user_by_email(db, request.email)
+    existing_user = await crud.get_user_by_email(db, request.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    user = crud.create_user(
+    # Create new user (bcrypt runs in the hashing pool, not on the event loop)
+    user = await crud.create_user(
         db=db,
         email=request.email,
-        password=request.password,
-        name=request.name
+        name=request.name,
+        hashed_password=await get_password_hash_async(request.password)
     )
     
     return UserResponse(
@@ -46,14 +46,14 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
 @router.post("/login", response_model=LoginResponse)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Login user and return access token.
     
     Note: form_data.username contains the email address.
     """
     # Get user (username field contains email)
-    user = crud.get_user_by_email(db, form_data.username)
+    user = await crud.get_user_by_email(db, form_data.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -62,13 +62,18 @@ async def login(
         )
     
     # Verify password
-    if not verify_password(form_data.password, user.hashed_password):
+    is_valid, new_hash = await verify_and_update_password(form_data.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Transparently upgrade hashes made with an older work factor
+    if new_hash:
+        await crud.update_password_hash(db, user, new_hash)
+    
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -90,41 +95,32 @@ async def login(
 
 
 @router.post("/google-login", response_model=LoginResponse)
-async def google_login(request: GoogleLoginRequest, db: Session = Depends(get_db)):
+async def google_login(request: GoogleLoginRequest, db: AsyncSession = Depends(get_db)):
     """Login or register user via Google OAuth."""
-    from app.db.models import User
-    
     # Check if user exists by Google ID
-    user = db.query(User).filter(User.google_id == request.google_id).first()
+    user = await crud.get_user_by_google_id(db, request.google_id)
     
     if not user:
         # Check if user exists by email
-        user = db.query(User).filter(User.email == request.email).first()
+        user = await crud.get_user_by_email(db, request.email)
         
         if user:
             # Link Google account to existing user
-            user.google_id = request.google_id
-            user.avatar = request.avatar
-            user.oauth_provider = "google"
-            if not user.name:
-                user.name = request.name
+            user = await crud.link_google_account(
+                db, user,
+                google_id=request.google_id,
+                avatar=request.avatar,
+                name=request.name
+            )
         else:
             # Create new user with OAuth
-            user = User(
+            user = await crud.create_oauth_user(
+                db,
                 email=request.email,
                 name=request.name,
                 google_id=request.google_id,
-                avatar=request.avatar,
-                oauth_provider="google",
-                hashed_password=None,  # No password for OAuth users
-                total_images_processed=0,
-                images_processed_today=0,
-                total_processing_time=0.0
+                avatar=request.avatar
             )
-            db.add(user)
-        
-        db.commit()
-        db.refresh(user)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -147,9 +143,9 @@ async def google_login(request: GoogleLoginRequest, db: Session = Depends(get_db
 
 
 @router.post("/forgot-password", response_model=MessageResponse)
-async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
+async def forgot_password(request: ForgotPasswordRequest, db: AsyncSession = Depends(get_db)):
     """Generate password reset token and send email."""
-    user = crud.get_user_by_email(db, request.email)
+    user = await crud.get_user_by_email(db, request.email)
     
     if not user:
         # Return success for security (prevent email enumeration)
@@ -158,7 +154,7 @@ async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(
         )
     
     # Generate reset token
-    token = crud.create_password_reset_token(db, user)
+    token = await crud.create_password_reset_token(db, user)
     
     # Send email with reset link
     from app.services.email import send_password_reset_email
@@ -166,7 +162,7 @@ async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(
     logger = logging.getLogger(__name__)
     
     try:
-        await send_password_reset_email(user.email, token, user.name)
+        send_password_reset_email(user.email, token, user.name)
     except Exception as e:
         logger.error(f"Failed to send password reset email: {str(e)}", exc_info=True)
         # Still return success for security
@@ -177,9 +173,9 @@ async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(
 
 
 @router.post("/reset-password", response_model=MessageResponse)
-async def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_db)):
     """Reset password with valid token."""
-    user = crud.verify_reset_token(db, request.token)
+    user = await crud.verify_reset_token(db, request.token)
     
     if not user:
         raise HTTPException(
@@ -188,15 +184,15 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
         )
     
     # Reset password
-    crud.reset_user_password(db, user, request.new_password)
+    await crud.reset_user_password(db, user, hashed_password=await get_password_hash_async(request.new_password))
     
     return MessageResponse(message="Password reset successful")
 
 
 @router.get("/verify-reset-token/{token}", response_model=MessageResponse)
-async def verify_reset_token(token: str, db: Session = Depends(get_db)):
+async def verify_reset_token(token: str, db: AsyncSession = Depends(get_db)):
     """Verify if a reset token is valid."""
-    user = crud.verify_reset_token(db, token)
+    user = await crud.verify_reset_token(db, token)
     
     if not user:
         raise HTTPException(
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel, EmailStr
 from app.services.email import send_contact_email
+from app.services.mail_outbox import OutboxFull
 
 router = APIRouter()
 
@@ -25,17 +26,24 @@ async def submit_contact_form(request: ContactRequest):
     
     try:
         logger.info(f"Received contact form submission from {request.email}")
-        await send_contact_email(
+        send_contact_email(
             name=request.name,
             email=request.email,
             subject=request.subject,
             message=request.message
         )
-        logger.info(f"Successfully sent contact email for {request.email}")
+        logger.info(f"Queued contact email for {request.email}")
         return ContactResponse(
             success=True,
             message="Your message has been sent successfully!"
         )
+    except OutboxFull as e:
+        logger.error(f"Contact email not queued: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Email is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": "60"}
+        )
     except Exception as e:
         logger.error(f"Failed to send contact email: {str(e)}", exc_info=True)
         raise HTTPException(
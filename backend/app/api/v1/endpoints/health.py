@@ -1,40 +1,48 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 import logging
 
-from app.db.base import get_db
+from app.services.health import health_monitor
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
 @router.get("")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check():
     """
-    Health check endpoint.
+    Health summary (served from cached probe results, never touches dependencies).
     
     Checks:
     - API responsiveness
-    - Database connection
+    - Model warm-up, database (critical), Redis and S3 (informational)
     """
-    health_status = {
-        "status": "healthy",
+    snapshot = health_monitor.snapshot()
+    checks = {"api": "ok"}
+    for name, check in snapshot["checks"].items():
+        checks[name] = "ok" if check["ok"] else "error"
+    
+    return {
+        "status": "healthy" if snapshot["ready"] else "degraded",
         "service": "quickbg-backend",
-        "checks": {
-            "api": "ok",
-            "database": "unknown"
-        }
+        "checks": checks
     }
-    
-    # Check database
-    try:
-        db.execute(text("SELECT 1"))
-        health_status["checks"]["database"] = "ok"
-    except Exception as e:
-        logger.error(f"Database health check failed: {str(e)}")
-        health_status["checks"]["database"] = "error"
-        health_status["status"] = "degraded"
-    
-    return health_status
 
+
+@router.get("/live")
+async def liveness():
+    """Liveness: the process is up and its event loop is serving requests."""
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness():
+    """
+    Readiness: 200 once the model is warm and critical dependencies answered
+    their last background probe, 503 otherwise (including during warm-up).
+    """
+    snapshot = health_monitor.snapshot()
+    return JSONResponse(
+        status_code=200 if snapshot["ready"] else 503,
+        content={"status": "ready" if snapshot["ready"] else "not_ready", **snapshot}
+    )
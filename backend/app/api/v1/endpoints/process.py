@@ -1,121 +1,283 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status, Request
-from fastapi.responses import StreamingResponse, JSONResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+from fastapi.responses import Response, JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.base import get_db
 from app.db import crud
 from app.api.dependencies import get_current_user
-from app.db.models import User
+from app.services.user_cache import CurrentUser
 from app.services.background_removal import remove_background
+from app.core.tracing import record_span
 from app.core.config import settings
+from app.db.models import UserRole
+from app.services import profiling
+from app.services.rate_limit import anonymous_limiter
+from app.services.stats_buffer import record_processing, apply_pending_stats
+from app.services.usage_rollup import record_usage
+from app.services.processing_events import record_event
+from app.services.admission import inference_admission, Overloaded, AUTHENTICATED, ANONYMOUS
+from app.services.upload import read_image_uploads
+from app.services.image_budget import inference_cost
+from app.services.animation import output_error as animation_output_error
+from app.services.compositing import Background, parse_color, background_is_opaque, NONE, IMAGE, COVER
 import time
 import logging
-import tempfile
 import os
-from typing import Optional
+from typing import Literal, NamedTuple, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# In-memory storage for anonymous user limits
-# NOTE: In production, use Redis for distributed rate limiting across multiple servers
-anonymous_usage = {}
+# The upload is read from the request stream (see read_image_upload), so the
+# multipart body is declared here for the OpenAPI docs instead of via File()
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "background": {
+                            "type": "string",
+                            "format": "binary",
+                            "description": "Background image (with ?background=image)"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
 
 
-@router.post("/process-anonymous", response_class=StreamingResponse)
-async def process_image_anonymous(
-    request: Request,
-    file: UploadFile = File(...)
-):
-    """
-    Anonymous image processing - FREE 3 TRIES!
-    
-    No authentication required. Limited to 3 uploads per session/IP.
-    After 3 tries, user must sign up to continue.
-    """
-    temp_output_path = None
-    
-    try:
-        # Get client identifier (IP address for rate limiting)
-        client_ip = request.client.host
-        
-        # Check anonymous usage limit (5 free tries)
-        usage_count = anonymous_usage.get(client_ip, 0)
-        
-        if usage_count >= 5:
+# Multipart field carrying the uploaded background for background=image
+BACKGROUND_FIELD = "background"
+
+MEDIA_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+
+class OutputOptions(NamedTuple):
+    background: Optional[Background]  # Without the uploaded image; see _resolve_background()
+    output_format: str
+    guided_filter: Optional[bool] = None  # None = settings.GUIDED_FILTER_ENABLED
+
+
+def output_options(
+    background: Literal["none", "color", "gradient", "blur", "image"] = Query(
+        NONE, description="Replace the background: none (transparent), color, gradient, blur (of the original) "
+                          "or image (sent as the 'background' form field)"
+    ),
+    bg_color: str = Query("#ffffff", description="Solid color, gradient start, or padding for bg_fit=contain"),
+    bg_color_to: Optional[str] = Query(None, description="Gradient end color"),
+    bg_angle: float = Query(90.0, ge=0, le=360, description="Gradient direction in degrees (90 = top to bottom)"),
+    bg_blur: float = Query(20.0, gt=0, le=200, description="Blur radius in pixels for background=blur"),
+    bg_fit: Literal["cover", "contain", "stretch"] = Query(COVER, description="How a background image is fitted"),
+    output_format: Literal["auto", "png", "jpeg", "webp"] = Query(
+        "auto", description="auto = JPEG when the result is opaque, otherwise PNG; "
+                            "animated input gives animated WebP (or APNG with png)"
+    ),
+    guided_filter: Optional[bool] = Query(
+        None, description="Snap the mask to the photo's edges (fast guided filter); off unless the server enables it"
+    )
+) -> OutputOptions:
+    """Background replacement and output format options shared by the process endpoints."""
+    if background == NONE:
+        if output_format == "jpeg":
             raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Free trial limit reached! Sign up to continue removing backgrounds."
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="JPEG output needs an opaque result; choose a background"
             )
-        
-        # Validate file
-        if not file.content_type or not file.content_type.startswith("image/"):
+        return OutputOptions(None, output_format, guided_filter)
+    try:
+        spec = Background(
+            kind=background,
+            color=parse_color(bg_color),
+            color_to=parse_color(bg_color_to) if bg_color_to else None,
+            angle=bg_angle,
+            blur_radius=bg_blur,
+            fit=bg_fit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return OutputOptions(spec, output_format, guided_filter)
+
+
+def _resolve_background(options: OutputOptions, uploads: dict) -> Optional[Background]:
+    """Attach the uploaded background image and check the requested format fits the result."""
+    unsupported = animation_output_error(uploads["file"].estimate, options.output_format)
+    if unsupported:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=unsupported)
+    background = options.background
+    if background is not None and background.kind == IMAGE:
+        if BACKGROUND_FIELD not in uploads:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File must be an image"
+                detail=f"background=image needs the image in the '{BACKGROUND_FIELD}' form field"
             )
-        
-        # Read and validate file
-        logger.info(f"Processing anonymous image: {file.filename} from {client_ip}")
-        contents = await file.read()
-        
-        # Validate image
-        from app.services.background_removal import validate_image as validate_img
-        is_valid, error_msg, img_info = validate_img(contents, settings.MAX_IMAGE_SIZE_MB)
-        if not is_valid:
+        background = background._replace(image=uploads[BACKGROUND_FIELD].data)
+        if options.output_format == "jpeg" and not background_is_opaque(background):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=error_msg
+                detail="JPEG output needs an opaque result; the background image has transparency"
             )
-        
-        logger.info(f"Anonymous image validated: {img_info}")
+    return background
+
+
+def _download_headers(filename: str, output_format: str) -> dict:
+    original_name = os.path.splitext(filename)[0]
+    return {"Content-Disposition": f'attachment; filename="{original_name}_nobg.{EXTENSIONS[output_format]}"'}
+
+
+async def _request_profile(request: Request, current_user: CurrentUser) -> Tuple[Optional[dict], dict]:
+    """
+    (profile holder, response headers) for a request carrying a valid X-Profile-Token.
+
+    A bad token or an exhausted profiling budget never fails the request; it
+    is processed unprofiled and X-Profile-Skipped says why. The holder keeps
+    the limiter token so _release_profile() can hand the slot back.
+    """
+    token = request.headers.get(profiling.PROFILE_TOKEN_HEADER)
+    if token is None:
+        return None, {}
+    if current_user.role != UserRole.ADMIN or not profiling.verify_profile_token(token, current_user.id):
+        return None, {profiling.PROFILE_SKIPPED_HEADER: "invalid token"}
+    usage = await profiling.profiling_limiter.acquire(current_user.id)
+    if not usage.allowed:
+        return None, {profiling.PROFILE_SKIPPED_HEADER: "rate limited"}
+    return {"token": usage.token}, {}
+
+
+async def _release_profile(user_id: str, profile: Optional[dict]) -> None:
+    """Give back the profiling slot of a request that produced no profile."""
+    if profile is not None and not profile.get("id"):
+        await profiling.profiling_limiter.release(user_id, profile["token"])
+
+
+async def _run_inference(
+    priority: str,
+    contents: bytes,
+    memory_cost: int = 0,
+    background: Optional[Background] = None,
+    output_format: str = "png",
+    profile: Optional[dict] = None,
+    guided_filter: Optional[bool] = None
+):
+    """
+    Run remove_background() behind admission control (slots + memory budget); shed load as 503.
+
+    With `profile`, the thread running the call is sampled into profile["samples"].
+    """
+    func = remove_background
+    if profile is not None:
+        func = profiling.profiled(remove_background, profile, settings.PROFILING_DEFAULT_INTERVAL_MS / 1000)
+    try:
+        started = time.perf_counter()
+        processed_bytes, metadata = await inference_admission.run(
+            priority, func, contents,
+            cost=memory_cost, background=background, output_format=output_format, guided_filter=guided_filter
+        )
+        # Whatever the call itself did not account for was spent waiting for a slot
+        timings = metadata.get("timings_ms")
+        if timings:
+            timings["queue"] = round(max(0.0, (time.perf_counter() - started) * 1000 - timings["total"]), 2)
+            record_span("inference.queue", started, started + timings["queue"] / 1000, priority=priority)
+        return processed_bytes, metadata
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy processing other images. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def _record_failure(user_id: Optional[str], contents: Optional[bytes], start_time: Optional[float], status_code: int = 500) -> None:
+    """Count a server-side failure in the usage rollups and events (client errors are not failures)."""
+    if status_code >= 500:
+        record_usage(user_id, failures=1, bytes_in=len(contents or b""))
+        elapsed_ms = (time.time() - start_time) * 1000 if start_time else 0.0
+        record_event(user_id, "failed", elapsed_ms, bytes_in=len(contents) if contents else None)
+
+
+def _client_ip(request: Request) -> str:
+    """Client identifier for anonymous limits (no client info behind some proxies/test clients)."""
+    return request.client.host if request.client else "unknown"
+
+
+@router.post("/process-anonymous", response_class=Response, openapi_extra=UPLOAD_REQUEST_BODY)
+async def process_image_anonymous(
+    request: Request,
+    options: OutputOptions = Depends(output_options)
+):
+    """
+    Anonymous image processing - FREE TRIES!
+    
+    No authentication required. Limited to ANONYMOUS_FREE_TRIES uploads per IP
+    in a rolling ANONYMOUS_WINDOW_SECONDS window (shared across all workers).
+    Once used up, user must sign up (or wait for the window) to continue.
+    """
+    contents = None
+    start_time = None
+    
+    # Get client identifier (IP address for rate limiting)
+    client_ip = _client_ip(request)
+    
+    # Reserve one free try up front (atomic in Redis, shared by all workers).
+    # The reservation is given back below if processing fails.
+    usage = await anonymous_limiter.acquire(client_ip)
+    if not usage.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Free trial limit reached! Sign up to continue removing backgrounds.",
+            headers={"Retry-After": str(usage.retry_after)}
+        )
+    
+    try:
+        # Stream and validate the upload (rejects oversized/invalid files mid-upload)
+        uploads = await read_image_uploads(request, optional=(BACKGROUND_FIELD,))
+        upload = uploads["file"]
+        contents = upload.data
+        background = _resolve_background(options, uploads)
+        logger.info(f"Anonymous image validated: {upload.filename} from {client_ip}: {upload.info}")
         
         # Process image
         start_time = time.time()
-        processed_bytes, metadata = remove_background(contents)
+        processed_bytes, metadata = await _run_inference(
+            ANONYMOUS, contents, inference_cost(upload.estimate, background is not None, options.output_format),
+            background, options.output_format, guided_filter=options.guided_filter
+        )
         processing_time = time.time() - start_time
         
         logger.info(f"Anonymous processing completed in {processing_time:.2f}s")
+        record_usage(None, images=1, processing_seconds=processing_time,
+                     bytes_in=len(contents), bytes_out=len(processed_bytes))
+        record_event(None, "ok", processing_time * 1000, metadata,
+                     bytes_in=len(contents), bytes_out=len(processed_bytes))
         
-        # Increment anonymous usage
-        anonymous_usage[client_ip] = usage_count + 1
-        remaining_tries = 5 - (usage_count + 1)
+        remaining_tries = usage.remaining
         logger.info(f"Anonymous user {client_ip} has {remaining_tries} tries remaining")
         
-        # Save to temp file
-        temp_output_path = tempfile.NamedTemporaryFile(delete=False, suffix=".png").name
-        with open(temp_output_path, 'wb') as f:
-            f.write(processed_bytes)
-        
-        # Prepare file for download
-        def iterfile():
-            with open(temp_output_path, "rb") as f:
-                yield from f
-            try:
-                os.unlink(temp_output_path)
-            except Exception as e:
-                logger.error(f"Failed to delete temp file: {e}")
-        
-        # Generate output filename
-        original_name = os.path.splitext(file.filename)[0]
-        output_filename = f"{original_name}_nobg.png"
-        
-        return StreamingResponse(
-            iterfile(),
-            media_type="image/png",
+        # Sent straight from memory: no temp file round trip or re-chunking copies
+        output_format = metadata["output_format"]
+        return Response(
+            content=processed_bytes,
+            media_type=MEDIA_TYPES[output_format],
             headers={
-                "Content-Disposition": f'attachment; filename="{output_filename}"',
+                **_download_headers(upload.filename, output_format),
                 "X-Remaining-Tries": str(remaining_tries)  # Let frontend know how many tries left
             }
         )
         
-    except HTTPException:
-        if temp_output_path and os.path.exists(temp_output_path):
-            os.unlink(temp_output_path)
+    except HTTPException as e:
+        await anonymous_limiter.release(client_ip, usage.token)
+        _record_failure(None, contents, start_time, e.status_code)
         raise
     except Exception as e:
-        if temp_output_path and os.path.exists(temp_output_path):
-            os.unlink(temp_output_path)
+        await anonymous_limiter.release(client_ip, usage.token)
+        _record_failure(None, contents, start_time)
         
         logger.error(f"Anonymous processing failed: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -127,106 +289,87 @@ async def process_image_anonymous(
 @router.get("/anonymous-usage")
 async def check_anonymous_usage(request: Request):
     """Check how many free tries the anonymous user has left."""
-    client_ip = request.client.host
-    usage_count = anonymous_usage.get(client_ip, 0)
-    remaining_tries = max(0, 5 - usage_count)
+    client_ip = _client_ip(request)
+    usage = await anonymous_limiter.peek(client_ip)
     
     return {
-        "used": usage_count,
-        "remaining": remaining_tries,
-        "limit": 5,
-        "requires_signup": usage_count >= 5
+        "used": usage.used,
+        "remaining": usage.remaining,
+        "limit": usage.limit,
+        "requires_signup": usage.remaining == 0
     }
 
 
-@router.post("/process", response_class=StreamingResponse)
+@router.post("/process", response_class=Response, openapi_extra=UPLOAD_REQUEST_BODY)
 async def process_image(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    options: OutputOptions = Depends(output_options),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Instant image processing: Upload → Remove Background → Download
     
     No storage, no S3, just instant processing and download.
-    Returns the processed image directly as a downloadable file.
+    Returns the processed image directly as a downloadable file: a
+    transparent PNG, or - with a `background` - the composited image
+    (JPEG by default, since the result is opaque). Animated GIF/WebP/APNG
+    uploads come back as an animated WebP.
     """
-    temp_output_path = None
+    contents = None
+    start_time = None
+    profile, profile_headers = await _request_profile(request, current_user)
     
     try:
         # No rate limiting for logged-in users - unlimited usage
-        # Validate file
-        if not file.content_type or not file.content_type.startswith("image/"):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File must be an image"
-            )
-        
-        # Read and validate file
-        logger.info(f"Processing image: {file.filename} for user {current_user.email}")
-        contents = await file.read()
-        
-        # Validate image (checks size, format, dimensions)
-        from app.services.background_removal import validate_image as validate_img
-        is_valid, error_msg, img_info = validate_img(contents, settings.MAX_IMAGE_SIZE_MB)
-        if not is_valid:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=error_msg
-            )
-        
-        logger.info(f"Image validated successfully: {img_info}")
+        # Stream and validate the upload (checks size, format, dimensions as bytes arrive)
+        uploads = await read_image_uploads(request, optional=(BACKGROUND_FIELD,))
+        upload = uploads["file"]
+        contents = upload.data
+        background = _resolve_background(options, uploads)
+        logger.info(f"Image validated successfully: {upload.filename} for user {current_user.email}: {upload.info}")
         
         # Process image (remove background)
         start_time = time.time()
-        logger.info(f"Starting background removal for {file.filename}")
+        logger.info(f"Starting background removal for {upload.filename}")
         
-        # Call remove_background with bytes
-        processed_bytes, metadata = remove_background(contents)
+        # Call remove_background with bytes (admission-controlled, off the event loop)
+        processed_bytes, metadata = await _run_inference(
+            AUTHENTICATED, contents, inference_cost(upload.estimate, background is not None, options.output_format),
+            background, options.output_format, profile, options.guided_filter
+        )
         
         processing_time = time.time() - start_time
+        if profile is not None:
+            profile["id"] = await profiling.store_profile(profile["samples"])
+            if profile["id"]:
+                profile_headers[profiling.PROFILE_ID_HEADER] = profile["id"]
+            else:
+                await _release_profile(current_user.id, profile)
         logger.info(f"Background removal completed in {processing_time:.2f}s")
         
-        # Save processed image to temporary file for download
-        temp_output_path = tempfile.NamedTemporaryFile(delete=False, suffix=".png").name
-        with open(temp_output_path, 'wb') as f:
-            f.write(processed_bytes)
-        
         # Update user stats
-        crud.increment_user_stats(db, current_user.id, processing_time)
+        await record_processing(db, current_user.id, processing_time)
+        record_usage(current_user.id, images=1, processing_seconds=processing_time,
+                     bytes_in=len(contents), bytes_out=len(processed_bytes))
+        record_event(current_user.id, "ok", processing_time * 1000, metadata,
+                     bytes_in=len(contents), bytes_out=len(processed_bytes))
         logger.info(f"Updated stats for user {current_user.email}")
         
-        # Prepare file for download
-        def iterfile():
-            with open(temp_output_path, "rb") as f:
-                yield from f
-            # Clean up temp file after sending
-            try:
-                os.unlink(temp_output_path)
-            except Exception as e:
-                logger.error(f"Failed to delete temp file: {e}")
-        
-        # Generate output filename
-        original_name = os.path.splitext(file.filename)[0]
-        output_filename = f"{original_name}_nobg.png"
-        
-        return StreamingResponse(
-            iterfile(),
-            media_type="image/png",
-            headers={
-                "Content-Disposition": f'attachment; filename="{output_filename}"'
-            }
+        output_format = metadata["output_format"]
+        return Response(
+            content=processed_bytes,
+            media_type=MEDIA_TYPES[output_format],
+            headers={**_download_headers(upload.filename, output_format), **profile_headers}
         )
         
-    except HTTPException:
-        # Clean up temp file on error
-        if temp_output_path and os.path.exists(temp_output_path):
-            os.unlink(temp_output_path)
+    except HTTPException as e:
+        await _release_profile(current_user.id, profile)
+        _record_failure(current_user.id, contents, start_time, e.status_code)
         raise
     except Exception as e:
-        # Clean up temp file on error
-        if temp_output_path and os.path.exists(temp_output_path):
-            os.unlink(temp_output_path)
+        await _release_profile(current_user.id, profile)
+        _record_failure(current_user.id, contents, start_time)
         
         logger.error(f"Image processing failed: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -237,15 +380,15 @@ async def process_image(
 
 @router.get("/stats")
 async def get_user_stats(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's processing statistics."""
-    stats = crud.get_user_stats(db, current_user.id)
+    stats = await crud.get_user_stats(db, current_user.id)
     if not stats:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User stats not found"
         )
-    return stats
+    return await apply_pending_stats(stats, current_user.id)
 
@@ -0,0 +1,395 @@
+"""
+quickbg: remove backgrounds from a local folder of images.
+
+    python -m app.cli photos/ -o cutouts/ --workers 4
+    python -m app.cli "shoot/**/*.jpg" -o cutouts/ --format webp --background-color white
+
+Inputs are directories (searched recursively) or glob patterns. Outputs
+mirror the input tree under --output as <name>_nobg.<ext> (<name>_<source
+ext>_nobg.<ext> when a.jpg and a.png sit side by side); with inputs from
+several roots, each root's tree goes under a directory named after it. The
+output directory itself is never read as input. Each output is written to a
+temporary file and renamed into place, so a crash never leaves a truncated
+image. Every finished file is appended to a manifest in the output
+directory; running the same command again skips files already processed with
+the same options (and unchanged since), so an interrupted run resumes where
+it stopped. Failed files are retried on the next run.
+
+Each worker process loads its own copy of the model (~1GB RSS), so size
+--workers by memory as well as cores.
+"""
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+MANIFEST_NAME = ".quickbg-manifest.jsonl"
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+# Jobs queued per worker beyond the one it is running (keeps workers busy
+# without holding a future per file for huge folders)
+QUEUED_PER_WORKER = 2
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+
+class Options(NamedTuple):
+    output_format: str = "png"
+    background_color: Optional[str] = None
+    alpha_matting: bool = False
+    guided_filter: Optional[bool] = None  # None = settings.GUIDED_FILTER_ENABLED
+
+    def fingerprint(self) -> str:
+        """Stable string of the options that change the output (recorded in the manifest)."""
+        return json.dumps(self._asdict(), sort_keys=True)
+
+
+class Source(NamedTuple):
+    path: Path
+    relative: Path  # Under the input root (prefixed by the root's name if several); mirrored under the output directory
+    output_stem: str  # <output_stem>_nobg.<ext>: the file's stem, plus its extension if a sibling shares the stem
+
+
+def _glob_root(pattern: str) -> Path:
+    """The leading directories of a glob pattern, before its first wildcard."""
+    parts = []
+    for part in Path(pattern).parts[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return Path(*parts) if parts else Path(".")
+
+
+def _root_prefixes(roots: List[Path]) -> Dict[Path, Path]:
+    """
+    Directory each input root's files go under: none with a single root, else
+    the root's name (made unique), so a/x.jpg and b/x.jpg stay apart.
+    """
+    resolved = list(dict.fromkeys(root.resolve() for root in roots))
+    if len(resolved) == 1:
+        return {resolved[0]: Path()}
+    prefixes: Dict[Path, Path] = {}
+    for root in resolved:
+        name = root.name or "root"
+        prefix, number = name, 2
+        while Path(prefix) in prefixes.values():
+            prefix, number = f"{name}-{number}", number + 1
+        prefixes[root] = Path(prefix)
+    return prefixes
+
+
+def _output_stems(found: List[Tuple[Path, Path]]) -> List[Source]:
+    """Sources with their output stem; a stem shared in one directory (a.jpg, a.png) keeps the extension."""
+    def key(relative: Path) -> Tuple[Path, str]:
+        return relative.parent, relative.stem.lower()
+
+    counts = Counter(key(relative) for _, relative in found)
+    return [
+        Source(path, relative, relative.stem if counts[key(relative)] == 1 else f"{relative.stem}_{relative.suffix[1:]}")
+        for path, relative in found
+    ]
+
+
+def find_images(inputs: List[str], exclude: Optional[Path] = None) -> List[Source]:
+    """
+    Image files under the given directories or glob patterns, deduplicated, in
+    a stable order. Files under `exclude` (the output directory) are skipped.
+    """
+    walks = []
+    for value in inputs:
+        if Path(value).is_dir():
+            root = Path(value)
+            walks.append((root, root.rglob("*")))
+        else:
+            root = _glob_root(value)
+            walks.append((root, map(Path, glob.glob(value, recursive=True))))
+    prefixes = _root_prefixes([root for root, _ in walks])
+    excluded = exclude.resolve() if exclude is not None else None
+
+    found: Dict[Path, Tuple[Path, Path]] = {}
+    for root, paths in walks:
+        prefix = prefixes[root.resolve()]
+        for path in paths:
+            if not path.is_file() or path.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            resolved = path.resolve()
+            if excluded is not None and resolved.is_relative_to(excluded):
+                continue
+            found.setdefault(resolved, (path, prefix / path.relative_to(root)))
+    return _output_stems(sorted(found.values(), key=lambda item: str(item[1])))
+
+
+def output_path(output_dir: Path, source: Source, output_format: str) -> Path:
+    return output_dir / source.relative.parent / f"{source.output_stem}_nobg.{EXTENSIONS[output_format]}"
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write to a temporary file next to `path`, then rename it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporary, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, path)
+    finally:
+        if temporary.exists():
+            temporary.unlink()
+
+
+class Manifest:
+    """
+    Append-only JSONL record of processed files, one line per finished file.
+
+    The last line for a source wins. A line cut short by a crash is ignored,
+    so the file it described is simply processed again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["source"]] = entry
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = open(path, "a", encoding="utf-8")
+
+    def is_done(self, source: Source, options: Options, output_dir: Path) -> bool:
+        entry = self.entries.get(str(source.relative))
+        if entry is None or entry["status"] != "done" or entry["options"] != options.fingerprint():
+            return False
+        stat = source.path.stat()
+        return (
+            entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and (output_dir / entry["output"]).exists()
+        )
+
+    def record(self, entry: dict) -> None:
+        self.entries[entry["source"]] = entry
+        self._handle.write(json.dumps(entry) + "\n")
+        self._handle.flush()
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+def _init_worker(verbose: bool) -> None:
+    """Load the model once per worker process, before its first file."""
+    _configure_logging(verbose)
+    from app.services.background_removal import get_session
+    get_session()
+
+
+def process_file(source: Source, output_dir: Path, options: Options) -> dict:
+    """Process one file (in a worker) and return its manifest entry; errors are recorded, not raised."""
+    from app.services.background_removal import remove_background
+    from app.services.compositing import COLOR, Background, parse_color
+
+    stat = source.path.stat()
+    entry = {
+        "source": str(source.relative),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "options": options.fingerprint(),
+    }
+    started = time.perf_counter()
+    try:
+        background = None
+        if options.background_color:
+            background = Background(COLOR, color=parse_color(options.background_color))
+        output_bytes, metadata = remove_background(
+            source.path.read_bytes(),
+            alpha_matting=options.alpha_matting,
+            background=background,
+            output_format=options.output_format,
+            guided_filter=options.guided_filter
+        )
+        destination = output_path(output_dir, source, metadata["output_format"])
+        write_atomic(destination, output_bytes)
+        entry.update(status="done", output=str(destination.relative_to(output_dir)))
+    except Exception as e:
+        entry.update(status="failed", error=str(e))
+    entry["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return entry
+
+
+class Progress:
+    """Counts, throughput and ETA over the files actually processed (skipped ones are excluded)."""
+
+    def __init__(self, total: int, clock=time.monotonic):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self._clock = clock
+        self._started = clock()
+
+    def add(self, entry: dict) -> None:
+        self.done += 1
+        if entry["status"] != "done":
+            self.failed += 1
+
+    @property
+    def elapsed(self) -> float:
+        return self._clock() - self._started
+
+    @property
+    def rate(self) -> float:
+        """Files per second."""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate (None before the first file completes)."""
+        if not self.done:
+            return None
+        return (self.total - self.done) / self.rate
+
+    def line(self) -> str:
+        eta = self.eta()
+        return (
+            f"[{self.done}/{self.total}] {self.rate:.2f} img/s, "
+            f"ETA {_duration(eta) if eta is not None else '--'}, {self.failed} failed"
+        )
+
+
+def _duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def _run_inline(pending: List[Source], output_dir: Path, options: Options) -> Iterator[dict]:
+    for source in pending:
+        yield process_file(source, output_dir, options)
+
+
+def _run_pool(pending: List[Source], output_dir: Path, options: Options, workers: int, verbose: bool) -> Iterator[dict]:
+    # spawn: onnxruntime's thread pools do not survive fork
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(verbose,)
+    ) as executor:
+        queue = iter(pending)
+        running = set()
+        try:
+            while True:
+                for source in queue:
+                    running.add(executor.submit(process_file, source, output_dir, options))
+                    if len(running) >= workers * (1 + QUEUED_PER_WORKER):
+                        break
+                if not running:
+                    return
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+        finally:
+            for future in running:
+                future.cancel()
+
+
+def run(inputs: List[str], output_dir: Path, options: Options, workers: int = 1, force: bool = False, verbose: bool = False) -> Tuple[int, int, int]:
+    """
+    Process every image under `inputs` into `output_dir`.
+
+    Returns (processed, skipped, failed). workers=1 runs in this process
+    (no pool); more starts a process pool with one model per worker.
+    """
+    sources = find_images(inputs, exclude=output_dir)
+    manifest = Manifest(output_dir / MANIFEST_NAME)
+    pending = [source for source in sources if force or not manifest.is_done(source, options, output_dir)]
+    skipped = len(sources) - len(pending)
+    print(f"{len(sources)} images, {skipped} already done, {len(pending)} to process", file=sys.stderr)
+    progress = Progress(len(pending))
+    if workers <= 1:
+        results = _run_inline(pending, output_dir, options)
+    else:
+        results = _run_pool(pending, output_dir, options, workers, verbose)
+    last_report = 0.0
+    try:
+        for entry in results:
+            manifest.record(entry)
+            progress.add(entry)
+            if entry["status"] != "done":
+                print(f"failed: {entry['source']}: {entry['error']}", file=sys.stderr)
+            if progress.elapsed - last_report >= PROGRESS_INTERVAL_SECONDS or progress.done == progress.total:
+                print(progress.line(), file=sys.stderr)
+                last_report = progress.elapsed
+    finally:
+        manifest.close()
+    print(
+        f"Done in {_duration(progress.elapsed)}: {progress.done - progress.failed} processed, "
+        f"{skipped} skipped, {progress.failed} failed ({progress.rate:.2f} img/s)",
+        file=sys.stderr
+    )
+    return progress.done - progress.failed, skipped, progress.failed
+
+
+def _configure_logging(verbose: bool) -> None:
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format="%(asctime)s %(processName)s %(levelname)s %(name)s: %(message)s"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="quickbg",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns (quote them; ** is recursive)")
+    parser.add_argument("-o", "--output", required=True, type=Path, help="Output directory (holds the manifest)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Worker processes, one model each (default 1)")
+    parser.add_argument("--format", dest="output_format", choices=("auto", "png", "jpeg", "webp"), default="png")
+    parser.add_argument("--background-color", help="Composite onto this color ('#rrggbb' or a name) instead of transparency")
+    parser.add_argument("--alpha-matting", action="store_true", help="Narrow-band matting for hair and fur (slower)")
+    parser.add_argument(
+        "--guided-filter", action=argparse.BooleanOptionalAction, default=None,
+        help="Snap the mask to the photo's edges (default: GUIDED_FILTER_ENABLED)"
+    )
+    parser.add_argument("--force", action="store_true", help="Reprocess files the manifest lists as done")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.output_format == "jpeg" and not args.background_color:
+        parser.error("--format jpeg needs --background-color (JPEG has no transparency)")
+    if args.background_color:
+        from app.services.compositing import parse_color
+        try:
+            parse_color(args.background_color)
+        except ValueError as e:
+            parser.error(str(e))
+
+    _configure_logging(args.verbose)
+    options = Options(args.output_format, args.background_color, args.alpha_matting, args.guided_filter)
+    try:
+        _, _, failed = run(args.inputs, args.output, options, args.workers, args.force, args.verbose)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+    except BrokenProcessPool:
+        # A worker was killed (usually out of memory) or could not load the model
+        print("A worker process died; run again with fewer --workers to resume", file=sys.stderr)
+        return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
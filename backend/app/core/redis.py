@@ -0,0 +1,68 @@
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shared client - redis-py keeps a connection pool per client, so reuse it
+_client = None
+
+# asyncio clients, one per event loop: their connections belong to the loop
+# that opened them. The API has a single loop per worker; tests run several.
+_async_clients = weakref.WeakKeyDictionary()
+_async_factory = None
+
+
+def _connection_options() -> dict:
+    return {
+        "decode_responses": True,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        "health_check_interval": 30
+    }
+
+
+def get_redis() -> redis.Redis:
+    """Get or create the shared Redis client (blocking; for threads, scripts and Celery)."""
+    global _client
+    if _client is None:
+        logger.info("Initializing Redis client")
+        _client = redis.Redis.from_url(settings.REDIS_URL, **_connection_options())
+    return _client
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """Get or create the asyncio Redis client for the running event loop (use this in async code)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if _async_factory is not None:
+            client = _async_factory()
+        else:
+            logger.info("Initializing asyncio Redis client")
+            client = redis.asyncio.Redis.from_url(settings.REDIS_URL, **_connection_options())
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_redis() -> None:
+    """Close the running loop's asyncio client (on shutdown)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def set_redis(client, async_factory=None) -> None:
+    """
+    Replace the shared clients (used by tests to inject fakeredis).
+
+    `async_factory` builds an asyncio client; it is called once per event loop.
+    """
+    global _client, _async_factory
+    _client = client
+    _async_factory = async_factory
+    _async_clients.clear()
@@ -1,10 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.cache import TTLCache
+import asyncio
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds == default rounds, so raising BCRYPT_ROUNDS flags older hashes
+# for transparent rehash on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a small dedicated pool keeps hashing off the
+# event loop and caps how many CPU cores logins can take at once.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+
+# Verified token -> payload. Only successful decodes are cached, and never past "exp".
+_token_cache = TTLCache(
+    maxsize=settings.AUTH_TOKEN_CACHE_SIZE,
+    ttl=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+    clock=time.time
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -17,6 +42,35 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_hashing(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, func, *args)
+
+
+async def verify_password_async(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """Verify a password in the hashing pool (OAuth-only users have no hash)."""
+    if not hashed_password:
+        return False
+    return await _run_hashing(pwd_context.verify, plain_password, hashed_password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if its hash uses outdated settings, return a new hash.
+    
+    Returns:
+        Tuple of (is_valid, new_hash_or_None)
+    """
+    if not hashed_password:
+        return False, None
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool."""
+    return await _run_hashing(pwd_context.hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -38,3 +92,16 @@ def decode_token(token: str) -> dict:
     except JWTError:
         return None
 
+
+
+def decode_token_cached(token: str) -> Optional[dict]:
+    """Decode a JWT token, skipping signature verification for recently verified tokens."""
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
+    
+    payload = decode_token(token)
+    if payload:
+        exp = payload.get("exp")
+        _token_cache.set(token, payload, ttl=exp - time.time() if exp else None)
+    return payload
@@ -0,0 +1,351 @@
+"""
+Request tracing with OpenTelemetry-compatible IDs and W3C `traceparent` propagation.
+
+A span covers one stage of a request (upload read, DB query, inference
+queue, ISNet, PNG encode, S3 call, Celery task). Spans nest through
+contextvars, so they follow asyncio tasks and Starlette's threadpool, and
+the trace crosses into Celery through the task message headers. Finished
+spans go to the configured exporter as one JSON object each.
+
+Sampling is decided once per trace: a request that arrives with a
+traceparent follows its parent's decision, anything else is sampled with
+TRACING_SAMPLE_RATIO. An unsampled span keeps its IDs (so the decision
+propagates) but records nothing, which keeps the cost at full traffic to an
+object allocation per stage.
+"""
+import functools
+import inspect
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = "traceparent"
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+class SpanContext(NamedTuple):
+    trace_id: int  # 128 bits
+    span_id: int  # 64 bits
+    sampled: bool
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id:032x}-{self.span_id:016x}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """SpanContext from a W3C traceparent header (None if missing or malformed)."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        trace_id, span_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if not trace_id or not span_id:
+        return None
+    return SpanContext(trace_id, span_id, bool(flags & 1))
+
+
+class Span:
+    """One timed operation. Attributes are only kept when the trace is sampled."""
+
+    __slots__ = ("name", "context", "parent_id", "attributes", "start_ns", "end_ns", "status", "_exporter")
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[int], exporter, start_ns: int):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes: Dict[str, object] = {}
+        self.start_ns = start_ns
+        self.end_ns = None
+        self.status = "ok"
+        self._exporter = exporter
+
+    @property
+    def recording(self) -> bool:
+        return self.context.sampled and self._exporter is not None
+
+    def set_attribute(self, key: str, value) -> None:
+        if self.recording:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        if self.recording:
+            self.attributes.update(attributes)
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = "error"
+        self.set_attributes(**{"exception.type": type(error).__name__, "exception.message": str(error)[:500]})
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.recording:
+            try:
+                self._exporter.export(self.to_dict())
+            except Exception as e:
+                logger.warning(f"Span export failed: {e}")
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": f"{self.context.trace_id:032x}",
+            "span_id": f"{self.context.span_id:016x}",
+            "parent_span_id": f"{self.parent_id:016x}" if self.parent_id else None,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class ConsoleExporter:
+    """Each finished span as a JSON log line."""
+
+    def export(self, span: dict) -> None:
+        logger.info(json.dumps(span))
+
+
+class FileExporter:
+    """Finished spans appended to a JSONL file (one per line, safe across threads)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._handle = None
+
+    def export(self, span: dict) -> None:
+        line = json.dumps(span) + "\n"
+        with self._lock:
+            if self._handle is None:
+                self._handle = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._handle.write(line)
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list (tests and debugging)."""
+
+    def __init__(self):
+        self.spans: List[dict] = []
+
+    def export(self, span: dict) -> None:
+        self.spans.append(span)
+
+
+def make_exporter(kind: str):
+    if kind == "console":
+        return ConsoleExporter()
+    if kind == "file":
+        return FileExporter(settings.TRACING_FILE)
+    return None
+
+
+# The span (or remote parent) new spans are children of
+_current: ContextVar[Optional[SpanContext]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_ratio: float = 0.0, rng: Optional[random.Random] = None):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+        self._random = rng or random.Random()
+
+    def configure(self, exporter=None, sample_ratio: Optional[float] = None) -> None:
+        self.exporter = exporter
+        if sample_ratio is not None:
+            self.sample_ratio = sample_ratio
+
+    def start_span(self, name: str, parent: Optional[SpanContext] = None, start_ns: Optional[int] = None, **attributes) -> Span:
+        """A new span under `parent` (default: the current span); it does not become current."""
+        parent = parent or _current.get()
+        if parent is not None:
+            trace_id, sampled = parent.trace_id, parent.sampled
+        else:
+            trace_id = self._random.getrandbits(128) or 1
+            sampled = self.exporter is not None and self._random.random() < self.sample_ratio
+        context = SpanContext(trace_id, self._random.getrandbits(64) or 1, sampled)
+        span = Span(name, context, parent.span_id if parent else None, self.exporter, start_ns or time.time_ns())
+        if attributes:
+            span.set_attributes(**attributes)
+        return span
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, **attributes) -> Iterator[Span]:
+        """Run the block in a new current span; exceptions mark it as failed and propagate."""
+        span = self.start_span(name, parent, **attributes)
+        token = _current.set(span.context)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def record_span(self, name: str, start: float, end: float, **attributes) -> None:
+        """A finished child of the current span from two time.perf_counter() readings."""
+        parent = _current.get()
+        if parent is None or not parent.sampled or self.exporter is None:
+            return
+        offset = time.time_ns() - time.perf_counter_ns()
+        span = self.start_span(name, parent, start_ns=offset + int(start * 1e9), **attributes)
+        span.end(offset + int(end * 1e9))
+
+
+tracer = Tracer(make_exporter(settings.TRACING_EXPORTER), settings.TRACING_SAMPLE_RATIO)
+
+
+def span(name: str, **attributes):
+    """Context manager: `with span("s3.get_object", key=key) as s: ...`."""
+    return tracer.span(name, **attributes)
+
+
+def record_span(name: str, start: float, end: float, **attributes) -> None:
+    tracer.record_span(name, start, end, **attributes)
+
+
+def current_context() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def traced(name: str) -> Callable:
+    """Decorator: run each call (sync or async) in its own span."""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def inject(headers: dict) -> dict:
+    """Add the current trace's traceparent to outgoing headers (in place)."""
+    context = _current.get()
+    if context is not None:
+        headers[TRACEPARENT] = context.traceparent()
+    return headers
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: one server span per HTTP request, continuing the
+    caller's traceparent. The trace ID is returned as X-Trace-Id so a slow
+    response can be looked up.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        parent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+        with tracer.span(f"{scope['method']} {scope['path']}", parent, **{
+            "http.method": scope["method"], "http.target": scope["path"]
+        }) as server_span:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server_span.status = "error"
+                    headers = list(message.get("headers", []))
+                    headers.append((TRACE_ID_HEADER.lower().encode(), f"{server_span.context.trace_id:032x}".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+            route = scope.get("route")
+            if route is not None and server_span.recording:
+                server_span.name = f"{scope['method']} {route.path}"
+                server_span.set_attribute("http.route", route.path)
+
+
+def instrument_sqlalchemy(engine) -> None:
+    """A db.query span per statement executed on a (sync) engine; use async_engine.sync_engine for async."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            context._trace_span = tracer.start_span("db.query", **{"db.statement": statement[:300]})
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        query_span = getattr(context, "_trace_span", None)
+        if query_span is not None:
+            query_span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def fail_query(exception_context):
+        query_span = getattr(exception_context.execution_context, "_trace_span", None)
+        if query_span is not None:
+            query_span.record_exception(exception_context.original_exception)
+            query_span.end()
+
+
+# Celery task id -> (span, contextvar token), between task_prerun and task_postrun
+_task_spans: Dict[str, tuple] = {}
+
+
+def instrument_celery() -> None:
+    """Carry the trace in Celery message headers and run each task in a span continuing it."""
+    from celery import signals
+
+    # dispatch_uid: calling this again (another app in the process) does not double-connect
+    @signals.before_task_publish.connect(weak=False, dispatch_uid="quickbg.tracing.inject")
+    def inject_headers(headers=None, **kwargs):
+        if headers is not None:
+            inject(headers)
+
+    @signals.task_prerun.connect(weak=False, dispatch_uid="quickbg.tracing.task_prerun")
+    def start_task(task_id=None, task=None, **kwargs):
+        request = task.request
+        parent = parse_traceparent(
+            getattr(request, TRACEPARENT, None) or (getattr(request, "headers", None) or {}).get(TRACEPARENT)
+        )
+        task_span = tracer.start_span(f"celery.task {task.name}", parent, **{
+            "celery.task_id": task_id, "celery.retries": request.retries or 0
+        })
+        _task_spans[task_id] = (task_span, _current.set(task_span.context))
+
+    @signals.task_failure.connect(weak=False, dispatch_uid="quickbg.tracing.task_failure")
+    def fail_task(task_id=None, exception=None, **kwargs):
+        entry = _task_spans.get(task_id)
+        if entry is not None and exception is not None:
+            entry[0].record_exception(exception)
+
+    @signals.task_postrun.connect(weak=False, dispatch_uid="quickbg.tracing.task_postrun")
+    def end_task(task_id=None, state=None, **kwargs):
+        entry = _task_spans.pop(task_id, None)
+        if entry is None:
+            return
+        task_span, token = entry
+        task_span.set_attribute("celery.state", state)
+        _current.reset(token)
+        task_span.end()
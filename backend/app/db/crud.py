@@ -1,26 +1,47 @@
-from sqlalchemy.orm import Session
-from typing import Optional, List
+from sqlalchemy import select, insert, update, delete, bindparam, case, func, text, tuple_, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Iterable, Tuple
 from datetime import date, datetime, timedelta
 import secrets
-from app.db.models import User, UserRole
-from app.core.security import get_password_hash
+import json
+from app.db.models import (
+    User, UserRole, UsageTotals, UsageDaily, UsageHourly, ProcessingEvent,
+    GLOBAL_SUBJECT, ANONYMOUS_SUBJECT, USAGE_METRICS, EVENT_TIMINGS
+)
+from app.core.security import get_password_hash_async
 from app.core.config import settings
+from app.services.user_cache import invalidate_user
 
 
 # User CRUD operations
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     """Get user by email."""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
 
-def get_user_by_id(db: Session, user_id: str) -> Optional[User]:
+async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
     """Get user by ID."""
-    return db.query(User).filter(User.id == user_id).first()
+    return await db.get(User, user_id)
 
 
-def create_user(db: Session, email: str, password: str, name: Optional[str] = None, role: UserRole = UserRole.USER) -> User:
-    """Create a new user."""
-    hashed_password = get_password_hash(password)
+async def get_user_by_google_id(db: AsyncSession, google_id: str) -> Optional[User]:
+    """Get user by linked Google account ID."""
+    result = await db.execute(select(User).where(User.google_id == google_id))
+    return result.scalars().first()
+
+
+async def create_user(
+    db: AsyncSession,
+    email: str,
+    password: Optional[str] = None,
+    name: Optional[str] = None,
+    role: UserRole = UserRole.USER,
+    hashed_password: Optional[str] = None
+) -> User:
+    """Create a new user (pass hashed_password if it was already hashed)."""
+    if hashed_password is None:
+        hashed_password = await get_password_hash_async(password)
     user = User(
         email=email,
         name=name,
@@ -31,14 +52,133 @@ def create_user(db: Session, email: str, password: str, name: Optional[str] = No
         total_processing_time=0.0
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.flush()
+    await _bump_usage_totals(db, users=1)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+async def create_oauth_user(db: AsyncSession, email: str, name: Optional[str], google_id: str, avatar: Optional[str]) -> User:
+    """Create a new user from a Google login (no password)."""
+    user = User(
+        email=email,
+        name=name,
+        google_id=google_id,
+        avatar=avatar,
+        oauth_provider="google",
+        hashed_password=None,  # No password for OAuth users
+        total_images_processed=0,
+        images_processed_today=0,
+        total_processing_time=0.0
+    )
+    db.add(user)
+    await db.flush()
+    await _bump_usage_totals(db, users=1)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+async def update_user_role(db: AsyncSession, user: User, role: UserRole) -> User:
+    """Change a user's role (other workers see it within AUTH_USER_CACHE_TTL_SECONDS; see user_cache)."""
+    user.role = role
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
     return user
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-    """Get list of users."""
-    return db.query(User).offset(skip).limit(limit).all()
+async def link_google_account(db: AsyncSession, user: User, google_id: str, avatar: Optional[str], name: Optional[str]) -> User:
+    """Link a Google account to an existing user."""
+    user.google_id = google_id
+    user.avatar = avatar
+    user.oauth_provider = "google"
+    if not user.name:
+        user.name = name
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
+    return user
+
+
+def _user_list_filters(
+    email_prefix: Optional[str] = None,
+    role: Optional[UserRole] = None,
+    oauth_provider: Optional[str] = None,
+    active_since: Optional[date] = None,
+    active_until: Optional[date] = None
+) -> list:
+    """WHERE clauses for the admin user listing."""
+    conditions = []
+    if email_prefix:
+        escaped = email_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append(User.email.like(f"{escaped}%", escape="\\"))
+    if role:
+        conditions.append(User.role == role)
+    if oauth_provider == "none":
+        conditions.append(User.oauth_provider.is_(None))
+    elif oauth_provider:
+        conditions.append(User.oauth_provider == oauth_provider)
+    if active_since:
+        conditions.append(User.last_upload_date >= active_since)
+    if active_until:
+        conditions.append(User.last_upload_date <= active_until)
+    return conditions
+
+
+async def get_users_page(
+    db: AsyncSession,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, str]] = None,
+    **filters
+) -> Tuple[List[User], Optional[Tuple[datetime, str]]]:
+    """
+    Keyset page of users, newest first, ordered by (created_at, id).
+    
+    Args:
+        limit: Page size
+        after: (created_at, id) of the last row of the previous page
+        filters: See _user_list_filters
+    
+    Returns:
+        Tuple of (users, key_of_last_row_or_None_if_no_more_pages)
+    """
+    stmt = select(User).where(*_user_list_filters(**filters))
+    if after:
+        stmt = stmt.where(tuple_(User.created_at, User.id) < tuple_(*after))
+    stmt = stmt.order_by(User.created_at.desc(), User.id.desc()).limit(limit + 1)
+    
+    users = list((await db.execute(stmt)).scalars().all())
+    
+    if len(users) <= limit:
+        return users, None
+    users = users[:limit]
+    return users, (users[-1].created_at, users[-1].id)
+
+
+async def estimate_user_count(db: AsyncSession, **filters) -> int:
+    """
+    Approximate number of users matching the listing filters.
+    
+    On Postgres this reads the planner's estimate (pg_class.reltuples for the
+    unfiltered table, EXPLAIN row estimate otherwise) instead of counting.
+    Other databases get an exact COUNT.
+    """
+    conditions = _user_list_filters(**filters)
+    if db.bind.dialect.name == "postgresql":
+        if not conditions:
+            estimate = await db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"))
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        else:
+            compiled = select(User.id).where(*conditions).compile(
+                dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+            )
+            plan = await db.scalar(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return int(plan[0]["Plan"]["Plan Rows"])
+    return await db.scalar(select(func.count(User.id)).where(*conditions))
 
 
 def _clamp_processing_time(processing_time: float) -> float:
@@ -50,25 +190,57 @@ def _clamp_processing_time(processing_time: float) -> float:
     return processing_time
 
 
-def increment_user_stats(db: Session, user_id: str, processing_time: float) -> Optional[User]:
-    """Increment user's image processing statistics."""
-    user = db.query(User).filter(User.id == user_id).first()
-    if user:
-        today = date.today()
-        
-        # Reset daily count if it's a new day
-        if user.last_upload_date != today:
-            user.images_processed_today = 0
-        
-        # Update stats
-        user.total_images_processed += 1
-        user.images_processed_today += 1
-        user.last_upload_date = today
-        user.total_processing_time += _clamp_processing_time(processing_time)
-        
-        db.commit()
-        db.refresh(user)
-    return user
+def _user_stats_increment_statement():
+    """
+    Atomic `x = x + :delta` update for one user and one day.
+    
+    Day rollover happens in SQL: a delta for the stored day adds to today's
+    count, a newer day restarts it, and a late delta for an older day only
+    touches the running totals.
+    """
+    users = User.__table__
+    day = bindparam("b_day")
+    images = bindparam("b_images")
+    return (
+        update(users)
+        .where(users.c.id == bindparam("b_user_id"))
+        .values(
+            total_images_processed=func.coalesce(users.c.total_images_processed, 0) + images,
+            images_processed_today=case(
+                (users.c.last_upload_date == day, func.coalesce(users.c.images_processed_today, 0) + images),
+                (users.c.last_upload_date > day, users.c.images_processed_today),
+                else_=images
+            ),
+            last_upload_date=case(
+                (users.c.last_upload_date > day, users.c.last_upload_date),
+                else_=day
+            ),
+            total_processing_time=func.coalesce(users.c.total_processing_time, 0.0) + bindparam("b_seconds")
+        )
+    )
+
+
+async def apply_user_stats_deltas(db: AsyncSession, day: date, deltas: Iterable[tuple]) -> int:
+    """
+    Apply batched (user_id, images, seconds) deltas for `day` in one executemany.
+    
+    Returns:
+        Number of users updated
+    """
+    params = [
+        {"b_user_id": user_id, "b_images": int(images), "b_seconds": float(seconds), "b_day": day}
+        for user_id, images, seconds in deltas
+    ]
+    if not params:
+        return 0
+    await db.execute(_user_stats_increment_statement(), params)
+    await _bump_usage_totals(
+        db,
+        images=sum(p["b_images"] for p in params),
+        seconds=sum(p["b_seconds"] for p in params)
+    )
+    await db.commit()
+    return len(params)
 
 
 def _normalize_user_processing_time(user: User) -> bool:
@@ -87,17 +259,19 @@ def _normalize_user_processing_time(user: User) -> bool:
     return False
 
 
-def get_user_stats(db: Session, user_id: str) -> Optional[dict]:
+async def get_user_stats(db: AsyncSession, user_id: str) -> Optional[dict]:
     """Get user's processing statistics."""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await get_user_by_id(db, user_id)
     if user:
+        previous_time = user.total_processing_time or 0.0
         if _normalize_user_processing_time(user):
-            db.commit()
-            db.refresh(user)
+            await _bump_usage_totals(db, seconds=user.total_processing_time - previous_time)
+            await db.commit()
+            await db.refresh(user)
         today = date.today()
         # Reset today's count if it's old data
         images_today = user.images_processed_today if user.last_upload_date == today else 0
-        
+
         return {
             "total_images_processed": user.total_images_processed,
             "images_processed_today": images_today,
@@ -107,42 +281,369 @@ def get_user_stats(db: Session, user_id: str) -> Optional[dict]:
     return None
 
 
-def normalize_all_users_processing_stats(db: Session) -> None:
-    """Normalize processing totals for all users to avoid stale spikes."""
-    users = db.query(User).filter(User.total_images_processed > 0).all()
-    updated = False
-    for user in users:
-        if _normalize_user_processing_time(user):
-            updated = True
-    if updated:
-        db.commit()
+# Dashboard aggregates (single row, updated in the same transaction as the users it counts)
+async def rebuild_usage_totals(db: AsyncSession) -> UsageTotals:
+    """Recompute totals from the users table (one full scan; for bootstrap/repair only)."""
+    row = (await db.execute(
+        select(
+            func.count(User.id),
+            func.coalesce(func.sum(User.total_images_processed), 0),
+            func.coalesce(func.sum(User.total_processing_time), 0.0)
+        )
+    )).one()
+    totals = await db.get(UsageTotals, 1)
+    if totals is None:
+        totals = UsageTotals(id=1)
+        db.add(totals)
+    totals.total_users = row[0]
+    totals.total_images_processed = int(row[1])
+    totals.total_processing_time = float(row[2])
+    await db.flush()
+    return totals
+
+
+async def _bump_usage_totals(db: AsyncSession, users: int = 0, images: int = 0, seconds: float = 0.0) -> None:
+    """Apply deltas to the totals row (caller commits)."""
+    result = await db.execute(
+        update(UsageTotals)
+        .where(UsageTotals.id == 1)
+        .values(
+            total_users=UsageTotals.total_users + users,
+            total_images_processed=UsageTotals.total_images_processed + images,
+            total_processing_time=UsageTotals.total_processing_time + seconds
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        # No totals row yet (fresh database): build it, including this transaction's changes
+        await rebuild_usage_totals(db)
+
+
+async def get_usage_totals(db: AsyncSession) -> UsageTotals:
+    """Dashboard totals in O(1)."""
+    totals = await db.get(UsageTotals, 1)
+    if totals is None:
+        totals = await rebuild_usage_totals(db)
+        await db.commit()
+    return totals
+
+
+# Usage rollups (time series; fed in batches by app.services.usage_rollup)
+def _upsert_increment(db: AsyncSession, table, key_columns: list):
+    """INSERT ... ON CONFLICT (key) DO UPDATE SET metric = metric + excluded.metric."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={metric: table.c[metric] + stmt.excluded[metric] for metric in USAGE_METRICS}
+    )
+
+
+async def apply_usage_rollups(db: AsyncSession, daily: List[dict], hourly: List[dict]) -> None:
+    """
+    Add buffered usage deltas to the rollup tables in one transaction.
+    
+    Args:
+        daily: Rows with day, subject and USAGE_METRICS deltas
+        hourly: Rows with hour and USAGE_METRICS deltas
+    """
+    if daily:
+        await db.execute(_upsert_increment(db, UsageDaily.__table__, ["day", "subject"]), daily)
+    if hourly:
+        await db.execute(_upsert_increment(db, UsageHourly.__table__, ["hour"]), hourly)
+    await db.commit()
+
+
+async def get_usage_daily(db: AsyncSession, start: date, end: date, subject: str = GLOBAL_SUBJECT) -> List[UsageDaily]:
+    """Daily rollup rows for one subject, oldest first (days without traffic are absent)."""
+    result = await db.execute(
+        select(UsageDaily)
+        .where(UsageDaily.subject == subject, UsageDaily.day >= start, UsageDaily.day <= end)
+        .order_by(UsageDaily.day)
+    )
+    return list(result.scalars().all())
+
+
+async def get_usage_hourly(db: AsyncSession, start: datetime, end: datetime) -> List[UsageHourly]:
+    """Global hourly rollup rows in [start, end), oldest first."""
+    result = await db.execute(
+        select(UsageHourly)
+        .where(UsageHourly.hour >= start, UsageHourly.hour < end)
+        .order_by(UsageHourly.hour)
+    )
+    return list(result.scalars().all())
+
+
+async def get_top_usage_subjects(db: AsyncSession, start: date, end: date, limit: int = 20) -> list:
+    """Heaviest users by images processed over a day range (rows: subject, email, summed USAGE_METRICS)."""
+    result = await db.execute(
+        select(
+            UsageDaily.subject,
+            User.email,
+            *[func.sum(UsageDaily.__table__.c[metric]).label(metric) for metric in USAGE_METRICS]
+        )
+        .outerjoin(User, User.id == UsageDaily.subject)
+        .where(UsageDaily.day >= start, UsageDaily.day <= end)
+        .where(UsageDaily.subject.notin_([GLOBAL_SUBJECT, ANONYMOUS_SUBJECT]))
+        .group_by(UsageDaily.subject, User.email)
+        .order_by(func.sum(UsageDaily.images).desc())
+        .limit(limit)
+    )
+    return list(result.all())
+
+
+async def compact_usage_rollups(db: AsyncSession, today: Optional[date] = None) -> dict:
+    """
+    Enforce rollup retention.
+    
+    Hourly rows older than USAGE_HOURLY_RETENTION_DAYS and per-user daily
+    rows older than USAGE_USER_DAILY_RETENTION_DAYS are deleted. Global and
+    anonymous daily rows (one each per day) are kept indefinitely.
+    
+    Returns:
+        Number of rows deleted per table
+    """
+    today = today or date.today()
+    hourly_cutoff = datetime.combine(today - timedelta(days=settings.USAGE_HOURLY_RETENTION_DAYS), datetime.min.time())
+    daily_cutoff = today - timedelta(days=settings.USAGE_USER_DAILY_RETENTION_DAYS)
+    
+    hourly = await db.execute(delete(UsageHourly).where(UsageHourly.hour < hourly_cutoff))
+    daily = await db.execute(
+        delete(UsageDaily)
+        .where(UsageDaily.day < daily_cutoff)
+        .where(UsageDaily.subject.notin_([GLOBAL_SUBJECT, ANONYMOUS_SUBJECT]))
+    )
+    await db.commit()
+    return {"usage_hourly": hourly.rowcount, "usage_daily": daily.rowcount}
+
+
+# Processing events (raw per-request timings; fed in batches by app.services.processing_events)
+async def insert_processing_events(db: AsyncSession, events: List[dict]) -> int:
+    """Append a batch of events with one executemany."""
+    if not events:
+        return 0
+    await db.execute(insert(ProcessingEvent.__table__), events)
+    await db.commit()
+    return len(events)
+
+
+def _event_filters(start: datetime, end: datetime, user_id: Optional[str] = None,
+                   model: Optional[str] = None, status: Optional[str] = "ok") -> list:
+    table = ProcessingEvent.__table__
+    conditions = [table.c.created_at >= start, table.c.created_at < end]
+    if user_id:
+        conditions.append(table.c.user_id == user_id)
+    if model:
+        conditions.append(table.c.model == model)
+    if status:
+        conditions.append(table.c.status == status)
+    return conditions
+
+
+def _percentile_cont(ordered: list, fraction: float) -> Optional[float]:
+    """Linear-interpolated percentile of a sorted list (same definition as Postgres percentile_cont)."""
+    if not ordered:
+        return None
+    position = fraction * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _pg_percentiles(column, fractions: tuple):
+    """percentile_cont(ARRAY[...]) WITHIN GROUP (ORDER BY column), fractions inlined as float8[]."""
+    fractions_sql = ", ".join(repr(float(f)) for f in fractions)
+    return func.percentile_cont(literal_column(f"ARRAY[{fractions_sql}]::float8[]")).within_group(column)
+
+
+def _percentile_summary(values: Iterable[Optional[float]], fractions: tuple) -> dict:
+    ordered = sorted(value for value in values if value is not None)
+    summary = {f"p{round(f * 100)}": _percentile_cont(ordered, f) for f in fractions}
+    summary["max"] = ordered[-1] if ordered else None
+    return summary
+
+
+async def get_latency_percentiles(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    fractions: tuple = (0.5, 0.95, 0.99),
+    **filters
+) -> dict:
+    """
+    Percentiles of every stage timing over [start, end).
+    
+    Postgres computes them with percentile_cont in one pass; other databases
+    (SQLite in development/tests) sort in Python.
+    
+    Returns:
+        {"count": n, "<timing>": {"p50": ..., "p95": ..., "p99": ..., "max": ...}, ...}
+    """
+    table = ProcessingEvent.__table__
+    conditions = _event_filters(start, end, **filters)
+    
+    if db.bind.dialect.name == "postgresql":
+        columns = [func.count()]
+        for name in EVENT_TIMINGS:
+            columns.append(_pg_percentiles(table.c[name], fractions))
+            columns.append(func.max(table.c[name]))
+        row = (await db.execute(select(*columns).where(*conditions))).one()
+        result = {"count": row[0]}
+        for index, name in enumerate(EVENT_TIMINGS):
+            values, maximum = row[1 + 2 * index], row[2 + 2 * index]
+            result[name] = {f"p{round(f * 100)}": (values[i] if values else None) for i, f in enumerate(fractions)}
+            result[name]["max"] = maximum
+        return result
+    
+    rows = (await db.execute(select(*[table.c[name] for name in EVENT_TIMINGS]).where(*conditions))).all()
+    result = {"count": len(rows)}
+    for index, name in enumerate(EVENT_TIMINGS):
+        result[name] = _percentile_summary((row[index] for row in rows), fractions)
+    return result
+
+
+async def get_latency_series(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    bucket: str = "hour",
+    timing: str = "total_ms",
+    fractions: tuple = (0.5, 0.95, 0.99),
+    **filters
+) -> List[dict]:
+    """Percentiles of one timing per hour/day bucket over [start, end), oldest first."""
+    if bucket not in ("hour", "day") or timing not in EVENT_TIMINGS:
+        raise ValueError(f"Unsupported bucket/timing: {bucket}/{timing}")
+    table = ProcessingEvent.__table__
+    conditions = _event_filters(start, end, **filters)
+    column = table.c[timing]
+    
+    if db.bind.dialect.name == "postgresql":
+        # Inline the unit so SELECT and GROUP BY are the same expression (bucket is 'hour' or 'day')
+        bucket_start = func.date_trunc(literal_column(f"'{bucket}'"), table.c.created_at).label("bucket_start")
+        result = await db.execute(
+            select(bucket_start, func.count(), _pg_percentiles(column, fractions), func.max(column))
+            .where(*conditions)
+            .group_by(bucket_start)
+            .order_by(bucket_start)
+        )
+        series = []
+        for bucket_value, count, values, maximum in result.all():
+            point = {"bucket_start": bucket_value, "count": count}
+            point.update({f"p{round(f * 100)}": values[i] for i, f in enumerate(fractions)})
+            point["max"] = maximum
+            series.append(point)
+        return series
+    
+    grouped = {}
+    for created_at, value in (await db.execute(select(table.c.created_at, column).where(*conditions))).all():
+        key = created_at.replace(minute=0, second=0, microsecond=0)
+        if bucket == "day":
+            key = key.replace(hour=0)
+        grouped.setdefault(key, []).append(value)
+    return [
+        {"bucket_start": key, "count": len(values), **_percentile_summary(values, fractions)}
+        for key, values in sorted(grouped.items())
+    ]
+
+
+def _month_start(day: date, months_ahead: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + months_ahead
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+async def ensure_event_partitions(db: AsyncSession, today: Optional[date] = None, months_ahead: int = 2) -> None:
+    """Create monthly partitions of processing_events up to `months_ahead` ahead (Postgres only)."""
+    if db.bind.dialect.name != "postgresql":
+        return
+    today = today or date.today()
+    for offset in range(months_ahead + 1):
+        lower, upper = _month_start(today, offset), _month_start(today, offset + 1)
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS processing_events_{lower:%Y%m} PARTITION OF processing_events "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+    await db.commit()
+
+
+async def prune_processing_events(db: AsyncSession, today: Optional[date] = None) -> int:
+    """
+    Drop events older than PROCESSING_EVENTS_RETENTION_DAYS.
+    
+    On Postgres whole monthly partitions are dropped once they are entirely
+    past the cutoff (no row-by-row DELETE). Elsewhere rows are deleted.
+    
+    Returns:
+        Partitions dropped (Postgres) or rows deleted
+    """
+    today = today or date.today()
+    cutoff = today - timedelta(days=settings.PROCESSING_EVENTS_RETENTION_DAYS)
+    
+    if db.bind.dialect.name == "postgresql":
+        result = await db.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = 'processing_events'"
+        ))
+        dropped = 0
+        for (name,) in result.all():
+            suffix = name.rsplit("_", 1)[-1]
+            if not suffix.isdigit() or len(suffix) != 6:
+                continue
+            if _month_start(date(int(suffix[:4]), int(suffix[4:]), 1), 1) <= cutoff:
+                await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                dropped += 1
+        await db.commit()
+        return dropped
+    
+    result = await db.execute(
+        delete(ProcessingEvent).where(ProcessingEvent.created_at < datetime.combine(cutoff, datetime.min.time()))
+    )
+    await db.commit()
+    return result.rowcount
 
 
 # Password Reset CRUD operations
-def create_password_reset_token(db: Session, user: User) -> str:
+async def create_password_reset_token(db: AsyncSession, user: User) -> str:
     """Generate and store password reset token."""
     token = secrets.token_urlsafe(32)
     user.reset_token = token
     user.reset_token_expires = datetime.utcnow() + timedelta(hours=1)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return token
 
 
-def verify_reset_token(db: Session, token: str) -> Optional[User]:
+async def verify_reset_token(db: AsyncSession, token: str) -> Optional[User]:
     """Verify reset token and return user if valid."""
-    user = db.query(User).filter(
-        User.reset_token == token,
-        User.reset_token_expires > datetime.utcnow()
-    ).first()
+    result = await db.execute(
+        select(User).where(
+            User.reset_token == token,
+            User.reset_token_expires > datetime.utcnow()
+        )
+    )
+    return result.scalars().first()
+
+
+async def update_password_hash(db: AsyncSession, user: User, hashed_password: str) -> User:
+    """Store a rehashed password (e.g. after the bcrypt work factor changed)."""
+    user.hashed_password = hashed_password
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
-def reset_user_password(db: Session, user: User, new_password: str):
+async def reset_user_password(db: AsyncSession, user: User, new_password: Optional[str] = None, hashed_password: Optional[str] = None):
     """Reset user password and clear reset token."""
-    user.hashed_password = get_password_hash(new_password)
+    if hashed_password is None:
+        hashed_password = await get_password_hash_async(new_password)
+    user.hashed_password = hashed_password
     user.reset_token = None
     user.reset_token_expires = None
-    db.commit()
-    db.refresh(user)
-
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
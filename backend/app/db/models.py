@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Enum, Integer, Float, Date
+from sqlalchemy import Column, String, DateTime, Enum, Integer, BigInteger, Float, Date, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 import enum
@@ -39,4 +39,95 @@ class User(Base):
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Admin listing: keyset order (created_at, id), optionally narrowed by role/provider
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_role_created_at_id", "role", "created_at", "id"),
+        Index("ix_users_oauth_provider_created_at_id", "oauth_provider", "created_at", "id"),
+        Index("ix_users_last_upload_date", "last_upload_date"),
+        Index("ix_users_email_pattern", "email", postgresql_ops={"email": "varchar_pattern_ops"}),
+    )
+
+
+class UsageTotals(Base):
+    """Single-row running totals for the admin dashboard (kept in step with users)."""
+    __tablename__ = "usage_totals"
+    
+    id = Column(Integer, primary_key=True, default=1)  # Always 1
+    total_users = Column(BigInteger, nullable=False, default=0)
+    total_images_processed = Column(BigInteger, nullable=False, default=0)
+    total_processing_time = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# Usage rollup subjects besides user ids, and the metric columns both rollup tables share
+GLOBAL_SUBJECT = "*"
+ANONYMOUS_SUBJECT = "anonymous"
+USAGE_METRICS = ("images", "processing_seconds", "bytes_in", "bytes_out", "failures")
+
+
+class UsageDaily(Base):
+    """
+    Per-day usage rollup. One row per (day, subject) where subject is a
+    user id, ANONYMOUS_SUBJECT for free tries, or GLOBAL_SUBJECT for all traffic.
+    """
+    __tablename__ = "usage_daily"
+    
+    day = Column(Date, primary_key=True)
+    subject = Column(String, primary_key=True)
+    images = Column(BigInteger, nullable=False, default=0)
+    processing_seconds = Column(Float, nullable=False, default=0.0)
+    bytes_in = Column(BigInteger, nullable=False, default=0)
+    bytes_out = Column(BigInteger, nullable=False, default=0)
+    failures = Column(BigInteger, nullable=False, default=0)
+    
+    # Per-user history without scanning every subject of every day
+    __table_args__ = (
+        Index("ix_usage_daily_subject_day", "subject", "day"),
+    )
 
+
+class UsageHourly(Base):
+    """Global per-hour usage rollup (short retention; daily rows keep the history)."""
+    __tablename__ = "usage_hourly"
+    
+    hour = Column(DateTime, primary_key=True)  # Start of the hour, server local time like the daily rows
+    images = Column(BigInteger, nullable=False, default=0)
+    processing_seconds = Column(Float, nullable=False, default=0.0)
+    bytes_in = Column(BigInteger, nullable=False, default=0)
+    bytes_out = Column(BigInteger, nullable=False, default=0)
+    failures = Column(BigInteger, nullable=False, default=0)
+
+
+# Stage timing columns on processing events
+EVENT_TIMINGS = ("total_ms", "queue_ms", "decode_ms", "inference_ms", "postprocess_ms", "encode_ms")
+
+
+class ProcessingEvent(Base):
+    """
+    One row per processing request: stage timings and image facts, raw
+    (never clamped). Append-only; on Postgres the table is range-partitioned
+    by month on created_at and old partitions are dropped for retention.
+    """
+    __tablename__ = "processing_events"
+    
+    created_at = Column(DateTime, primary_key=True)  # Partition key, server local time
+    id = Column(String, primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = Column(String, nullable=True)  # None for anonymous requests
+    status = Column(String, nullable=False)  # 'ok' or 'failed'
+    model = Column(String, nullable=True)
+    output_format = Column(String, nullable=True)
+    megapixels = Column(Float, nullable=True)
+    bytes_in = Column(Integer, nullable=True)
+    bytes_out = Column(Integer, nullable=True)
+    
+    # Milliseconds; queue is time waiting for an inference slot
+    total_ms = Column(Float, nullable=False)
+    queue_ms = Column(Float, nullable=True)
+    decode_ms = Column(Float, nullable=True)
+    inference_ms = Column(Float, nullable=True)
+    postprocess_ms = Column(Float, nullable=True)
+    encode_ms = Column(Float, nullable=True)
+    
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
@@ -1,9 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import logging
 
 from app.core.config import settings
+from app.core.tracing import TRACE_ID_HEADER, TracingMiddleware
+from app.services.profiling import PROFILE_ID_HEADER, PROFILE_SKIPPED_HEADER
 from app.api.v1.api import api_router
 
 # Configure logging
@@ -14,23 +18,76 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+MODEL_WARMUP_RETRY_SECONDS = 30
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     logger.info("Starting QuickBG Backend API")
     
+    # Dependency probes run in the background; /health/ready only reads their cache
+    from app.services.health import health_monitor
+    health_prober = asyncio.create_task(health_monitor.run())
+    
     # PRE-WARM the AI model for INSTANT first request!
-    logger.info("Pre-warming AI model for fast processing...")
-    try:
-        from app.services.background_removal import get_session
-        get_session()  # Load model into memory NOW
-        logger.info("✅ AI model ready! First upload will be FAST!")
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to pre-warm model: {e}")
+    # Runs off the event loop so liveness answers during warm-up; readiness
+    # stays 503 until it finishes, so no user request hits a cold model.
+    async def warm_model():
+        from app.services.background_removal import warm_up
+        while True:
+            logger.info("Pre-warming AI model for fast processing...")
+            try:
+                await run_in_threadpool(warm_up)
+                health_monitor.mark_warm()
+                logger.info("✅ AI model ready! First upload will be FAST!")
+                await health_monitor.refresh()
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to pre-warm model, retrying in {MODEL_WARMUP_RETRY_SECONDS}s: {e}")
+                await asyncio.sleep(MODEL_WARMUP_RETRY_SECONDS)
+    
+    model_warmer = asyncio.create_task(warm_model())
+    
+    # Flush buffered user stats to Postgres in the background
+    from app.services.stats_buffer import run_flush_loop, flush_pending_stats
+    stats_flusher = asyncio.create_task(run_flush_loop())
+    
+    # Same for the time-series usage rollups (plus periodic retention)
+    from app.services import usage_rollup
+    rollup_flusher = asyncio.create_task(usage_rollup.run_flush_loop())
+    
+    # Per-request processing events (also creates the upcoming monthly partitions)
+    from app.services import processing_events
+    events_flusher = asyncio.create_task(processing_events.run_flush_loop())
+    
+    # Outbound email is sent by a background worker over a persistent SMTP connection
+    from app.services.email import outbox
+    outbox.start()
     
     yield
     logger.info("Shutting down QuickBG Backend API")
+    
+    model_warmer.cancel()
+    health_prober.cancel()
+    stats_flusher.cancel()
+    rollup_flusher.cancel()
+    events_flusher.cancel()
+    try:
+        await flush_pending_stats()
+    except Exception as e:
+        logger.warning(f"Final stats flush failed: {e}")
+    try:
+        await usage_rollup.flush_usage_rollups()
+    except Exception as e:
+        logger.warning(f"Final usage rollup flush failed: {e}")
+    try:
+        await processing_events.flush_events()
+    except Exception as e:
+        logger.warning(f"Final processing events flush failed: {e}")
+    await outbox.stop(settings.MAIL_SHUTDOWN_DRAIN_SECONDS)
+    from app.core.redis import close_async_redis
+    await close_async_redis()
 
 
 app = FastAPI(
@@ -48,9 +105,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Remaining-Tries"],  # Allow frontend to read this custom header
+    expose_headers=["X-Remaining-Tries", "Retry-After", TRACE_ID_HEADER, PROFILE_ID_HEADER, PROFILE_SKIPPED_HEADER],  # Allow frontend to read these headers
 )
 
+# One server span per request (outermost, so it times CORS and routing too)
+app.add_middleware(TracingMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix=f"/api/{settings.API_VERSION}")
 
@@ -1,4 +1,7 @@
 from pydantic import BaseModel
+from typing import List, Optional
+from datetime import date, datetime
+from app.schemas.auth import UserResponse
 
 
 class AdminStats(BaseModel):
@@ -8,3 +11,30 @@ class AdminStats(BaseModel):
     completed_count: int
     failed_count: int
 
+
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
+    total_estimate: Optional[int] = None  # Only when include_total=true
+
+
+class UsageMetrics(BaseModel):
+    images: int = 0
+    processing_seconds: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    failures: int = 0
+    avg_processing_seconds: Optional[float] = None  # processing_seconds / images
+
+
+class UsageDailyPoint(UsageMetrics):
+    day: date
+
+
+class UsageHourlyPoint(UsageMetrics):
+    hour: datetime
+
+
+class UsageSubjectTotals(UsageMetrics):
+    subject: str  # User id
+    email: Optional[str] = None
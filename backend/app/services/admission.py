@@ -0,0 +1,209 @@
+from collections import deque
+from typing import Callable, Dict, Optional
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+import asyncio
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first. Free slots always go to the first
+# non-empty queue in this order.
+AUTHENTICATED = "authenticated"
+ANONYMOUS = "anonymous"
+PRIORITIES = (AUTHENTICATED, ANONYMOUS)
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued."""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Bounded, prioritised admission in front of CPU-heavy inference.
+
+    At most `max_concurrency` calls run at once (in the threadpool, so the
+    event loop stays free). With a `memory_budget`, each call also reserves
+    its estimated memory `cost` and is only admitted while the reserved
+    total stays within the budget (a single call is always admitted when
+    nothing else runs). Waiters are served strictly in order, so a large
+    image at the head of the queue is not starved by smaller ones behind it.
+    Excess requests wait in a bounded queue per priority class. The expected
+    wait is estimated from an EWMA of recent service times; if it exceeds the
+    class budget, or the queue is full, the request fails fast with
+    Overloaded(retry_after).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        queue_limits: Dict[str, int],
+        wait_budgets: Dict[str, float],
+        initial_service_time: float,
+        memory_budget: Optional[int] = None,
+        ewma_alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_limits = queue_limits
+        self.wait_budgets = wait_budgets
+        self.memory_budget = memory_budget or None
+        self.ewma_alpha = ewma_alpha
+        self.clock = clock
+        self._service_time = initial_service_time
+        self._in_flight = 0
+        self._reserved = 0
+        self._waiters = {p: deque() for p in PRIORITIES}
+        self._admitted = {p: 0 for p in PRIORITIES}
+        self._shed = {p: 0 for p in PRIORITIES}
+        self._completed = 0
+
+    def _queued_ahead(self, priority: str) -> int:
+        """Waiters that would be served before a new `priority` request."""
+        ahead = 0
+        for p in PRIORITIES:
+            ahead += len(self._waiters[p])
+            if p == priority:
+                break
+        return ahead
+
+    def _fits(self, cost: int) -> bool:
+        """Whether a call with this memory cost could start right now."""
+        if self._in_flight >= self.max_concurrency:
+            return False
+        if self.memory_budget is None or self._in_flight == 0:
+            return True
+        return self._reserved + cost <= self.memory_budget
+
+    def expected_wait(self, priority: str, cost: int = 0) -> float:
+        """Estimated seconds a new `priority` request would wait for a slot."""
+        ahead = self._queued_ahead(priority)
+        if self._fits(cost) and ahead == 0:
+            return 0.0
+        return (ahead + 1) * self._service_time / self.max_concurrency
+
+    def _shed_request(self, priority: str, wait: float, reason: str):
+        self._shed[priority] += 1
+        retry_after = max(1, math.ceil(wait))
+        logger.warning(
+            f"Shedding {priority} inference request: {reason} "
+            f"(in_flight={self._in_flight}, queued={self._queued_ahead(ANONYMOUS)}, retry_after={retry_after}s)"
+        )
+        raise Overloaded(retry_after, reason)
+
+    def _start(self, cost: int) -> None:
+        self._in_flight += 1
+        self._reserved += cost
+
+    async def acquire(self, priority: str, cost: int = 0) -> None:
+        """Wait for an inference slot (and `cost` bytes of the memory budget) or raise Overloaded."""
+        queue = self._waiters[priority]
+        if self._fits(cost) and self._queued_ahead(priority) == 0:
+            self._start(cost)
+            self._admitted[priority] += 1
+            return
+
+        wait = self.expected_wait(priority, cost)
+        if len(queue) >= self.queue_limits[priority]:
+            self._shed_request(priority, wait, "queue full")
+        if wait > self.wait_budgets[priority]:
+            self._shed_request(priority, wait, "expected wait over budget")
+
+        waiter = (asyncio.get_running_loop().create_future(), cost)
+        queue.append(waiter)
+        try:
+            await waiter[0]
+        except asyncio.CancelledError:
+            if waiter[0].done() and not waiter[0].cancelled():
+                # A slot was handed to us just as the client went away
+                self._free(cost)
+            else:
+                queue.remove(waiter)
+                # The head of the queue may have been blocking smaller waiters
+                self._admit_waiters()
+            raise
+        self._admitted[priority] += 1
+
+    def _admit_waiters(self) -> None:
+        """Start waiters in priority/FIFO order for as long as the head one fits."""
+        for p in PRIORITIES:
+            queue = self._waiters[p]
+            while queue:
+                future, cost = queue[0]
+                if future.done():
+                    queue.popleft()
+                    continue
+                if not self._fits(cost):
+                    return
+                queue.popleft()
+                self._start(cost)
+                future.set_result(None)
+
+    def _free(self, cost: int) -> None:
+        self._in_flight -= 1
+        self._reserved -= cost
+        self._admit_waiters()
+
+    def release(self, service_time: float, cost: int = 0) -> None:
+        """Return a slot and its memory reservation; fold the observed service time into the estimate."""
+        self._service_time += self.ewma_alpha * (service_time - self._service_time)
+        self._completed += 1
+        self._free(cost)
+
+    async def run(self, priority: str, func, *args, cost: int = 0, **kwargs):
+        """
+        Run a blocking callable in the threadpool once admitted (reserving `cost` bytes of memory).
+
+        A thread cannot be interrupted, so if the caller is cancelled the slot
+        stays held until the call actually returns.
+        """
+        await self.acquire(priority, cost)
+        start = self.clock()
+        call = asyncio.ensure_future(run_in_threadpool(func, *args, **kwargs))
+
+        def finished(task: asyncio.Future) -> None:
+            if not task.cancelled():
+                task.exception()  # Retrieved here in case the caller is gone
+            self.release(self.clock() - start, cost)
+
+        call.add_done_callback(finished)
+        return await asyncio.shield(call)
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "memory_reserved_mb": round(self._reserved / (1024 * 1024), 1),
+            "memory_budget_mb": round(self.memory_budget / (1024 * 1024), 1) if self.memory_budget else None,
+            "queue_depth": {p: len(self._waiters[p]) for p in PRIORITIES},
+            "queue_limit": dict(self.queue_limits),
+            "admitted": dict(self._admitted),
+            "shed": dict(self._shed),
+            "completed": self._completed,
+            "avg_service_time_seconds": round(self._service_time, 3),
+            "throughput_per_second": round(self.max_concurrency / self._service_time, 3) if self._service_time > 0 else None,
+            "expected_wait_seconds": {p: round(self.expected_wait(p), 2) for p in PRIORITIES}
+        }
+
+
+# Shared controller for the API process
+inference_admission = AdmissionController(
+    max_concurrency=settings.INFERENCE_MAX_CONCURRENCY,
+    queue_limits={
+        AUTHENTICATED: settings.INFERENCE_QUEUE_SIZE_AUTHENTICATED,
+        ANONYMOUS: settings.INFERENCE_QUEUE_SIZE_ANONYMOUS
+    },
+    wait_budgets={
+        AUTHENTICATED: settings.INFERENCE_WAIT_BUDGET_AUTHENTICATED_SECONDS,
+        ANONYMOUS: settings.INFERENCE_WAIT_BUDGET_ANONYMOUS_SECONDS
+    },
+    initial_service_time=settings.PROCESSING_TIME_DEFAULT_SECONDS,
+    memory_budget=settings.INFERENCE_MEMORY_BUDGET_MB * 1024 * 1024
+)
@@ -0,0 +1,170 @@
+from io import BytesIO
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.services.image_budget import DecodeEstimate, MB, apng_bytes, frame_count
+
+# Animated output: WebP is streamed frame by frame; APNG is materialized (see encode_animation)
+ANIMATION_FORMATS = ("webp", "png")
+
+DEFAULT_FRAME_DURATION_MS = 100
+
+# Frames are compared as a grid of block averages: each block covers enough
+# pixels that GIF dithering and codec noise average out, while a subject that
+# moves still changes the blocks it crosses
+SIGNATURE_SIZE = (32, 32)
+
+
+class Frame(NamedTuple):
+    image: Image.Image  # Full canvas (Pillow has already applied disposal/blending)
+    duration: int  # Milliseconds
+
+
+def is_animated(image: Image.Image) -> bool:
+    return frame_count(image) > 1
+
+
+def output_error(estimate: DecodeEstimate, output_format: str) -> Optional[str]:
+    """Why an animation cannot be written as `output_format`, or None if it can."""
+    if estimate.frames <= 1:
+        return None
+    if output_format not in ANIMATION_FORMATS + ("auto",):
+        return "Animated images can only be returned as WebP or PNG (APNG)"
+    if output_format == "png" and apng_bytes(estimate) > settings.MAX_DECODE_MEMORY_MB * MB:
+        return (
+            f"Animation too large for APNG output (~{apng_bytes(estimate) // MB}MB of frames); "
+            f"use output_format=webp"
+        )
+    return None
+
+
+def iter_frames(image: Image.Image) -> Iterator[Frame]:
+    """Decode an animation one frame at a time as RGBA; only the current frame is held."""
+    for index in range(frame_count(image)):
+        image.seek(index)
+        image.load()  # WebP only reports the frame duration once decoded
+        duration = image.info.get("duration") or DEFAULT_FRAME_DURATION_MS
+        yield Frame(image.convert("RGBA"), int(duration))
+
+
+def frame_signature(frame: Image.Image) -> np.ndarray:
+    """Block-averaged RGBA of a frame at SIGNATURE_SIZE, as float32."""
+    return np.asarray(frame.resize(SIGNATURE_SIZE, Image.Resampling.BOX), dtype=np.float32)
+
+
+class TemporalMasks:
+    """
+    Masks for consecutive frames that only run the model when the frame changed.
+
+    A frame whose signature is within `threshold` (largest block difference,
+    0-255) of the last *inferred* frame reuses that frame's mask. Comparing
+    against the keyframe rather than the previous frame means small changes
+    cannot add up across a run of reused masks.
+    """
+
+    def __init__(self, infer: Callable[[Image.Image], Image.Image], threshold: Optional[float] = None):
+        self.infer = infer
+        self.threshold = settings.ANIMATION_MASK_REUSE_THRESHOLD if threshold is None else threshold
+        self.inferred = 0
+        self.reused = 0
+        self._signature = None
+        self._mask = None
+
+    def mask_for(self, frame: Image.Image) -> Image.Image:
+        signature = frame_signature(frame)
+        if (
+            self._mask is not None
+            and self._mask.size == frame.size
+            and float(np.abs(signature - self._signature).max()) <= self.threshold
+        ):
+            self.reused += 1
+            return self._mask
+        self._mask = self.infer(frame)
+        self._signature = signature
+        self.inferred += 1
+        return self._mask
+
+
+class _FrameStream:
+    """
+    Frames produced on demand, passed to Pillow's animated WebP writer as one
+    `append_images` entry.
+
+    The writer reads `n_frames`, then seek()s forward one frame at a time and
+    encodes it; every other attribute falls through to the current frame. A
+    frame's duration is appended to `durations` when the frame is produced,
+    which is before the writer looks it up.
+    """
+
+    def __init__(self, frames: Iterator[Frame], n_frames: int, durations: List[int]):
+        self.n_frames = n_frames
+        self._frames = frames
+        self._durations = durations
+        self._index = -1
+        self._current = None
+
+    def seek(self, index: int) -> None:
+        if index == self._index:
+            return
+        if index != self._index + 1:
+            raise ValueError("Streamed frames can only be read in order")
+        try:
+            frame = next(self._frames)
+        except StopIteration:
+            raise EOFError("No more frames")
+        self._current = frame.image
+        self._durations.append(frame.duration)
+        self._index = index
+
+    def tell(self) -> int:
+        return self._index
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._current, name)
+
+
+def encode_animation(frames: Iterator[Frame], n_frames: int, output_format: str, loop: int = 0) -> bytes:
+    """
+    Encode processed frames as an animated WebP or APNG.
+
+    WebP frames go to the encoder as they are produced and are dropped once
+    encoded, so memory holds one frame plus the compressed output. Pillow's
+    APNG writer scans every frame before writing and diffs each against the
+    previous one, so APNG keeps the whole animation in memory (accounted for
+    by apng_bytes()).
+    """
+    first = next(frames)
+    durations = [first.duration]
+    buffer = BytesIO()
+    if output_format == "webp":
+        first.image.save(
+            buffer,
+            format="WEBP",
+            save_all=True,
+            append_images=[_FrameStream(frames, n_frames - 1, durations)],
+            duration=durations,
+            loop=loop,
+            quality=settings.OUTPUT_WEBP_QUALITY,
+            # Lossless for the frames where that is smaller (flat GIF graphics)
+            allow_mixed=True,
+            # Otherwise a GIF's palette background index (kept in frame.info)
+            # becomes an opaque canvas color
+            background=(0, 0, 0, 0)
+        )
+    else:
+        rest = list(frames)
+        durations += [frame.duration for frame in rest]
+        first.image.save(
+            buffer,
+            format="PNG",
+            save_all=True,
+            append_images=[frame.image for frame in rest],
+            duration=durations,
+            loop=loop
+        )
+    return buffer.getvalue()
@@ -1,15 +1,30 @@
-from rembg import remove, new_session
-from PIL import Image, ImageFilter
+from rembg import remove
+from PIL import Image, ImageChops, ImageFilter, ImageOps
 import numpy as np
 import cv2
 from io import BytesIO
 from typing import Tuple, Optional
 import logging
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from app.core.config import settings
+from app.core.tracing import traced, record_span
+from app.services import model_registry
+from app.services.image_budget import estimate_decode, budget_error, describe
+from app.services.compositing import Background, composite, NONE
+from app.services.matting import guided_filter_mask, narrow_band_matting
+from app.services.animation import Frame, TemporalMasks, is_animated, iter_frames, encode_animation, output_error
 
 logger = logging.getLogger(__name__)
 
 # Create a persistent session for faster processing (model stays in memory)
 _session = None
+MODEL_NAME = "isnet-general-use"
 
 def get_session():
     """Get or create a persistent rembg session for faster processing."""
@@ -17,16 +32,58 @@ def get_session():
     if _session is None:
         logger.info("Initializing rembg session with high-quality isnet-general-use model (one-time setup)")
         # Use isnet-general-use for professional quality (like Remove.bg)
-        _session = new_session("isnet-general-use")  # Best balance of speed & quality
+        _session = model_registry.load_session(MODEL_NAME)  # Best balance of speed & quality
     return _session
 
 
+def warm_up() -> None:
+    """Load the model and run one tiny inference so the first real request is not cold."""
+    get_session()
+    sample = BytesIO()
+    Image.new('RGB', (64, 64), (255, 255, 255)).save(sample, format='PNG')
+    remove_background(sample.getvalue())
+    logger.info("Model warm-up inference complete")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water mark of this process's resident memory, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+# Alpha 0 -> 255, anything else -> 0: selects the fully transparent pixels
+_TRANSPARENT_LUT = [255] + [0] * 255
+
+
+def apply_mask(image: Image.Image, mask: Image.Image, clear_hidden: bool = True) -> Image.Image:
+    """
+    Make `mask` the alpha channel of an RGB/RGBA image, in place.
+
+    RGB becomes RGBA without reallocating (Pillow already stores RGB as 4
+    bytes per pixel). Existing transparency is kept by multiplying it into
+    the mask. With `clear_hidden`, fully transparent pixels are zeroed so the
+    PNG compresses as well as a cutout composited onto an empty canvas;
+    compositing keeps them (the blur background is made from them).
+    """
+    if image.mode == 'RGBA':
+        mask = ImageChops.multiply(image.getchannel('A'), mask)
+    image.putalpha(mask)
+    if clear_hidden:
+        image.paste((0, 0, 0, 0), mask=mask.point(_TRANSPARENT_LUT))
+    return image
+
+
+@traced("remove_background")
 def remove_background(
     image_bytes: bytes,
     refine_mask: bool = False,  # Disabled - causes blur and artifacts
     trim_transparent: bool = False,  # Disabled - can cut parts of the subject
     alpha_matting: bool = False,  # Let AI model handle edges naturally
-    preserve_original_size: bool = True  # Preserve original dimensions
+    preserve_original_size: bool = True,  # Preserve original dimensions
+    background: Optional[Background] = None,
+    output_format: str = "png",
+    guided_filter: Optional[bool] = None  # None = settings.GUIDED_FILTER_ENABLED
 ) -> Tuple[bytes, dict]:
     """
     Remove background from image using rembg (ISNet) - PURE AI OUTPUT FOR MAXIMUM QUALITY.
@@ -35,8 +92,14 @@ def remove_background(
         image_bytes: Input image as bytes
         refine_mask: Apply mask refinement (disabled by default - can cause artifacts)
         trim_transparent: Remove transparent padding (disabled by default - can cut subject)
-        alpha_matting: Use alpha matting (disabled by default - AI handles it better)
+        alpha_matting: Solve closed-form alpha matting in the band around the mask's edge
+            (slower; for hair and fur)
         preserve_original_size: Keep original image dimensions (True by default)
+        background: Composite the cutout onto this background (None = transparent)
+        output_format: 'png', 'jpeg' (opaque results only), 'webp' or 'auto' (JPEG when opaque;
+            animated WebP for animations)
+        guided_filter: Snap the mask to the image's edges (fast guided filter, full-res guide);
+            None = settings.GUIDED_FILTER_ENABLED, which is off by default
     
     Returns:
         Tuple of (processed_image_bytes, metadata_dict)
@@ -50,70 +113,81 @@ def remove_background(
     """
     try:
         logger.info("Starting high-quality background removal")
+        started = time.perf_counter()
+        compositing = background is not None and background.kind != NONE
+        if guided_filter is None:
+            guided_filter = settings.GUIDED_FILTER_ENABLED
         
-        # Load input image
+        # Load input image (header only; refuse decompression bombs before decoding)
         input_image = Image.open(BytesIO(image_bytes))
+        over_budget = budget_error(estimate_decode(input_image))
+        if over_budget:
+            raise ValueError(over_budget)
+        if is_animated(input_image):
+            return remove_background_animated(
+                input_image, len(image_bytes), refine_mask, background, output_format, guided_filter
+            )
+        
+        # Decode once. Every later stage borrows this image or works on the
+        # 1-byte-per-pixel mask; the full frame is not copied again.
+        input_image.load()
+        ImageOps.exif_transpose(input_image, in_place=True)
         original_size = input_image.size
         logger.info(f"Input image size: {original_size}")
         
+        # Preserve original color mode - don't convert RGBA to RGB (loses transparency info)
+        # Only convert if it's not RGB/RGBA
+        if input_image.mode not in ('RGB', 'RGBA'):
+            logger.info(f"Converting from {input_image.mode} to RGB")
+            input_image = input_image.convert('RGB')
+        elif input_image.mode == 'RGBA':
+            # Keep RGBA if present - better color preservation
+            logger.info("Preserving RGBA mode for better color accuracy")
+        
         # PRESERVE ORIGINAL SIZE for maximum quality
         # Only resize if image is extremely large (to prevent memory issues)
         max_dimension = 4096  # Increased from 1920 for better quality
         processing_size = original_size
+        processing_image = input_image
         
-        if preserve_original_size and max(input_image.size) <= max_dimension:
-            # Keep original size - no resizing for best quality
-            logger.info(f"Preserving original size: {original_size} for maximum quality")
-            processing_image = input_image.copy()
-        elif max(input_image.size) > max_dimension:
+        if max(original_size) > max_dimension:
             # Only resize if absolutely necessary (very large images)
-            ratio = max_dimension / max(input_image.size)
-            processing_size = tuple(int(dim * ratio) for dim in input_image.size)
+            ratio = max_dimension / max(original_size)
+            processing_size = tuple(int(dim * ratio) for dim in original_size)
             logger.info(f"Resizing from {original_size} to {processing_size} (image too large)")
             # Use LANCZOS for best quality resampling
             processing_image = input_image.resize(processing_size, Image.Resampling.LANCZOS)
         else:
-            processing_image = input_image.copy()
-        
-        # Preserve original color mode - don't convert RGBA to RGB (loses transparency info)
-        # Only convert if it's not RGB/RGBA
-        if processing_image.mode not in ('RGB', 'RGBA'):
-            logger.info(f"Converting from {processing_image.mode} to RGB")
-            processing_image = processing_image.convert('RGB')
-        elif processing_image.mode == 'RGBA':
-            # Keep RGBA if present - better color preservation
-            logger.info("Preserving RGBA mode for better color accuracy")
+            logger.info(f"Preserving original size: {original_size} for maximum quality")
         
         # Remove background using cached session with high-quality model
         # Let the AI model do the work - don't over-process
         logger.info("Applying professional ISNet background removal (pure AI output)")
         session = get_session()
-        
-        # Use the AI model with MINIMAL post-processing for best results
-        # Alpha matting can sometimes cause artifacts, so only use when needed
+        decoded = time.perf_counter()
+        
+        # Take only the mask from rembg and apply it in place
+        # (rembg's own cutout allocates two more RGBA frames)
+        mask = remove(
+            processing_image,
+            session=session,
+            only_mask=True
+        )
+        inferred = time.perf_counter()
+        
+        # Upscaling the mask (not the cutout) restores the original size at full detail
+        output_image = input_image if preserve_original_size else processing_image
         if alpha_matting:
-            logger.info("Using alpha matting for complex edges")
-            output_image = remove(
-                processing_image,
-                session=session,
-                alpha_matting=True,
-                alpha_matting_foreground_threshold=240,
-                alpha_matting_background_threshold=10,
-                alpha_matting_erode_size=10
-            )
-        else:
-            # Pure AI output - no post-processing by rembg
-            logger.info("Using pure AI output (no alpha matting)")
-            output_image = remove(
-                processing_image,
-                session=session,
-                alpha_matting=False
-            )
-        
-        # Restore to original size if we resized for processing
-        if preserve_original_size and processing_size != original_size:
-            logger.info(f"Restoring to original size: {original_size}")
-            output_image = output_image.resize(original_size, Image.Resampling.LANCZOS)
+            # Closed-form matting, but only in the uncertain band around the edge
+            logger.info("Using narrow-band alpha matting for complex edges")
+            mask = narrow_band_matting(output_image, mask)
+        elif guided_filter:
+            # Takes the mask at any size; edges come from the full-resolution image
+            mask = guided_filter_mask(output_image, mask)
+        elif mask.size != output_image.size:
+            mask = mask.resize(output_image.size, Image.Resampling.LANCZOS)
+        processing_image = input_image = None
+        output_image = apply_mask(output_image, mask, clear_hidden=not compositing)
         
         # Apply mask refinement ONLY if explicitly requested
         # (Usually not needed and can cause artifacts)
@@ -127,12 +201,36 @@ def remove_background(
             logger.info("Trimming transparent areas (optional)")
             output_image = trim_transparent_area(output_image)
         
+        # Server-side background replacement (vectorized premultiplied blend)
+        if compositing:
+            logger.info(f"Compositing onto {background.kind} background")
+            output_image = composite(output_image, background)
+        
+        postprocessed = time.perf_counter()
+        
+        if output_format == 'auto':
+            output_format = 'jpeg' if output_image.mode == 'RGB' else 'png'
+        
         # Convert to bytes with MAXIMUM QUALITY
         output_buffer = BytesIO()
-        # Use compress_level=9 for maximum quality (slower but best quality)
-        # optimize=True for better file size without quality loss
-        output_image.save(output_buffer, format='PNG', compress_level=9, optimize=True)
+        if output_format == 'jpeg':
+            if output_image.mode != 'RGB':
+                raise ValueError("JPEG output needs an opaque result (composite onto a background)")
+            output_image.save(output_buffer, format='JPEG', quality=settings.OUTPUT_JPEG_QUALITY, optimize=True)
+        elif output_format == 'webp':
+            output_image.save(output_buffer, format='WEBP', quality=settings.OUTPUT_WEBP_QUALITY)
+        else:
+            # Use compress_level=9 for maximum quality (slower but best quality)
+            # optimize=True for better file size without quality loss
+            output_image.save(output_buffer, format='PNG', compress_level=9, optimize=True)
+        # getvalue() hands over BytesIO's own buffer (no copy while nothing else references it)
         output_bytes = output_buffer.getvalue()
+        del output_buffer
+        encoded = time.perf_counter()
+        record_span("decode", started, decoded)
+        record_span("inference", decoded, inferred, model=MODEL_NAME)
+        record_span("postprocess", inferred, postprocessed)
+        record_span("encode", postprocessed, encoded, output_format=output_format)
         
         # Collect metadata
         metadata = {
@@ -142,9 +240,23 @@ def remove_background(
             'processed_bytes': len(output_bytes),
             'compression_ratio': round(len(output_bytes) / len(image_bytes), 2),
             'alpha_matting': alpha_matting,
+            'guided_filter': guided_filter and not alpha_matting,
             'mask_refined': refine_mask,
             'trimmed': trim_transparent,
-            'preserved_original_size': preserve_original_size
+            'preserved_original_size': preserve_original_size,
+            'model': MODEL_NAME,
+            'output_format': output_format,
+            'background': background.kind if compositing else None,
+            'megapixels': round(original_size[0] * original_size[1] / 1_000_000, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            # Per-stage wall time inside this call (excludes any queueing before it)
+            'timings_ms': {
+                'decode': round((decoded - started) * 1000, 2),
+                'inference': round((inferred - decoded) * 1000, 2),
+                'postprocess': round((postprocessed - inferred) * 1000, 2),
+                'encode': round((encoded - postprocessed) * 1000, 2),
+                'total': round((encoded - started) * 1000, 2)
+            }
         }
         
         logger.info(f"Background removal complete: {metadata}")
@@ -156,10 +268,113 @@ def remove_background(
         raise Exception(error_msg)
 
 
+def remove_background_animated(
+    image: Image.Image,
+    original_bytes: int,
+    refine_mask: bool = False,
+    background: Optional[Background] = None,
+    output_format: str = "auto",
+    guided_filter: bool = False
+) -> Tuple[bytes, dict]:
+    """
+    Remove the background from every frame of an animated GIF/WebP/APNG.
+    
+    Frames are decoded, masked and encoded one at a time, never as a whole
+    animation (except for APNG output, see encode_animation). The model only
+    runs on frames that differ visibly from the last frame it ran on; the
+    others reuse that mask (see TemporalMasks). Frames keep the canvas size,
+    so trimming does not apply.
+    
+    Args:
+        image: Opened (not yet loaded) animated image
+        original_bytes: Size of the uploaded file
+        refine_mask, background, guided_filter: As for remove_background()
+        output_format: 'webp', 'png' (APNG) or 'auto' (WebP)
+    
+    Returns:
+        Tuple of (processed_image_bytes, metadata_dict)
+    """
+    started = time.perf_counter()
+    compositing = background is not None and background.kind != NONE
+    output_format = 'webp' if output_format == 'auto' else output_format
+    estimate = estimate_decode(image)
+    unsupported = output_error(estimate, output_format)
+    if unsupported:
+        raise ValueError(unsupported)
+    
+    session = get_session()
+    seconds = {'decode': 0.0, 'inference': 0.0, 'postprocess': 0.0}
+    
+    def infer(frame: Image.Image) -> Image.Image:
+        start = time.perf_counter()
+        mask = remove(frame, session=session, only_mask=True)
+        seconds['inference'] += time.perf_counter() - start
+        return mask
+    
+    masks = TemporalMasks(infer)
+    
+    def cutouts():
+        frames = iter_frames(image)
+        while True:
+            start = time.perf_counter()
+            frame = next(frames, None)
+            seconds['decode'] += time.perf_counter() - start
+            if frame is None:
+                return
+            start = time.perf_counter()
+            mask = masks.mask_for(frame.image)
+            if guided_filter:
+                mask = guided_filter_mask(frame.image, mask)
+            output = apply_mask(frame.image, mask, clear_hidden=not compositing)
+            if refine_mask:
+                output = refine_mask_edges(output, kernel_size=2, use_blur=False)
+            if compositing:
+                output = composite(output, background)
+            # Inference time is counted separately (inside mask_for)
+            seconds['postprocess'] += time.perf_counter() - start
+            yield Frame(output, frame.duration)
+    
+    output_bytes = encode_animation(cutouts(), estimate.frames, output_format, loop=image.info.get('loop', 0))
+    total = time.perf_counter() - started
+    seconds['postprocess'] -= seconds['inference']
+    
+    metadata = {
+        'original_size': image.size,
+        'processed_size': image.size,
+        'original_bytes': original_bytes,
+        'processed_bytes': len(output_bytes),
+        'compression_ratio': round(len(output_bytes) / original_bytes, 2),
+        'alpha_matting': False,
+        'guided_filter': guided_filter,
+        'mask_refined': refine_mask,
+        'trimmed': False,
+        'preserved_original_size': True,
+        'model': MODEL_NAME,
+        'output_format': output_format,
+        'background': background.kind if compositing else None,
+        'frames': estimate.frames,
+        'frames_inferred': masks.inferred,
+        'masks_reused': masks.reused,
+        'megapixels': round(estimate.pixels / 1_000_000, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'timings_ms': {
+            **{stage: round(value * 1000, 2) for stage, value in seconds.items()},
+            # Frames are encoded as they are produced; encoding is what remains
+            'encode': round((total - sum(seconds.values())) * 1000, 2),
+            'total': round(total * 1000, 2)
+        }
+    }
+    logger.info(f"Animated background removal complete: {metadata}")
+    return output_bytes, metadata
+
+
 def refine_mask_edges(image: Image.Image, kernel_size: int = 2, use_blur: bool = False) -> Image.Image:
     """
     Refine mask edges using morphological operations with minimal smoothing.
     
+    Works on the alpha channel only (1 byte/pixel) and writes it back in
+    place; the color channels are never copied.
+    
     Args:
         image: PIL Image with alpha channel
         kernel_size: Size of the smoothing kernel (smaller = sharper edges)
@@ -169,34 +384,29 @@ def refine_mask_edges(image: Image.Image, kernel_size: int = 2, use_blur: bool =
         Image with refined edges
     """
     try:
-        # Convert to numpy array
-        img_array = np.array(image)
-        
-        if img_array.shape[2] != 4:
+        if image.mode != 'RGBA':
             return image  # No alpha channel, return as is
         
         # Extract alpha channel
-        alpha = img_array[:, :, 3]
+        alpha = np.array(image.getchannel('A'))
         
         # Apply morphological operations with smaller kernel for sharper edges
         kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
         
         # Closing operation to fill small holes (minimal)
-        alpha = cv2.morphologyEx(alpha, cv2.MORPH_CLOSE, kernel, iterations=1)
+        cv2.morphologyEx(alpha, cv2.MORPH_CLOSE, kernel, dst=alpha, iterations=1)
         
         # Opening operation to remove noise (minimal)
-        alpha = cv2.morphologyEx(alpha, cv2.MORPH_OPEN, kernel, iterations=1)
+        cv2.morphologyEx(alpha, cv2.MORPH_OPEN, kernel, dst=alpha, iterations=1)
         
         # Only apply blur if requested (disabled by default to preserve sharpness)
         if use_blur:
             # Very light blur only if needed
-            alpha = cv2.GaussianBlur(alpha, (kernel_size, kernel_size), 0.5)
+            cv2.GaussianBlur(alpha, (kernel_size, kernel_size), 0.5, dst=alpha)
         
         # Update alpha channel
-        img_array[:, :, 3] = alpha
-        
-        # Convert back to PIL Image
-        return Image.fromarray(img_array)
+        image.putalpha(Image.fromarray(alpha))
+        return image
     
     except Exception as e:
         logger.warning(f"Mask refinement failed, returning original: {str(e)}")
@@ -215,14 +425,11 @@ def trim_transparent_area(image: Image.Image, threshold: int = 10) -> Image.Imag
         Trimmed image
     """
     try:
-        # Convert to numpy array
-        img_array = np.array(image)
-        
-        if img_array.shape[2] != 4:
+        if image.mode != 'RGBA':
             return image  # No alpha channel, return as is
         
-        # Get alpha channel
-        alpha = img_array[:, :, 3]
+        # Get alpha channel (the bounding box only needs this one band)
+        alpha = np.asarray(image.getchannel('A'))
         
         # Find non-transparent pixels
         rows = np.any(alpha > threshold, axis=1)
@@ -239,14 +446,12 @@ def trim_transparent_area(image: Image.Image, threshold: int = 10) -> Image.Imag
         # Add small padding
         padding = 5
         row_min = max(0, row_min - padding)
-        row_max = min(img_array.shape[0], row_max + padding + 1)
+        row_max = min(image.height, row_max + padding + 1)
         col_min = max(0, col_min - padding)
-        col_max = min(img_array.shape[1], col_max + padding + 1)
-        
-        # Crop image
-        cropped_array = img_array[row_min:row_max, col_min:col_max]
+        col_max = min(image.width, col_max + padding + 1)
         
-        return Image.fromarray(cropped_array)
+        # Crop image (allocates only the kept region)
+        return image.crop((int(col_min), int(row_min), int(col_max), int(row_max)))
     
     except Exception as e:
         logger.warning(f"Trimming failed, returning original: {str(e)}")
@@ -282,9 +487,11 @@ def validate_image(image_bytes: bytes, max_size_mb: int = 10) -> Tuple[bool, str
             'height': image.height,
             'file_size_mb': round(file_size_mb, 2)
         }
+        estimate = estimate_decode(image)
+        info.update(describe(estimate))
         
         # Validate format
-        valid_formats = ['JPEG', 'JPG', 'PNG', 'WEBP', 'BMP']
+        valid_formats = ['JPEG', 'JPG', 'PNG', 'WEBP', 'BMP', 'GIF']
         if image.format and image.format.upper() not in valid_formats:
             return False, f"Unsupported image format: {image.format}", info
         
@@ -297,6 +504,11 @@ def validate_image(image_bytes: bytes, max_size_mb: int = 10) -> Tuple[bool, str
         if image.width < min_dimension or image.height < min_dimension:
             return False, f"Image dimensions too small (min {min_dimension}x{min_dimension})", info
         
+        # Validate decoded size (pixels across frames, estimated working memory)
+        over_budget = budget_error(estimate)
+        if over_budget:
+            return False, over_budget, info
+        
         return True, "", info
     
     except Exception as e:
@@ -0,0 +1,191 @@
+from io import BytesIO
+from typing import NamedTuple, Optional, Tuple
+import math
+import re
+
+import cv2
+import numpy as np
+from PIL import Image, ImageColor, ImageOps
+
+# Background kinds accepted by the process endpoints
+NONE = "none"
+COLOR = "color"
+GRADIENT = "gradient"
+BLUR = "blur"
+IMAGE = "image"
+BACKGROUND_KINDS = (NONE, COLOR, GRADIENT, BLUR, IMAGE)
+
+# How an uploaded background is fitted to the cutout
+COVER = "cover"  # Scale to fill, crop the overflow (centered)
+CONTAIN = "contain"  # Scale to fit, pad with `color`
+STRETCH = "stretch"  # Scale each axis independently
+FIT_MODES = (COVER, CONTAIN, STRETCH)
+
+OUTPUT_FORMATS = ("auto", "png", "jpeg", "webp")
+
+# Rows blended per pass; bounds the per-strip temporaries to a few MB
+STRIP_ROWS = 256
+
+# The blur background is computed at 1/BLUR_DOWNSCALE size; a Gaussian of
+# radius r there looks the same as radius r*BLUR_DOWNSCALE at full size
+BLUR_DOWNSCALE = 4
+
+# Extra bytes per pixel compositing needs on top of the cutout (output RGB
+# frame, full-frame background for blur/image modes)
+COMPOSITE_BYTES_PER_PIXEL = 8
+
+_HEX_COLOR = re.compile(r"^#?[0-9a-fA-F]{6}$")
+
+
+class Background(NamedTuple):
+    kind: str
+    color: Tuple[int, int, int] = (255, 255, 255)
+    color_to: Optional[Tuple[int, int, int]] = None  # Gradient end
+    angle: float = 90.0  # Gradient direction in degrees (0 = left to right, 90 = top to bottom)
+    blur_radius: float = 20.0
+    image: Optional[bytes] = None  # Uploaded background (already validated)
+    fit: str = COVER
+
+
+def parse_color(value: str) -> Tuple[int, int, int]:
+    """'#rrggbb', 'rrggbb' or a CSS color name -> (r, g, b). Raises ValueError."""
+    value = value.strip()
+    if _HEX_COLOR.match(value):
+        value = "#" + value.lstrip("#")
+    try:
+        color = ImageColor.getrgb(value)
+    except ValueError:
+        raise ValueError(f"Invalid color: {value}")
+    if len(color) == 4 and color[3] != 255:
+        raise ValueError("Background colors must be opaque")
+    return color[:3]
+
+
+def is_opaque_image(image_bytes: bytes) -> bool:
+    """Whether an (uploaded background) image has no transparent pixels."""
+    image = Image.open(BytesIO(image_bytes))
+    if image.mode not in ("RGBA", "LA", "PA") and "transparency" not in image.info:
+        return True
+    return image.convert("RGBA").getchannel("A").getextrema()[0] == 255
+
+
+def background_is_opaque(background: Optional[Background]) -> bool:
+    """Whether compositing onto `background` gives a fully opaque result (JPEG-safe)."""
+    if background is None or background.kind == NONE:
+        return False
+    if background.kind == IMAGE:
+        return is_opaque_image(background.image)
+    return True
+
+
+def _gradient_strip(background: Background, width: int, height: int, y0: int, y1: int) -> np.ndarray:
+    angle = math.radians(background.angle)
+    dx, dy = math.cos(angle), math.sin(angle)
+    extent = abs(width * dx) + abs(height * dy) or 1.0
+    x = (np.arange(width, dtype=np.float32) - width / 2) * dx
+    y = (np.arange(y0, y1, dtype=np.float32) - height / 2) * dy
+    t = np.clip((x[None, :] + y[:, None]) / extent + 0.5, 0.0, 1.0)
+    start = np.asarray(background.color, dtype=np.float32)
+    delta = np.asarray(background.color_to or background.color, dtype=np.float32) - start
+    return (start + t[..., None] * delta + 0.5).astype(np.uint8)
+
+
+def _blurred(cutout: Image.Image, radius: float) -> np.ndarray:
+    """Blurred original as an RGB array (the cutout keeps the original colors under its alpha)."""
+    rgb = np.asarray(cutout.convert("RGB"))
+    height, width = rgb.shape[:2]
+    small = cv2.resize(
+        rgb,
+        (max(1, width // BLUR_DOWNSCALE), max(1, height // BLUR_DOWNSCALE)),
+        interpolation=cv2.INTER_AREA
+    )
+    sigma = max(0.1, radius / BLUR_DOWNSCALE)
+    small = cv2.GaussianBlur(small, (0, 0), sigma)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def _fitted(background: Background, size: Tuple[int, int]) -> Image.Image:
+    image = Image.open(BytesIO(background.image))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info else "RGB")
+    if background.fit == CONTAIN:
+        padding = background.color + (255,) if image.mode == "RGBA" else background.color
+        return ImageOps.pad(image, size, Image.Resampling.LANCZOS, color=padding)
+    if background.fit == STRETCH:
+        return image.resize(size, Image.Resampling.LANCZOS)
+    return ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+
+
+def _solid_lut(color: Tuple[int, int, int]) -> np.ndarray:
+    """cv2.LUT table of color * (255 - a) / 255, indexed by 255 - a."""
+    return (np.outer(np.arange(256), color) / 255 + 0.5).astype(np.uint8).reshape(256, 1, 3)
+
+
+def _blend_opaque(fg: np.ndarray, bg: np.ndarray) -> np.ndarray:
+    """
+    'over' onto an opaque background: fg_premultiplied + bg*(1-a).
+
+    `fg` is premultiplied RGBa (Pillow does that in C). `bg` is either a
+    _solid_lut() table or a per-pixel RGB strip. Both terms are uint8 and sum
+    to at most 255, so OpenCV's saturating add never clips.
+    """
+    rgb = cv2.cvtColor(fg, cv2.COLOR_RGBA2RGB)
+    inverse = cv2.bitwise_not(np.ascontiguousarray(fg[..., 3]))
+    inverse = cv2.merge([inverse] * 3)
+    if bg.shape == (256, 1, 3):
+        return cv2.add(rgb, cv2.LUT(inverse, bg))
+    return cv2.add(rgb, cv2.multiply(np.ascontiguousarray(bg), inverse, scale=1 / 255))
+
+
+def _blend_translucent(fg: np.ndarray, bg: np.ndarray) -> np.ndarray:
+    """Premultiplied 'over' onto an RGBA background; returns straight-alpha RGBA."""
+    fa = fg[..., 3:4].astype(np.float32) / 255
+    ba = bg[..., 3:4].astype(np.float32) / 255
+    out_a = fa + ba * (1 - fa)
+    premultiplied = fg[..., :3] * fa + bg[..., :3] * (ba * (1 - fa))
+    rgb = np.divide(premultiplied, out_a, out=np.zeros_like(premultiplied), where=out_a > 0)
+    return np.concatenate([rgb, out_a * 255], axis=-1).round().astype(np.uint8)
+
+
+def composite(cutout: Image.Image, background: Background) -> Image.Image:
+    """
+    Composite an RGBA cutout onto `background`.
+
+    Blending is vectorized (Pillow/OpenCV/NumPy, no per-pixel Python) over
+    strips of STRIP_ROWS rows, with the foreground premultiplied by its
+    alpha. Solid colors and gradients are generated per strip and never
+    materialized at full size.
+
+    Returns:
+        RGB image for opaque backgrounds, RGBA when an uploaded background has transparency
+    """
+    if background.kind == NONE:
+        return cutout
+    cutout = cutout if cutout.mode == "RGBA" else cutout.convert("RGBA")
+    width, height = cutout.size
+
+    full_bg = None
+    if background.kind == BLUR:
+        full_bg = _blurred(cutout, background.blur_radius)
+    elif background.kind == IMAGE:
+        fitted = _fitted(background, cutout.size)
+        full_bg = np.asarray(fitted)
+    translucent = full_bg is not None and full_bg.shape[-1] == 4
+
+    output = Image.new("RGBA" if translucent else "RGB", cutout.size)
+    solid = _solid_lut(background.color)
+    for y0 in range(0, height, STRIP_ROWS):
+        y1 = min(height, y0 + STRIP_ROWS)
+        strip = cutout.crop((0, y0, width, y1))
+        if background.kind == COLOR:
+            bg = solid
+        elif background.kind == GRADIENT:
+            bg = _gradient_strip(background, width, height, y0, y1)
+        else:
+            bg = full_bg[y0:y1]
+        if translucent:
+            blended = _blend_translucent(np.asarray(strip), bg)
+        else:
+            blended = _blend_opaque(np.asarray(strip.convert("RGBa")), bg)
+        output.paste(Image.fromarray(blended), (0, y0))
+    return output
@@ -0,0 +1,143 @@
+from typing import Awaitable, Callable, NamedTuple, Optional
+import asyncio
+import logging
+import time
+
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import text
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeResult(NamedTuple):
+    ok: bool
+    detail: Optional[str]
+    latency_ms: float
+    checked_at: float
+
+
+class HealthMonitor:
+    """
+    Dependency probes refreshed by a background task.
+
+    Readiness requests only read the cached results, so orchestrator polling
+    costs nothing no matter how often it happens. Critical probes decide
+    readiness; non-critical ones are reported but do not take the pod out of
+    rotation (the app degrades gracefully without them). Results older than
+    `stale_after` count as failed, so a stuck probe loop makes the pod
+    not-ready instead of reporting stale success.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 2.0,
+        stale_after: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.clock = clock
+        self.warm = False
+        self._probes = {}
+        self._results = {}
+
+    def register(self, name: str, probe: Callable[[], Awaitable[Optional[str]]], critical: bool = True) -> None:
+        """Add a probe: an async callable that raises on failure and may return a detail string."""
+        self._probes[name] = (probe, critical)
+
+    def mark_warm(self) -> None:
+        self.warm = True
+
+    async def _check(self, name: str, probe) -> None:
+        started = self.clock()
+        try:
+            detail = await asyncio.wait_for(probe(), self.timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            ok, detail = False, f"timed out after {self.timeout}s"
+        except Exception as e:
+            ok, detail = False, str(e)
+        finished = self.clock()
+        previous = self._results.get(name)
+        if not ok and (previous is None or previous.ok):
+            logger.warning(f"Health probe '{name}' failing: {detail}")
+        self._results[name] = ProbeResult(ok, detail, round((finished - started) * 1000, 1), finished)
+
+    async def refresh(self) -> None:
+        """Run every probe concurrently and cache the results."""
+        await asyncio.gather(*(self._check(name, probe) for name, (probe, _) in self._probes.items()))
+
+    def snapshot(self) -> dict:
+        """Cached view of all probes plus the overall readiness verdict."""
+        now = self.clock()
+        checks = {}
+        ready = self.warm
+        for name, (_, critical) in self._probes.items():
+            result = self._results.get(name)
+            if result is None:
+                check = {"ok": False, "critical": critical, "detail": "not checked yet"}
+            else:
+                age = now - result.checked_at
+                stale = age > self.stale_after
+                check = {
+                    "ok": result.ok and not stale,
+                    "critical": critical,
+                    "detail": "stale result" if stale and result.ok else result.detail,
+                    "latency_ms": result.latency_ms,
+                    "age_seconds": round(age, 1)
+                }
+            if critical and not check["ok"]:
+                ready = False
+            checks[name] = check
+        return {"ready": ready, "warm": self.warm, "checks": checks}
+
+    async def run(self, interval: float = None) -> None:
+        """Background task: refresh probes every `interval` seconds until cancelled."""
+        interval = interval or settings.HEALTH_PROBE_INTERVAL_SECONDS
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health probe refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+
+health_monitor = HealthMonitor(
+    timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+    stale_after=settings.HEALTH_PROBE_STALE_SECONDS
+)
+
+
+async def _probe_model() -> str:
+    if not health_monitor.warm:
+        raise RuntimeError("model warming up")
+    return "loaded"
+
+
+async def _probe_database() -> str:
+    from app.db.base import AsyncSessionLocal, async_engine
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+    return f"pool: {async_engine.pool.status()}"
+
+
+async def _probe_redis() -> str:
+    from app.core.redis import get_redis
+    await run_in_threadpool(get_redis().ping)
+    return "ok"
+
+
+async def _probe_s3() -> str:
+    from app.services.storage import check_s3_connection
+    if not await run_in_threadpool(check_s3_connection):
+        raise RuntimeError(f"bucket {settings.S3_BUCKET_NAME} unreachable")
+    return "ok"
+
+
+health_monitor.register("model", _probe_model)
+health_monitor.register("database", _probe_database)
+# Rate limits, stats and rollups fall back when Redis is down - report, don't fail readiness
+health_monitor.register("redis", _probe_redis, critical=False)
+if settings.S3_BUCKET_NAME:
+    health_monitor.register("s3", _probe_s3, critical=False)
@@ -0,0 +1,118 @@
+from typing import NamedTuple, Optional
+import logging
+
+import numpy as np
+from PIL import Image, ImageMode
+
+from app.core.config import settings
+from app.services.compositing import COMPOSITE_BYTES_PER_PIXEL
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Bytes per pixel the pipeline allocates on top of the decoded image and its
+# working copy (Pillow stores every multi-band 8-bit mode as 4 bytes/pixel):
+# RGB conversion for the model (4), EXIF transpose (4), full-size mask (1),
+# guided filter float32 grid at 1/16 resolution (6), rembg/Pillow temporaries
+# (6), PNG encode buffer headroom (3). Rough by design; it only has to rank
+# and bound.
+WORKING_BYTES_PER_PIXEL = 24
+
+
+class DecodeEstimate(NamedTuple):
+    width: int
+    height: int
+    mode: str
+    frames: int
+    bytes_per_pixel: int
+    pixels: int  # All frames
+    decoded_bytes: int  # One decoded frame in Pillow's in-memory layout
+    peak_bytes: int  # Estimated peak for remove_background(), excluding the model itself
+
+
+def bytes_per_pixel(mode: str) -> int:
+    """In-memory size of one pixel for a Pillow mode (not the file's bit depth)."""
+    try:
+        descriptor = ImageMode.getmode(mode)
+    except KeyError:
+        return 4
+    if len(descriptor.bands) > 1:
+        return 4
+    return max(1, np.dtype(descriptor.typestr).itemsize)
+
+
+def frame_count(image: Image.Image) -> int:
+    """Frame count from the container header (1 if the format has no frames or it is unreadable)."""
+    try:
+        return max(1, int(getattr(image, "n_frames", 1)))
+    except Exception:
+        return 1
+
+
+def estimate_decode(image: Image.Image, frames: Optional[int] = None) -> DecodeEstimate:
+    """
+    Estimate decode and processing memory from an opened (not yet loaded) image.
+
+    Only header metadata is used - size, mode and frame count - so this is
+    safe to call on untrusted input before any pixel data is decoded.
+    """
+    width, height = image.size
+    frames = frame_count(image) if frames is None else frames
+    per_pixel = bytes_per_pixel(image.mode)
+    frame_pixels = width * height
+    decoded = frame_pixels * per_pixel
+    # Decoded frame + working copy, then the fixed pipeline overhead per pixel
+    peak = 2 * decoded + frame_pixels * WORKING_BYTES_PER_PIXEL
+    return DecodeEstimate(width, height, image.mode, frames, per_pixel, frame_pixels * frames, decoded, peak)
+
+
+def budget_error(estimate: DecodeEstimate) -> Optional[str]:
+    """Why the image is over the pixel/memory budget, or None if it fits."""
+    frame_pixels = estimate.width * estimate.height
+    if frame_pixels > settings.MAX_IMAGE_PIXELS:
+        return (
+            f"Image too large to process: {frame_pixels / 1_000_000:.1f} megapixels "
+            f"(max {settings.MAX_IMAGE_PIXELS / 1_000_000:.1f})"
+        )
+    # Frames are processed one at a time, so these bound the work, not memory
+    if estimate.frames > settings.MAX_ANIMATION_FRAMES:
+        return f"Animation has too many frames: {estimate.frames} (max {settings.MAX_ANIMATION_FRAMES})"
+    if estimate.pixels > settings.MAX_ANIMATION_PIXELS:
+        return (
+            f"Animation too large to process: {estimate.pixels / 1_000_000:.1f} megapixels "
+            f"across {estimate.frames} frame(s) (max {settings.MAX_ANIMATION_PIXELS / 1_000_000:.1f})"
+        )
+    if estimate.peak_bytes > settings.MAX_DECODE_MEMORY_MB * MB:
+        return (
+            f"Image too large to process: needs ~{estimate.peak_bytes // MB}MB of memory "
+            f"(max {settings.MAX_DECODE_MEMORY_MB}MB)"
+        )
+    return None
+
+
+def apng_bytes(estimate: DecodeEstimate) -> int:
+    """Memory Pillow's APNG writer holds for an animation (every output frame as RGBA)."""
+    return estimate.frames * estimate.width * estimate.height * 4
+
+
+def inference_cost(estimate: DecodeEstimate, compositing: bool = False, output_format: str = "png") -> int:
+    """
+    Bytes to reserve against the inference memory budget while this image is processed.
+
+    Animations are processed one frame at a time, so peak_bytes (one frame)
+    still applies, except for APNG output which keeps every frame.
+    """
+    extra = estimate.width * estimate.height * COMPOSITE_BYTES_PER_PIXEL if compositing else 0
+    if estimate.frames > 1 and output_format == "png":
+        extra += apng_bytes(estimate)
+    return estimate.peak_bytes + extra + settings.INFERENCE_BASE_MEMORY_MB * MB
+
+
+def describe(estimate: DecodeEstimate) -> dict:
+    """Estimate fields for validation info dicts and logs."""
+    return {
+        'frames': estimate.frames,
+        'megapixels': round(estimate.pixels / 1_000_000, 3),
+        'estimated_memory_mb': round(estimate.peak_bytes / MB, 1)
+    }
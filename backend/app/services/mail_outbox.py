@@ -0,0 +1,209 @@
+from email.message import EmailMessage
+from typing import List, NamedTuple, Optional
+import asyncio
+import logging
+import random
+
+import aiosmtplib
+from jinja2 import Template
+
+logger = logging.getLogger(__name__)
+
+
+class OutgoingEmail(NamedTuple):
+    subject: str
+    recipients: List[str]
+    template: Template  # Precompiled; rendered by the worker, not the request
+    context: dict
+    reply_to: Optional[str] = None
+
+
+class OutboxFull(Exception):
+    """The outbound queue is at capacity (mail server down or far behind)."""
+
+
+class EmailOutbox:
+    """
+    Background email sender with one persistent SMTP connection per process.
+
+    enqueue() only puts the message on an in-memory queue, so API requests
+    never wait on the mail server. A single worker task takes messages in
+    batches and sends them over one connection (STARTTLS and login happen
+    once per connection, not per message). The connection is closed after
+    `idle_timeout` seconds without mail and reopened on demand. Failed
+    messages are re-queued with exponential backoff plus jitter, up to
+    `max_attempts`.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        sender: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = False,
+        use_tls: bool = False,
+        validate_certs: bool = True,
+        timeout: float = 10.0,
+        queue_size: int = 1000,
+        batch_size: int = 20,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        idle_timeout: float = 30.0
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.use_tls = use_tls
+        self.validate_certs = validate_certs
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_timeout = idle_timeout
+        self._queue = None
+        self._worker = None
+        self._smtp = None
+        self._retry_handles = set()
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        return self._queue
+
+    def enqueue(self, email: OutgoingEmail) -> None:
+        """Queue a message for delivery. Raises OutboxFull instead of blocking."""
+        try:
+            self._get_queue().put_nowait((email, 1))
+        except asyncio.QueueFull:
+            raise OutboxFull(f"Email queue is full ({self.queue_size} messages)")
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """Start the worker on the running event loop."""
+        if self._worker is None or self._worker.done():
+            self._get_queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Give queued mail `drain_timeout` seconds to go out, then stop and disconnect."""
+        if self._worker is not None and self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Email outbox stopped with {self.pending()} messages unsent")
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for handle in self._retry_handles:
+            handle.cancel()
+        if self._retry_handles:
+            logger.warning(f"Email outbox dropped {len(self._retry_handles)} pending retries on shutdown")
+        self._retry_handles.clear()
+        await self._disconnect()
+        # The queue belongs to this event loop; start() on a new loop gets a fresh one
+        self._queue = None
+
+    async def _run(self) -> None:
+        queue = self._get_queue()
+        while True:
+            try:
+                first = await asyncio.wait_for(queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                await self._disconnect()
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._send_batch(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _send_batch(self, batch: list) -> None:
+        for email, attempt in batch:
+            try:
+                await self._send(email)
+                self.sent += 1
+            except Exception as e:
+                await self._disconnect()
+                self._retry_later(email, attempt, e)
+
+    async def _send(self, email: OutgoingEmail) -> None:
+        message = EmailMessage()
+        message["Subject"] = email.subject
+        message["From"] = self.sender
+        message["To"] = ", ".join(email.recipients)
+        if email.reply_to:
+            message["Reply-To"] = email.reply_to
+        message.set_content(email.template.render(**email.context), subtype="html")
+
+        smtp = await self._connection()
+        try:
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Server dropped an idle connection: reconnect once and retry right away
+            await self._disconnect()
+            smtp = await self._connection()
+            await smtp.send_message(message)
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            validate_certs=self.validate_certs,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        if self.username and self.password:
+            await smtp.login(self.username, self.password)
+        self.connections += 1
+        self._smtp = smtp
+        return smtp
+
+    async def _disconnect(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+    def _retry_later(self, email: OutgoingEmail, attempt: int, error: Exception) -> None:
+        if attempt >= self.max_attempts:
+            self.failed += 1
+            logger.error(f"Giving up on email '{email.subject}' to {email.recipients} after {attempt} attempts: {str(error)}")
+            return
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+        logger.warning(f"Email '{email.subject}' failed (attempt {attempt}), retrying in {delay:.1f}s: {str(error)}")
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            try:
+                self._get_queue().put_nowait((email, attempt + 1))
+            except asyncio.QueueFull:
+                self.failed += 1
+                logger.error(f"Email queue full, dropping retry of '{email.subject}' to {email.recipients}")
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retry_handles.add(handle)
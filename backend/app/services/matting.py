@@ -0,0 +1,251 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+from pymatting import estimate_alpha_cf, estimate_foreground_ml
+
+from app.core.config import settings
+
+# Side of the model's mask (ISNet runs at 1024x1024); larger images get a mask upscaled from it
+MASK_RESOLUTION = 1024
+
+# Guided filter defaults. The radius (full-resolution pixels) has to cover
+# the blur left by upscaling the mask, so it grows with the upscale factor
+# (GUIDED_RADIUS_PER_UPSCALE per 1x, at least GUIDED_RADIUS); eps is the edge
+# threshold in (0-1 intensity)^2 units. Tuned with benchmarks/bench_edge_refinement.py.
+GUIDED_RADIUS = 8
+GUIDED_RADIUS_PER_UPSCALE = 4
+GUIDED_EPS = 1e-4
+GUIDED_SUBSAMPLE = 4
+
+# Full-resolution pixels written per pass (bounds the float temporaries of
+# the final a*I + b step to ~10MB whatever the image size)
+STRIP_PIXELS = 256 * 1024
+
+# Trimap from the model's mask (same thresholds and erosion rembg's
+# alpha_matting option used): only pixels between the eroded sure-foreground
+# and sure-background are solved
+MATTING_FOREGROUND_THRESHOLD = 240
+MATTING_BACKGROUND_THRESHOLD = 10
+MATTING_ERODE_SIZE = 10
+
+# The unknown band is solved in independent tiles of MATTING_TILE pixels;
+# each tile also sees MATTING_TILE_MARGIN pixels of its neighbours, so the
+# solutions agree across tile seams. Tuned with benchmarks/bench_edge_refinement.py.
+MATTING_TILE = 128
+MATTING_TILE_MARGIN = 16
+
+# pymatting's Laplacian, preconditioner and foreground estimation are numba
+# code that releases the GIL, so tiles solve in parallel on a small dedicated pool
+_matting_executor = ThreadPoolExecutor(
+    max_workers=settings.MATTING_WORKERS,
+    thread_name_prefix="matting"
+)
+
+Tile = Tuple[int, int, int, int]  # left, top, right, bottom
+
+
+def _box(x: np.ndarray, radius: int) -> np.ndarray:
+    """Mean over a (2r+1)^2 window: O(1) per pixel whatever the radius."""
+    return cv2.boxFilter(x, -1, (2 * radius + 1, 2 * radius + 1), borderType=cv2.BORDER_REFLECT)
+
+
+def _guided_coefficients(guide: np.ndarray, source: np.ndarray, radius: int, eps: float) -> np.ndarray:
+    """
+    Smoothed linear coefficients of the color guided filter q = a.I + b, as (h, w, 4): a_r, a_g, a_b, b.
+
+    `guide` is (h, w, 3) float32 in 0-1, `source` (h, w) float32. The 3x3
+    covariance of the guide is inverted per pixel in closed form (cofactors),
+    fully vectorized; intermediates are updated in place and dropped as soon
+    as they are used.
+    """
+    mean_i = _box(guide, radius)
+    mean_p = _box(source, radius)
+    cov_ip = _box(guide * source[..., None], radius)
+    cov_ip -= mean_i * mean_p[..., None]
+
+    # Covariance of the guide: rr, rg, rb, gg, gb, bb (regularized diagonal)
+    sigma = {}
+    for name, (i, j) in {"rr": (0, 0), "rg": (0, 1), "rb": (0, 2), "gg": (1, 1), "gb": (1, 2), "bb": (2, 2)}.items():
+        sigma[name] = _box(guide[..., i] * guide[..., j], radius)
+        sigma[name] -= mean_i[..., i] * mean_i[..., j]
+        if i == j:
+            sigma[name] += eps
+    rr, rg, rb, gg, gb, bb = (sigma.pop(name) for name in ("rr", "rg", "rb", "gg", "gb", "bb"))
+
+    # Inverse of the symmetric [[rr rg rb] [rg gg gb] [rb gb bb]] via cofactors
+    inv_rr = gg * bb - gb * gb
+    inv_rg = gb * rb - rg * bb
+    inv_rb = rg * gb - gg * rb
+    inv_gg = rr * bb - rb * rb
+    inv_gb = rb * rg - rr * gb
+    inv_bb = rr * gg - rg * rg
+    det = rr * inv_rr + rg * inv_rg + rb * inv_rb
+    del rr, rg, rb, gg, gb, bb
+
+    coefficients = np.empty(source.shape + (4,), dtype=np.float32)
+    cr, cg, cb = cov_ip[..., 0], cov_ip[..., 1], cov_ip[..., 2]
+    for channel, (x, y, z) in enumerate(((inv_rr, inv_rg, inv_rb), (inv_rg, inv_gg, inv_gb), (inv_rb, inv_gb, inv_bb))):
+        a = coefficients[..., channel]
+        np.multiply(x, cr, out=a)
+        a += y * cg
+        a += z * cb
+        a /= det
+    del inv_rr, inv_rg, inv_rb, inv_gg, inv_gb, inv_bb, det, cov_ip
+    coefficients[..., 3] = mean_p - np.einsum("hwc,hwc->hw", coefficients[..., :3], mean_i)
+    return _box(coefficients, radius)
+
+
+def guided_filter_mask(
+    image: Image.Image,
+    mask: Image.Image,
+    radius: Optional[int] = None,
+    eps: float = GUIDED_EPS,
+    subsample: int = GUIDED_SUBSAMPLE
+) -> Image.Image:
+    """
+    Snap a coarse mask to the image's edges with the fast guided filter.
+
+    The full-resolution RGB is the guide and the model's mask the input
+    (He & Sun, "Fast Guided Filter", 2015): the filter coefficients are
+    computed on a `subsample`-times smaller grid with box filters (O(N),
+    independent of the radius), then upsampled bilinearly and applied to the
+    full-resolution guide strip by strip. Edges come from the photo, so a
+    mask upscaled from the model's 1024px output regains hair and contour
+    detail instead of being blurred further (as refine_mask_edges does).
+
+    Args:
+        image: Original RGB/RGBA image (the guide; its alpha is ignored)
+        mask: Coarse L mask, any size (resized to the image)
+        radius: Window radius in full-resolution pixels (None = scaled to the mask upscale factor)
+        eps: Regularization; larger keeps the mask smoother
+        subsample: Grid reduction for the coefficient pass (1 = exact guided filter)
+
+    Returns:
+        Refined L mask the size of `image`
+    """
+    width, height = image.size
+    if radius is None:
+        radius = max(GUIDED_RADIUS, round(GUIDED_RADIUS_PER_UPSCALE * max(width, height) / MASK_RESOLUTION))
+    small = (max(1, round(width / subsample)), max(1, round(height / subsample)))
+    guide = np.asarray(image.resize(small, Image.Resampling.BOX), dtype=np.float32)[..., :3] / 255
+    source = np.asarray(mask.resize(small, Image.Resampling.BILINEAR), dtype=np.float32) / 255
+    coefficients = _guided_coefficients(guide, source, max(1, round(radius / subsample)), eps)
+
+    # Bilinear lookup of the coefficient grid at every full-resolution pixel
+    # center (same convention as cv2.resize), evaluated one strip at a time
+    map_x = ((np.arange(width, dtype=np.float32) + 0.5) * small[0] / width - 0.5)[None, :]
+    output = np.empty((height, width), dtype=np.uint8)
+    rows = max(1, STRIP_PIXELS // width)
+    for y0 in range(0, height, rows):
+        y1 = min(height, y0 + rows)
+        map_y = ((np.arange(y0, y1, dtype=np.float32) + 0.5) * small[1] / height - 0.5)[:, None]
+        xs = np.broadcast_to(map_x, (y1 - y0, width))
+        ys = np.broadcast_to(map_y, (y1 - y0, width))
+        ab = cv2.remap(coefficients, xs, ys, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        strip = np.asarray(image.crop((0, y0, width, y1)), dtype=np.float32)[..., :3]
+        q = np.einsum("hwc,hwc->hw", ab[..., :3], strip) / 255 + ab[..., 3]
+        np.clip(q * 255 + 0.5, 0, 255, out=q)
+        output[y0:y1] = q
+    return Image.fromarray(output)
+
+
+def trimap_from_mask(
+    mask: np.ndarray,
+    foreground_threshold: int = MATTING_FOREGROUND_THRESHOLD,
+    background_threshold: int = MATTING_BACKGROUND_THRESHOLD,
+    erode_size: int = MATTING_ERODE_SIZE
+) -> np.ndarray:
+    """uint8 trimap of an L mask array: 255 sure foreground, 0 sure background, 128 unknown."""
+    kernel = np.ones((erode_size, erode_size), dtype=np.uint8)
+    foreground = cv2.erode((mask > foreground_threshold).view(np.uint8), kernel)
+    background = cv2.erode((mask < background_threshold).view(np.uint8), kernel)
+    trimap = np.full(mask.shape, 128, dtype=np.uint8)
+    trimap[foreground.view(bool)] = 255
+    trimap[background.view(bool)] = 0
+    return trimap
+
+
+def matting_tiles(trimap: np.ndarray, tile: int = MATTING_TILE) -> List[Tile]:
+    """The cells of a `tile`-sized grid that contain unknown pixels (their number follows the contour length)."""
+    height, width = trimap.shape
+    unknown = trimap == 128
+    rows = np.logical_or.reduceat(unknown, np.arange(0, height, tile), axis=0)
+    cells = np.logical_or.reduceat(rows, np.arange(0, width, tile), axis=1)
+    return [
+        (x * tile, y * tile, min(width, (x + 1) * tile), min(height, (y + 1) * tile))
+        for y, x in zip(*np.nonzero(cells))
+    ]
+
+
+def _solve_tile(image: Image.Image, trimap: np.ndarray, cell: Tile, margin: int):
+    """
+    Closed-form alpha and foreground colors for one cell, solved on the cell plus `margin`.
+
+    Returns (alpha, foreground) for the cell only, as float64 0-1 arrays, or
+    None when the padded tile has no sure foreground or no sure background:
+    matting cannot place the edge without both, and the model's mask is kept.
+    """
+    left, top, right, bottom = cell
+    height, width = trimap.shape
+    x0, y0 = max(0, left - margin), max(0, top - margin)
+    x1, y1 = min(width, right + margin), min(height, bottom + margin)
+    tri = trimap[y0:y1, x0:x1]
+    if not (tri == 255).any() or not (tri == 0).any():
+        return None
+    rgb = np.asarray(image.crop((x0, y0, x1, y1)))[..., :3] / 255.0
+    alpha = estimate_alpha_cf(rgb, tri / 255.0)
+    foreground = estimate_foreground_ml(rgb, alpha)
+    inner = (slice(top - y0, bottom - y0), slice(left - x0, right - x0))
+    return alpha[inner], foreground[inner]
+
+
+def narrow_band_matting(
+    image: Image.Image,
+    mask: Image.Image,
+    tile: int = MATTING_TILE,
+    margin: int = MATTING_TILE_MARGIN
+) -> Image.Image:
+    """
+    Closed-form alpha matting restricted to the uncertain band of the model's mask.
+
+    The mask (resized to the image) gives a trimap; only the grid cells that
+    contain unknown pixels are solved, each on its own padded tile and in
+    parallel, so the cost follows the subject's contour rather than the image
+    area. Known pixels keep the trimap's 0/255. Inside the band the image's
+    colors are replaced by the estimated foreground (no background bleeding
+    through hair), in place and tile by tile.
+
+    Args:
+        image: RGB/RGBA image at output size; its band pixels are recolored in place
+        mask: Model mask, any size
+        tile: Grid cell size in pixels
+        margin: Context around each cell the solver also sees
+
+    Returns:
+        Matted L mask the size of `image`
+    """
+    if mask.size != image.size:
+        mask = mask.resize(image.size, Image.Resampling.LANCZOS)
+    model = np.asarray(mask)
+    trimap = trimap_from_mask(model)
+    alpha = trimap.copy()
+    cells = matting_tiles(trimap, tile)
+    if cells:
+        # All tiles read the original colors: nothing is written back until every tile is solved
+        results = list(_matting_executor.map(lambda cell: _solve_tile(image, trimap, cell, margin), cells))
+        for cell, result in zip(cells, results):
+            left, top, right, bottom = cell
+            unknown = trimap[top:bottom, left:right] == 128
+            if result is None:
+                alpha[top:bottom, left:right][unknown] = model[top:bottom, left:right][unknown]
+                continue
+            cell_alpha, foreground = result
+            alpha[top:bottom, left:right][unknown] = np.clip(cell_alpha[unknown] * 255 + 0.5, 0, 255)
+            # Recolor only the band: crop, edit and paste back one cell
+            recolored = np.array(image.crop(cell))
+            recolored[..., :3][unknown] = np.clip(foreground[unknown] * 255 + 0.5, 0, 255)
+            image.paste(Image.fromarray(recolored, image.mode), cell[:2])
+    return Image.fromarray(alpha)
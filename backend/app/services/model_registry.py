@@ -0,0 +1,254 @@
+"""
+Offline model bundle.
+
+With MODEL_DIR set, models are loaded only from that directory, after their
+checksums are verified; nothing is downloaded at startup, and a missing or
+corrupt file fails warm-up (readiness stays 503) instead of a request.
+
+The bundle is built ahead of time, e.g. while building the Docker image:
+
+    python -m app.services.model_registry fetch [--dir DIR] [MODEL ...]
+
+which downloads each model (checked against the checksum pinned in MODELS),
+then re-saves it with basic graph optimizations applied and its weights in a
+separate file. onnxruntime memory-maps such external weights instead of
+copying them to the heap, so the workers on a host share one copy through
+the page cache. manifest.json records the prepared files and their sha256.
+
+Without MODEL_DIR, rembg downloads the model into ~/.u2net on first use.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 1 << 20
+# Smaller initializers stay inline in the graph; only big weight tensors are worth mapping
+EXTERNAL_WEIGHTS_MIN_BYTES = 1024
+
+
+class ModelSpec(NamedTuple):
+    name: str  # rembg model name
+    url: str
+    checksum: str  # "algorithm:hexdigest" of the downloaded file
+
+    @property
+    def filename(self) -> str:
+        return f"{self.name}.onnx"
+
+    @property
+    def prepared_filename(self) -> str:
+        return f"{self.name}.mmap.onnx"
+
+    @property
+    def weights_filename(self) -> str:
+        return f"{self.name}.mmap.onnx.data"
+
+
+MODELS: Dict[str, ModelSpec] = {
+    spec.name: spec for spec in [
+        ModelSpec(
+            "isnet-general-use",
+            "https://github.com/danielgatis/rembg/releases/download/v0.0.0/isnet-general-use.onnx",
+            "md5:fc16ebd8b0c10d971d3513d564d01e29",
+        ),
+    ]
+}
+
+
+class ModelUnavailable(Exception):
+    """The model is not in the bundle (or the bundle is not usable)."""
+
+
+class ChecksumMismatch(ModelUnavailable):
+    """A bundled file does not match its recorded checksum."""
+
+
+def file_checksum(path: Path, algorithm: str = "sha256") -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as handle:
+        while chunk := handle.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return f"{algorithm}:{digest.hexdigest()}"
+
+
+def verify(path: Path, checksum: str) -> None:
+    if not path.is_file():
+        raise ModelUnavailable(f"{path} is missing")
+    actual = file_checksum(path, checksum.split(":", 1)[0])
+    if actual != checksum:
+        raise ChecksumMismatch(f"{path} has checksum {actual}, expected {checksum}")
+
+
+def get_spec(name: str) -> ModelSpec:
+    try:
+        return MODELS[name]
+    except KeyError:
+        raise ModelUnavailable(f"Unknown model {name!r} (registered: {', '.join(MODELS)})") from None
+
+
+def read_manifest(directory: Path) -> dict:
+    try:
+        return json.loads((directory / MANIFEST_NAME).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(directory: Path, manifest: dict) -> None:
+    temporary = directory / f".{MANIFEST_NAME}.tmp"
+    temporary.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    os.replace(temporary, directory / MANIFEST_NAME)
+
+
+def prepare(spec: ModelSpec, directory: Path) -> dict:
+    """
+    Write the load-ready copy of an already downloaded model (weights in an
+    external file) and record it in the manifest. Returns the manifest entry.
+    """
+    import onnxruntime as ort
+
+    source = directory / spec.filename
+    verify(source, spec.checksum)
+    # ORT writes the weights file next to the model under a fixed name; build
+    # both in a scratch directory and move them in, so readers never see half
+    with tempfile.TemporaryDirectory(dir=directory, prefix=".prepare-") as scratch:
+        options = ort.SessionOptions()
+        # Basic optimizations only: the saved graph must stay portable across CPUs
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+        options.optimized_model_filepath = str(Path(scratch) / spec.prepared_filename)
+        options.add_session_config_entry("session.optimized_model_external_initializers_file_name", spec.weights_filename)
+        options.add_session_config_entry(
+            "session.optimized_model_external_initializers_min_size_in_bytes", str(EXTERNAL_WEIGHTS_MIN_BYTES)
+        )
+        ort.InferenceSession(str(source), options, providers=["CPUExecutionProvider"])
+        for filename in (spec.weights_filename, spec.prepared_filename):
+            os.replace(Path(scratch) / filename, directory / filename)
+
+    entry = {
+        "source": spec.filename,
+        "source_checksum": spec.checksum,
+        "file": spec.prepared_filename,
+        "checksum": file_checksum(directory / spec.prepared_filename),
+        "weights": spec.weights_filename,
+        "weights_checksum": file_checksum(directory / spec.weights_filename),
+        "onnxruntime": ort.__version__,
+    }
+    manifest = read_manifest(directory)
+    manifest[spec.name] = entry
+    _write_manifest(directory, manifest)
+    return entry
+
+
+def fetch(name: str, directory: Path) -> dict:
+    """Download (unless already present and intact) and prepare one model."""
+    import pooch
+
+    spec = get_spec(name)
+    directory.mkdir(parents=True, exist_ok=True)
+    # pooch checks the hash of an existing file too, and downloads again on mismatch
+    try:
+        pooch.retrieve(spec.url, known_hash=spec.checksum, fname=spec.filename, path=directory, progressbar=False)
+    except Exception as e:  # Network errors (requests) or a download that fails its checksum (ValueError)
+        raise ModelUnavailable(f"Could not download {name}: {e}") from e
+    return prepare(spec, directory)
+
+
+def resolve(name: str, directory: Optional[Path] = None) -> Path:
+    """
+    Verified path of the model to load from the bundle: the prepared copy
+    (memory-mapped weights) when the manifest has one, else the downloaded
+    file itself. Raises ModelUnavailable if neither is usable.
+    """
+    directory = Path(directory or settings.MODEL_DIR)
+    spec = get_spec(name)
+    entry = read_manifest(directory).get(name)
+    if entry:
+        verify(directory / entry["file"], entry["checksum"])
+        verify(directory / entry["weights"], entry["weights_checksum"])
+        return directory / entry["file"]
+
+    source = directory / spec.filename
+    if not source.is_file():
+        raise ModelUnavailable(
+            f"{name} is not in {directory}; run `python -m app.services.model_registry fetch --dir {directory}`"
+        )
+    verify(source, spec.checksum)
+    logger.warning(f"{name} in {directory} is not prepared; loading it without memory-mapped weights")
+    return source
+
+
+def _session_options():
+    """The options rembg's new_session would use (OMP_NUM_THREADS caps ORT's threads)."""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    if "OMP_NUM_THREADS" in os.environ:
+        options.inter_op_num_threads = int(os.environ["OMP_NUM_THREADS"])
+        options.intra_op_num_threads = int(os.environ["OMP_NUM_THREADS"])
+    return options
+
+
+def load_session(name: str):
+    """A rembg session for `name`, from the bundle when MODEL_DIR is set."""
+    from rembg import new_session
+    from rembg.sessions import sessions_class
+
+    if not settings.MODEL_DIR:
+        return new_session(name)
+
+    started = time.perf_counter()
+    path = resolve(name)
+    session_class = next(sc for sc in sessions_class if sc.name() == name)
+
+    class BundledSession(session_class):
+        """rembg's session for this model, with its download step replaced by the bundle."""
+
+        @classmethod
+        def download_models(cls, *args, **kwargs):
+            return str(path)
+
+    session = BundledSession(name, _session_options())
+    logger.info(f"Loaded {name} from {path} in {time.perf_counter() - started:.2f}s (checksums verified)")
+    return session
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.services.model_registry", description="Build or check the offline model bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (("fetch", "Download, verify and prepare models"), ("verify", "Check the bundle's checksums")):
+        subparser = commands.add_parser(command, help=help_text)
+        subparser.add_argument("models", nargs="*", help=f"Default: all registered ({', '.join(MODELS)})")
+        subparser.add_argument("--dir", type=Path, default=settings.MODEL_DIR or None, help="Bundle directory (default: MODEL_DIR)")
+    args = parser.parse_args(argv)
+    if args.dir is None:
+        parser.error("--dir is required when MODEL_DIR is not set")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    failed = False
+    for name in args.models or list(MODELS):
+        try:
+            if args.command == "fetch":
+                entry = fetch(name, args.dir)
+                size_mb = (args.dir / entry["weights"]).stat().st_size / 1024 / 1024
+                print(f"{name}: {args.dir / entry['file']} (+{size_mb:.0f} MB weights)")
+            else:
+                print(f"{name}: {resolve(name, args.dir)} OK")
+        except ModelUnavailable as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
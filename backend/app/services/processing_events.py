@@ -0,0 +1,137 @@
+from collections import deque
+from datetime import datetime
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+from app.db import crud
+
+logger = logging.getLogger(__name__)
+
+# Events wait here (per process) until the background flusher inserts them in
+# batches. Bounded so a stalled database cannot grow memory; when full the
+# oldest events are dropped and counted.
+_buffer = deque(maxlen=settings.PROCESSING_EVENTS_BUFFER_SIZE)
+_dropped = 0
+# Consecutive failed inserts of the batch at the head of the buffer
+_failed_attempts = 0
+
+
+def record_event(
+    user_id: Optional[str],
+    status: str,
+    total_ms: float,
+    metadata: Optional[dict] = None,
+    bytes_in: Optional[int] = None,
+    bytes_out: Optional[int] = None,
+    created_at: Optional[datetime] = None
+) -> None:
+    """
+    Queue one processing event. Never touches the database or blocks.
+
+    Args:
+        user_id: Authenticated user id, or None for anonymous requests
+        status: 'ok' or 'failed'
+        total_ms: Wall time of the request's processing, including queueing
+        metadata: remove_background() metadata (stage timings, model, megapixels)
+    """
+    global _dropped
+    metadata = metadata or {}
+    timings = metadata.get("timings_ms", {})
+    if len(_buffer) == _buffer.maxlen:
+        _dropped += 1
+    _buffer.append({
+        "created_at": created_at or datetime.now(),
+        "user_id": user_id,
+        "status": status,
+        "model": metadata.get("model"),
+        "output_format": metadata.get("output_format"),
+        "megapixels": metadata.get("megapixels"),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "total_ms": round(total_ms, 2),
+        "queue_ms": timings.get("queue"),
+        "decode_ms": timings.get("decode"),
+        "inference_ms": timings.get("inference"),
+        "postprocess_ms": timings.get("postprocess"),
+        "encode_ms": timings.get("encode"),
+    })
+
+
+def pending_count() -> int:
+    return len(_buffer)
+
+
+async def flush_events(session_factory=None) -> int:
+    """
+    Insert buffered events, BATCH_SIZE rows per executemany.
+
+    A failed batch is put back at the front of the buffer for the next flush;
+    events the buffer has no room for are counted as dropped. After
+    PROCESSING_EVENTS_MAX_ATTEMPTS consecutive failures the batch is dropped
+    instead, so rows that can never insert (e.g. a created_at with no
+    partition) cannot wedge the flusher.
+
+    Returns:
+        Number of events written
+    """
+    global _dropped, _failed_attempts
+    if session_factory is None:
+        from app.db.base import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    if _dropped:
+        logger.warning(f"Processing events buffer full, dropped {_dropped} events")
+        _dropped = 0
+
+    written = 0
+    while _buffer:
+        batch = [_buffer.popleft() for _ in range(min(len(_buffer), settings.PROCESSING_EVENTS_BATCH_SIZE))]
+        try:
+            async with session_factory() as db:
+                written += await crud.insert_processing_events(db, batch)
+        except Exception as e:
+            _failed_attempts += 1
+            if _failed_attempts >= settings.PROCESSING_EVENTS_MAX_ATTEMPTS:
+                logger.error(f"Dropping {len(batch)} processing events after {_failed_attempts} failed inserts: {str(e)}")
+                _failed_attempts = 0
+            else:
+                # extendleft on a full deque evicts from the right (the newest events)
+                _dropped += max(0, len(_buffer) + len(batch) - _buffer.maxlen)
+                _buffer.extendleft(reversed(batch))
+            raise
+        _failed_attempts = 0
+    return written
+
+
+async def run_maintenance(session_factory=None) -> int:
+    """Create upcoming partitions and drop expired events."""
+    if session_factory is None:
+        from app.db.base import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+    async with session_factory() as db:
+        await crud.ensure_event_partitions(db)
+        pruned = await crud.prune_processing_events(db)
+    if pruned:
+        logger.info(f"Pruned {pruned} expired processing event partitions/rows")
+    return pruned
+
+
+async def run_flush_loop(interval: float = None) -> None:
+    """Background task: partition maintenance (hourly-ish) and event flushes until cancelled."""
+    interval = interval or settings.PROCESSING_EVENTS_FLUSH_INTERVAL_SECONDS
+    last_maintenance = None
+    while True:
+        if last_maintenance is None or time.monotonic() - last_maintenance >= settings.PROCESSING_EVENTS_MAINTENANCE_INTERVAL_SECONDS:
+            try:
+                await run_maintenance()
+                last_maintenance = time.monotonic()
+            except Exception as e:
+                logger.error(f"Processing events maintenance failed: {str(e)}")
+        await asyncio.sleep(interval)
+        try:
+            await flush_events()
+        except Exception as e:
+            logger.error(f"Processing events flush failed: {str(e)}")
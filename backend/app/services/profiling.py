@@ -0,0 +1,244 @@
+"""
+On-demand CPU profiling of a live API worker.
+
+StackSampler walks the Python stacks of the process's threads every few
+milliseconds (sys._current_frames(), no tracing hooks), so the profiled code
+runs at full speed and nothing is paid while no profile is running. Samples
+are kept as collapsed stacks ("thread;outer;...;leaf count", the input of
+flamegraph.pl and speedscope) and can be exported as a speedscope JSON flame
+graph.
+
+Two ways in, both admin-only and rate-limited per admin:
+- POST /admin/profiling/sample profiles every thread of the worker that
+  serves it for N seconds and returns the file.
+- A signed X-Profile-Token header (issued by /admin/profiling/token) on a
+  /process request samples the thread running that request's inference; the
+  result is stored in Redis and named by the X-Profile-Id response header.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis import get_async_redis
+from app.services.rate_limit import SlidingWindowLimiter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SKIPPED_HEADER = "X-Profile-Skipped"
+COLLAPSED = "collapsed"
+SPEEDSCOPE = "speedscope"
+
+# Leaf frames of threads that are blocked waiting for work, dropped unless idle=True
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+
+# Shared across workers (Redis), so a token cannot be replayed round-robin past the limit
+profiling_limiter = SlidingWindowLimiter(
+    "profiling",
+    limit=settings.PROFILING_MAX_PER_HOUR,
+    window_seconds=3600,
+    near_cache_seconds=0
+)
+
+# One on-demand session per worker: overlapping samplers would profile each other
+_session_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another on-demand profile is already running in this worker."""
+
+
+class StackSampler:
+    """
+    Samples thread stacks from a background thread until stop().
+
+    `thread_ids` limits sampling to those threads (default: all but the
+    sampler itself). Stacks are rooted at the thread's name.
+    """
+
+    def __init__(self, interval: float, thread_ids: Optional[Set[int]] = None, idle: bool = False):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.idle = idle
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._names: Dict[object, str] = {}  # code object -> frame label
+        self._thread_names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(own)
+
+    def _label(self, code) -> str:
+        label = self._names.get(code)
+        if label is None:
+            path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+            label = f"{getattr(code, 'co_qualname', code.co_name)} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+            self._names[code] = label
+        return label
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.get(ident, f"thread-{ident}")
+        return name
+
+    def _sample(self, own: int) -> None:
+        self.sample_count += 1
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (self.thread_ids is not None and ident not in self.thread_ids):
+                continue
+            code = frame.f_code
+            if not self.idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(self._thread_name(ident))
+            self.samples[tuple(reversed(stack))] += 1
+
+
+async def sample_process(seconds: float, interval: float, idle: bool = False) -> Counter:
+    """Sample every thread of this process for `seconds` (one session at a time)."""
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        sampler = StackSampler(interval, idle=idle).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            samples = sampler.stop()
+        return samples
+    finally:
+        _session_lock.release()
+
+
+def profiled(func: Callable, profile: dict, interval: float) -> Callable:
+    """Wrap `func` so the thread that runs it is sampled; the samples land in profile["samples"]."""
+    def run(*args, **kwargs):
+        sampler = StackSampler(interval, thread_ids={threading.get_ident()}).start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile["samples"] = sampler.stop()
+    return run
+
+
+def to_collapsed(samples: Counter) -> str:
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in samples.most_common())
+
+
+def parse_collapsed(text: str) -> Counter:
+    samples = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack:
+            samples[tuple(stack.split(";"))] += int(count)
+    return samples
+
+
+def to_speedscope(samples: Counter, name: str, interval: float) -> dict:
+    """A sampled profile in speedscope's file format (https://www.speedscope.app)."""
+    frames: Dict[str, int] = {}
+    stacks, weights = [], []
+    for stack, count in samples.most_common():
+        stacks.append([frames.setdefault(label, len(frames)) for label in stack])
+        weights.append(round(count * interval, 6))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "quickbg",
+        "shared": {"frames": [{"name": label} for label in frames]},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 6),
+            "samples": stacks,
+            "weights": weights,
+        }],
+    }
+
+
+def render(samples: Counter, output_format: str, name: str, interval: float) -> Tuple[bytes, str, str]:
+    """(body, media type, filename) of a profile in the requested format."""
+    if output_format == SPEEDSCOPE:
+        body = json.dumps(to_speedscope(samples, name, interval)).encode()
+        return body, "application/json", f"{name}.speedscope.json"
+    return to_collapsed(samples).encode(), "text/plain", f"{name}.collapsed.txt"
+
+
+def _signature(user_id: str, expires: int) -> str:
+    message = f"profile|{user_id}|{expires}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def sign_profile_token(user_id: str, ttl_seconds: int = settings.PROFILING_TOKEN_TTL_SECONDS) -> Tuple[str, int]:
+    """
+    A token for the X-Profile-Token header, bound to one admin and valid for
+    `ttl_seconds`. It is not a JWT, so it can never be used as an access token.
+    """
+    expires = int(time.time()) + ttl_seconds
+    return f"{expires}.{_signature(user_id, expires)}", expires
+
+
+def verify_profile_token(token: str, user_id: str) -> bool:
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(user_id, int(expires)))
+
+
+def _redis_key(profile_id: str) -> str:
+    return f"profile:{profile_id}"
+
+
+async def store_profile(samples: Counter) -> Optional[str]:
+    """Keep a request's profile (collapsed) in Redis for any worker to serve; None if Redis is down."""
+    profile_id = uuid.uuid4().hex
+    try:
+        await get_async_redis().set(_redis_key(profile_id), to_collapsed(samples), ex=settings.PROFILING_RESULT_TTL_SECONDS)
+    except RedisError as e:
+        logger.error(f"Could not store profile: {str(e)}")
+        return None
+    return profile_id
+
+
+async def load_profile(profile_id: str) -> Optional[Counter]:
+    text = await get_async_redis().get(_redis_key(profile_id))
+    return parse_collapsed(text) if text is not None else None
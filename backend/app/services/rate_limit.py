@@ -0,0 +1,213 @@
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Callable
+import threading
+import logging
+import time
+import uuid
+
+from redis.exceptions import RedisError
+from app.core.redis import get_async_redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Sliding window = one sorted set per key, scored by timestamp (ms).
+# Both scripts drop expired entries first, so the set never outgrows `limit`
+# and PEXPIRE removes idle keys entirely.
+ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('PEXPIRE', key, window)
+    return {1, count + 1, 0}
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {0, count, tonumber(oldest[2]) + window - now}
+"""
+
+PEEK_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+if count == 0 then
+    return {0, 0}
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {count, tonumber(oldest[2]) + window - now}
+"""
+
+
+class RateLimitStatus(NamedTuple):
+    allowed: bool
+    used: int
+    remaining: int
+    limit: int
+    retry_after: int  # Seconds until the oldest hit leaves the window (0 if allowed)
+    token: Optional[str] = None  # Handle for release() when a hit was recorded
+
+
+class SlidingWindowLimiter:
+    """
+    Distributed sliding-window limiter backed by Redis sorted sets (asyncio
+    client, so a slow Redis never blocks the event loop).
+
+    Each check-and-record runs as a single Lua script, so parallel requests
+    from several workers can never overshoot the limit. A small in-process
+    near-cache remembers recent answers: exhausted keys are rejected locally
+    until their window reopens, and usage lookups are served for a couple of
+    seconds without a Redis round trip.
+
+    If Redis is unreachable the limiter fails open (logs and allows) so the
+    free trial keeps working during a Redis outage.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        window_seconds: int,
+        near_cache_seconds: float = settings.RATE_LIMIT_NEAR_CACHE_SECONDS,
+        near_cache_size: int = settings.RATE_LIMIT_NEAR_CACHE_SIZE,
+        clock: Callable[[], float] = time.time
+    ):
+        self.name = name
+        self.limit = limit
+        self.window_ms = int(window_seconds * 1000)
+        self.near_cache_seconds = near_cache_seconds
+        self.near_cache_size = near_cache_size
+        self.clock = clock
+        self._cache = OrderedDict()  # key -> (expires_at, RateLimitStatus)
+        self._lock = threading.Lock()
+        self._acquire_script = None
+        self._peek_script = None
+
+    def _redis_key(self, key: str) -> str:
+        return f"ratelimit:{self.name}:{key}"
+
+    def _scripts(self, client):
+        # register_script uses EVALSHA and falls back to EVAL on NOSCRIPT
+        if self._acquire_script is None:
+            self._acquire_script = client.register_script(ACQUIRE_SCRIPT)
+            self._peek_script = client.register_script(PEEK_SCRIPT)
+        return self._acquire_script, self._peek_script
+
+    def _now_ms(self) -> int:
+        return int(self.clock() * 1000)
+
+    def _status(self, allowed: bool, used: int, retry_after_ms: int, token: Optional[str] = None) -> RateLimitStatus:
+        return RateLimitStatus(
+            allowed=allowed,
+            used=used,
+            remaining=max(0, self.limit - used),
+            limit=self.limit,
+            retry_after=max(0, -(-int(retry_after_ms) // 1000)),  # ceil to whole seconds
+            token=token
+        )
+
+    def _cache_get(self, key: str) -> Optional[RateLimitStatus]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, status = entry
+            if self.clock() >= expires_at:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return status
+
+    def _cache_put(self, key: str, status: RateLimitStatus) -> None:
+        ttl = self.near_cache_seconds
+        if status.remaining == 0 and status.retry_after:
+            # Exhausted keys stay blocked until their oldest hit expires
+            ttl = max(ttl, status.retry_after)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (self.clock() + ttl, status._replace(token=None))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.near_cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+    async def acquire(self, key: str) -> RateLimitStatus:
+        """Record one hit for `key` if it is under the limit."""
+        cached = self._cache_get(key)
+        if cached is not None and cached.remaining == 0:
+            return cached._replace(allowed=False)
+
+        token = uuid.uuid4().hex
+        try:
+            client = get_async_redis()
+            acquire_script, _ = self._scripts(client)
+            allowed, used, retry_after_ms = await acquire_script(
+                keys=[self._redis_key(key)],
+                args=[self._now_ms(), self.window_ms, self.limit, token],
+                client=client
+            )
+        except RedisError as e:
+            logger.error(f"Rate limiter '{self.name}' unavailable, allowing request: {str(e)}")
+            return self._status(True, 0, 0)
+
+        status = self._status(bool(allowed), int(used), int(retry_after_ms), token if allowed else None)
+        if not status.allowed:
+            # The oldest hit is what frees the next slot
+            status = status._replace(retry_after=max(1, status.retry_after))
+        self._cache_put(key, status)
+        return status
+
+    async def release(self, key: str, token: Optional[str]) -> None:
+        """Give back a hit recorded by acquire() (e.g. the request failed)."""
+        if not token:
+            return
+        self._cache_drop(key)
+        try:
+            await get_async_redis().zrem(self._redis_key(key), token)
+        except RedisError as e:
+            logger.error(f"Rate limiter '{self.name}' release failed: {str(e)}")
+
+    async def peek(self, key: str) -> RateLimitStatus:
+        """Current usage for `key` without recording a hit."""
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached._replace(allowed=cached.remaining > 0)
+
+        try:
+            client = get_async_redis()
+            _, peek_script = self._scripts(client)
+            used, reset_ms = await peek_script(
+                keys=[self._redis_key(key)],
+                args=[self._now_ms(), self.window_ms],
+                client=client
+            )
+        except RedisError as e:
+            logger.error(f"Rate limiter '{self.name}' unavailable: {str(e)}")
+            return self._status(True, 0, 0)
+
+        used = int(used)
+        status = self._status(used < self.limit, used, int(reset_ms) if used >= self.limit else 0)
+        self._cache_put(key, status)
+        return status
+
+    def clear_near_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+# Free trial limiter for /process-anonymous, keyed by client IP
+anonymous_limiter = SlidingWindowLimiter(
+    "anonymous",
+    limit=settings.ANONYMOUS_FREE_TRIES,
+    window_seconds=settings.ANONYMOUS_WINDOW_SECONDS
+)
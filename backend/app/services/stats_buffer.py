@@ -0,0 +1,218 @@
+from collections import defaultdict
+from datetime import date
+from typing import Optional
+import asyncio
+import logging
+import time
+import uuid
+
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.redis import get_async_redis
+from app.core.config import settings
+from app.db import crud
+
+logger = logging.getLogger(__name__)
+
+# Pending deltas live in one Redis hash per day ("<user_id>:n" images,
+# "<user_id>:t" seconds). The set of days with pending data lets the
+# flusher find them without SCAN.
+DAYS_KEY = "userstats:days"
+DAY_KEY_PREFIX = "userstats:day:"
+# A flush first claims a day's hash by renaming it to a processing key
+# ("userstats:processing:<day>:<id>", listed in PROCESSING_KEY scored by
+# claim time) and deletes it only after the database commit, so a flusher
+# that dies in between leaves the deltas behind to be replayed.
+PROCESSING_KEY = "userstats:processing"
+PROCESSING_KEY_PREFIX = "userstats:processing:"
+
+# Atomically claim a day's hash and forget the day. Increments arriving
+# after this land in a fresh hash and re-register the day.
+CLAIM_DAY_SCRIPT = """
+redis.call('SREM', KEYS[2], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+redis.call('ZADD', KEYS[4], ARGV[2], KEYS[3])
+return 1
+"""
+
+# Take over claims older than the cutoff (their flusher died). Re-scoring
+# them in the same script means only one worker replays each.
+RECLAIM_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, key in ipairs(stale) do
+    redis.call('ZADD', KEYS[1], ARGV[2], key)
+end
+return stale
+"""
+
+_claim_day_script = None
+_reclaim_script = None
+
+
+def _day_key(day: str) -> str:
+    return f"{DAY_KEY_PREFIX}{day}"
+
+
+def _processing_day(processing_key: str) -> str:
+    return processing_key[len(PROCESSING_KEY_PREFIX):].rsplit(":", 1)[0]
+
+
+async def _claim_day(client, day: str) -> Optional[str]:
+    """Rename the day's hash to a new processing key; None if another flusher took it first."""
+    global _claim_day_script
+    if _claim_day_script is None:
+        _claim_day_script = client.register_script(CLAIM_DAY_SCRIPT)
+    processing_key = f"{PROCESSING_KEY_PREFIX}{day}:{uuid.uuid4().hex}"
+    claimed = await _claim_day_script(
+        keys=[_day_key(day), DAYS_KEY, processing_key, PROCESSING_KEY],
+        args=[day, time.time()],
+        client=client
+    )
+    return processing_key if claimed else None
+
+
+async def _reclaim_stale(client) -> list:
+    """Processing keys left behind by a flusher that never finished (e.g. the process died)."""
+    global _reclaim_script
+    if _reclaim_script is None:
+        _reclaim_script = client.register_script(RECLAIM_SCRIPT)
+    now = time.time()
+    return await _reclaim_script(
+        keys=[PROCESSING_KEY],
+        args=[now - settings.STATS_PROCESSING_STALE_SECONDS, now],
+        client=client
+    )
+
+
+async def record_processing(db: AsyncSession, user_id: str, processing_time: float, day: Optional[date] = None) -> None:
+    """
+    Count one processed image for `user_id`.
+
+    The delta goes to Redis (HINCRBY / HINCRBYFLOAT) and reaches Postgres on
+    the next flush. If Redis is unavailable it is written straight through
+    with the same atomic UPDATE, so nothing is lost.
+    """
+    day = day or date.today()
+    seconds = crud._clamp_processing_time(processing_time)
+    try:
+        key = _day_key(day.isoformat())
+        pipe = get_async_redis().pipeline(transaction=True)
+        pipe.hincrby(key, f"{user_id}:n", 1)
+        pipe.hincrbyfloat(key, f"{user_id}:t", seconds)
+        pipe.sadd(DAYS_KEY, day.isoformat())
+        pipe.expire(key, settings.STATS_BUFFER_KEY_TTL_SECONDS)
+        await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Stats buffer unavailable, writing through: {str(e)}")
+        await crud.apply_user_stats_deltas(db, day, [(user_id, 1, seconds)])
+
+
+async def get_pending_stats(user_id: str, day: Optional[date] = None) -> dict:
+    """Today's not-yet-flushed deltas for a user (zeros if none or Redis is down)."""
+    day = day or date.today()
+    try:
+        images, seconds = await get_async_redis().hmget(_day_key(day.isoformat()), f"{user_id}:n", f"{user_id}:t")
+    except RedisError:
+        return {"images": 0, "seconds": 0.0}
+    return {"images": int(images or 0), "seconds": float(seconds or 0.0)}
+
+
+async def apply_pending_stats(stats: dict, user_id: str) -> dict:
+    """Overlay unflushed deltas on stats read from the database."""
+    pending = await get_pending_stats(user_id)
+    if not pending["images"]:
+        return stats
+    today = date.today()
+    stats = dict(stats)
+    stats["total_images_processed"] = (stats["total_images_processed"] or 0) + pending["images"]
+    stats["images_processed_today"] = (stats["images_processed_today"] or 0) + pending["images"]
+    stats["total_processing_time"] = (stats["total_processing_time"] or 0.0) + pending["seconds"]
+    stats["last_upload_date"] = today.isoformat()
+    return stats
+
+
+async def flush_pending_stats(session_factory=None) -> int:
+    """
+    Move buffered deltas into Postgres, oldest day first.
+
+    Each day is claimed (renamed to a processing key), applied as one
+    batched executemany of atomic increments, and only then deleted from
+    Redis. If the database write fails, the deltas are put back into the
+    day's hash; claims left by a flusher that died are replayed once they
+    are STATS_PROCESSING_STALE_SECONDS old.
+
+    Returns:
+        Number of user rows updated
+    """
+    if session_factory is None:
+        from app.db.base import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    client = get_async_redis()
+    claims = await _reclaim_stale(client)
+    if claims:
+        logger.warning(f"Replaying {len(claims)} unfinished stats flush(es)")
+    for day in sorted(await client.smembers(DAYS_KEY)):
+        processing_key = await _claim_day(client, day)
+        if processing_key is not None:
+            claims.append(processing_key)
+
+    updated = 0
+    for processing_key in sorted(claims, key=_processing_day):
+        day = _processing_day(processing_key)
+        raw = await client.hgetall(processing_key)
+        deltas = defaultdict(lambda: [0, 0.0])
+        for field, value in raw.items():
+            user_id, kind = field.rsplit(":", 1)
+            if kind == "n":
+                deltas[user_id][0] += int(value)
+            else:
+                deltas[user_id][1] += float(value)
+        rows = [(user_id, images, seconds) for user_id, (images, seconds) in deltas.items()]
+        if rows:
+            try:
+                async with session_factory() as db:
+                    updated += await crud.apply_user_stats_deltas(db, date.fromisoformat(day), rows)
+            except Exception:
+                await _restore(client, day, rows, processing_key)
+                raise
+        await _release_claim(client, processing_key)
+    if updated:
+        logger.info(f"Flushed buffered stats for {updated} user-days")
+    return updated
+
+
+async def _release_claim(client, processing_key: str) -> None:
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(processing_key)
+    pipe.zrem(PROCESSING_KEY, processing_key)
+    await pipe.execute()
+
+
+async def _restore(client, day: str, rows: list, processing_key: str) -> None:
+    """Put claimed deltas back into the day's hash (and drop the claim) so the next flush retries them."""
+    key = _day_key(day)
+    pipe = client.pipeline(transaction=True)
+    for user_id, images, seconds in rows:
+        pipe.hincrby(key, f"{user_id}:n", images)
+        pipe.hincrbyfloat(key, f"{user_id}:t", seconds)
+    pipe.sadd(DAYS_KEY, day)
+    pipe.expire(key, settings.STATS_BUFFER_KEY_TTL_SECONDS)
+    pipe.delete(processing_key)
+    pipe.zrem(PROCESSING_KEY, processing_key)
+    await pipe.execute()
+
+
+async def run_flush_loop(interval: float = None) -> None:
+    """Background task: flush buffered stats every `interval` seconds until cancelled."""
+    interval = interval or settings.STATS_FLUSH_INTERVAL_SECONDS
+    while True:
+        # Flush once right away: that also replays claims a crashed worker left behind
+        try:
+            await flush_pending_stats()
+        except Exception as e:
+            logger.error(f"Stats flush failed: {str(e)}")
+        await asyncio.sleep(interval)
@@ -1,6 +1,7 @@
 import boto3
 from botocore.exceptions import ClientError, BotoCoreError
 from app.core.config import settings
+from app.core.tracing import span
 import uuid
 import logging
 from typing import Optional, Tuple
@@ -13,7 +14,8 @@ s3_client = boto3.client(
     's3',
     aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
     aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    region_name=settings.AWS_REGION
+    region_name=settings.AWS_REGION,
+    endpoint_url=settings.AWS_S3_ENDPOINT_URL or None
 )
 
 
@@ -45,13 +47,14 @@ def upload_to_s3(
         
         logger.info(f"Uploading to S3: {s3_key} ({len(file_content)} bytes)")
         
-        s3_client.put_object(
-            Bucket=settings.S3_BUCKET_NAME,
-            Key=s3_key,
-            Body=file_content,
-            ContentType=content_type,
-            ServerSideEncryption='AES256'
-        )
+        with span("s3.put_object", **{"s3.key": s3_key, "s3.bytes": len(file_content)}):
+            s3_client.put_object(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=s3_key,
+                Body=file_content,
+                ContentType=content_type,
+                ServerSideEncryption='AES256'
+            )
         
         # Generate public URL
         url = f"https://{settings.S3_BUCKET_NAME}.s3.{settings.AWS_REGION}.amazonaws.com/{s3_key}"
@@ -85,12 +88,14 @@ def download_from_s3(s3_key: str) -> bytes:
     try:
         logger.info(f"Downloading from S3: {s3_key}")
         
-        response = s3_client.get_object(
-            Bucket=settings.S3_BUCKET_NAME,
-            Key=s3_key
-        )
+        with span("s3.get_object", **{"s3.key": s3_key}) as s3_span:
+            response = s3_client.get_object(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=s3_key
+            )
+            content = response['Body'].read()
+            s3_span.set_attribute("s3.bytes", len(content))
         
-        content = response['Body'].read()
         logger.info(f"Successfully downloaded from S3: {len(content)} bytes")
         return content
     
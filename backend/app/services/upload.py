@@ -0,0 +1,245 @@
+from io import BytesIO
+from typing import Dict, NamedTuple, Optional, Sequence
+import logging
+
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParser, parse_options_header
+from PIL import Image, UnidentifiedImageError
+
+from app.core.config import settings
+from app.core.tracing import traced
+from app.services.image_budget import DecodeEstimate, estimate_decode, budget_error, describe
+
+logger = logging.getLogger(__name__)
+
+VALID_IMAGE_FORMATS = ('JPEG', 'JPG', 'PNG', 'WEBP', 'BMP', 'GIF')
+
+# Bytes allowed on top of the images for multipart boundaries, part headers and small fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Give up identifying the format/dimensions if the header is not parseable by
+# then (large EXIF/ICC blocks can push a JPEG's SOF marker past 64KB)
+SNIFF_LIMIT_BYTES = 1024 * 1024
+
+
+class ImageUpload(NamedTuple):
+    filename: str
+    content_type: str
+    data: bytes
+    info: dict  # Same keys as validate_image(): format, mode, size, width, height, file_size_mb, frames, ...
+    estimate: DecodeEstimate
+
+
+def _reject(status_code: int, detail: str):
+    raise HTTPException(status_code=status_code, detail=detail)
+
+
+class _ImagePart:
+    """One image field of the upload, vetted as its bytes arrive."""
+
+    def __init__(self, name: str, filename: str, content_type: str, max_bytes: int):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.info = None
+        self.estimate = None
+        self.error = None
+        if not content_type.startswith("image/"):
+            self.error = (status.HTTP_400_BAD_REQUEST, "File must be an image")
+
+    def feed(self, data: bytes) -> None:
+        self.buffer += data
+        if len(self.buffer) > self.max_bytes:
+            self.error = (
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                f"File size exceeds maximum ({settings.MAX_IMAGE_SIZE_MB}MB)"
+            )
+        elif self.info is None:
+            self.sniff()
+
+    def sniff(self, final: bool = False) -> None:
+        """Identify format and dimensions from the bytes received so far (header only, no decode)."""
+        if not final and (self.buffer[:4] == b"RIFF" and self.buffer[8:12] == b"WEBP" or self.buffer[:3] == b"GIF"):
+            # Pillow's WebP plugin needs the complete file to open it, and a
+            # GIF's frame count is only known once every frame has arrived
+            return
+        try:
+            image = Image.open(BytesIO(self.buffer))
+        except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as e:
+            if final or len(self.buffer) >= SNIFF_LIMIT_BYTES:
+                self.error = (status.HTTP_400_BAD_REQUEST, f"Invalid image file: {str(e)}")
+            return
+        self.info = {
+            'format': image.format,
+            'mode': image.mode,
+            'size': image.size,
+            'width': image.width,
+            'height': image.height
+        }
+        # Frame count from the header (APNG); WebP and GIF are only opened once complete
+        self.estimate = estimate_decode(image)
+        self.info.update(describe(self.estimate))
+        if image.format and image.format.upper() not in VALID_IMAGE_FORMATS:
+            self.error = (status.HTTP_400_BAD_REQUEST, f"Unsupported image format: {image.format}")
+        elif image.width > settings.MAX_IMAGE_DIMENSION or image.height > settings.MAX_IMAGE_DIMENSION:
+            self.error = (
+                status.HTTP_400_BAD_REQUEST,
+                f"Image dimensions too large (max {settings.MAX_IMAGE_DIMENSION}x{settings.MAX_IMAGE_DIMENSION})"
+            )
+        elif image.width < settings.MIN_IMAGE_DIMENSION or image.height < settings.MIN_IMAGE_DIMENSION:
+            self.error = (
+                status.HTTP_400_BAD_REQUEST,
+                f"Image dimensions too small (min {settings.MIN_IMAGE_DIMENSION}x{settings.MIN_IMAGE_DIMENSION})"
+            )
+        else:
+            over_budget = budget_error(self.estimate)
+            if over_budget:
+                self.error = (status.HTTP_400_BAD_REQUEST, over_budget)
+
+    def finish(self) -> None:
+        if self.info is None and not self.error:
+            # Whole file arrived without a parseable header
+            self.sniff(final=True)
+
+    def to_upload(self) -> ImageUpload:
+        data = bytes(self.buffer)
+        self.buffer = None
+        self.info['file_size_mb'] = round(len(data) / (1024 * 1024), 2)
+        return ImageUpload(self.filename, self.content_type, data, self.info, self.estimate)
+
+
+class _ImageUploadReader:
+    """multipart/form-data callbacks that keep only the wanted image parts and vet them as they arrive."""
+
+    def __init__(self, field_names: Sequence[str], max_bytes: int):
+        self.field_names = set(field_names)
+        self.max_bytes = max_bytes
+        self.parts: Dict[str, _ImagePart] = {}
+        self.error = None
+        self._current = None
+        self._header_name = b""
+        self._header_value = b""
+        self._headers = {}
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._current = None
+
+    def on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        if name not in self.field_names or name in self.parts:
+            return
+        self._current = _ImagePart(
+            name,
+            options.get(b"filename", b"").decode("utf-8", "replace"),
+            self._headers.get(b"content-type", b"").decode("latin-1"),
+            self.max_bytes
+        )
+        self.parts[name] = self._current
+        self.error = self._current.error
+
+    def on_part_data(self, data, start, end):
+        if self._current is None or self.error:
+            return
+        self._current.feed(data[start:end])
+        self.error = self._current.error
+
+    def on_part_end(self):
+        if self._current is not None and not self.error:
+            self._current.finish()
+            self.error = self._current.error
+        self._current = None
+
+
+@traced("upload.read")
+async def read_image_uploads(
+    request: Request,
+    required: Sequence[str] = ("file",),
+    optional: Sequence[str] = (),
+    max_bytes: Optional[int] = None
+) -> Dict[str, ImageUpload]:
+    """
+    Stream a multipart upload of one or more images off the socket, vetting each as it arrives.
+
+    Unlike UploadFile (which spools the whole body before the endpoint runs),
+    this rejects as soon as the answer is known and stops reading the body:
+
+    - Content-Length over the limit: before reading anything
+    - Non-image part, or more than `max_bytes` of image data: at that byte
+    - Unsupported format, out-of-range dimensions, or a decoded size over the
+      pixel/memory budget: as soon as the image header has arrived (usually
+      the first chunk; WebP and GIF once complete)
+
+    Parts not named in `required`/`optional` are skipped without buffering.
+    Memory per request is bounded by `max_bytes` per image plus one chunk.
+
+    Returns:
+        {field name: ImageUpload} for every required and each present optional field
+
+    Raises:
+        HTTPException: 400 (bad/missing image), 413 (too large)
+    """
+    max_bytes = max_bytes or settings.MAX_IMAGE_SIZE_MB * 1024 * 1024
+    fields = tuple(required) + tuple(optional)
+    max_body = max_bytes * len(fields) + MULTIPART_OVERHEAD_BYTES
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body:
+        _reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"File size exceeds maximum ({settings.MAX_IMAGE_SIZE_MB}MB)")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        _reject(status.HTTP_400_BAD_REQUEST, f"Expected a multipart/form-data upload with a '{fields[0]}' field")
+
+    reader = _ImageUploadReader(fields, max_bytes)
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": reader.on_part_begin,
+        "on_part_data": reader.on_part_data,
+        "on_part_end": reader.on_part_end,
+        "on_header_field": reader.on_header_field,
+        "on_header_value": reader.on_header_value,
+        "on_header_end": reader.on_header_end,
+        "on_headers_finished": reader.on_headers_finished,
+    })
+
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_body:
+            _reject(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"File size exceeds maximum ({settings.MAX_IMAGE_SIZE_MB}MB)")
+        parser.write(chunk)
+        if reader.error:
+            logger.info(f"Upload rejected after {received} bytes: {reader.error[1]}")
+            _reject(*reader.error)
+    parser.finalize()
+
+    if reader.error:
+        _reject(*reader.error)
+    for name in required:
+        if name not in reader.parts:
+            _reject(status.HTTP_400_BAD_REQUEST, f"No image file in the upload ('{name}' field)")
+    for part in reader.parts.values():
+        if part.info is None:
+            _reject(status.HTTP_400_BAD_REQUEST, f"Incomplete image in the '{part.name}' field")
+
+    return {name: part.to_upload() for name, part in reader.parts.items()}
+
+
+async def read_image_upload(request: Request, field_name: str = "file", max_bytes: Optional[int] = None) -> ImageUpload:
+    """Stream and vet a single-image upload (see read_image_uploads)."""
+    uploads = await read_image_uploads(request, required=(field_name,), max_bytes=max_bytes)
+    return uploads[field_name]
@@ -0,0 +1,287 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Optional
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+from redis.exceptions import RedisError
+from app.core.redis import get_async_redis
+from app.core.config import settings
+from app.db import crud
+from app.db.models import GLOBAL_SUBJECT, ANONYMOUS_SUBJECT
+from app.services.stats_buffer import CLAIM_DAY_SCRIPT, RECLAIM_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+# Requests add their deltas to an in-process buffer (no I/O on the request
+# path); the periodic flush writes it to the rollup tables. Deltas a flush
+# could not write are parked per time bucket in Redis hashes, where the next
+# flush of any worker picks them up:
+#   usage:bucket:daily:<YYYY-MM-DD>    fields "<subject>|<metric>"
+#   usage:bucket:hourly:<YYYY-MM-DDTHH> fields "<metric>" (global only)
+# BUCKETS_KEY lists buckets with pending data so the flusher needs no SCAN.
+BUCKETS_KEY = "usage:buckets"
+BUCKET_KEY_PREFIX = "usage:bucket:"
+# As in the user stats buffer, a flush claims a bucket by renaming it to
+# "usage:processing:<bucket>:<id>" (listed in PROCESSING_KEY by claim time)
+# and deletes it only after the database commit; claims left by a flusher
+# that died are replayed once USAGE_ROLLUP_PROCESSING_STALE_SECONDS old.
+PROCESSING_KEY = "usage:processing"
+PROCESSING_KEY_PREFIX = "usage:processing:"
+DAILY = "daily"
+HOURLY = "hourly"
+FLOAT_METRICS = ("processing_seconds",)
+
+_claim_bucket_script = None
+_reclaim_script = None
+
+# {bucket: {field: delta}} recorded since the last flush
+_local_pending = defaultdict(lambda: defaultdict(float))
+_local_lock = threading.Lock()
+
+
+def _bucket_key(bucket: str) -> str:
+    return f"{BUCKET_KEY_PREFIX}{bucket}"
+
+
+def _bucket_names(now: datetime) -> tuple:
+    return f"{DAILY}:{now.date().isoformat()}", f"{HOURLY}:{now.strftime('%Y-%m-%dT%H')}"
+
+
+def _increment(pipe, key: str, field: str, metric: str, value) -> None:
+    if metric in FLOAT_METRICS:
+        pipe.hincrbyfloat(key, field, float(value))
+    else:
+        pipe.hincrby(key, field, int(value))
+
+
+def _bucket_fields(user_id: Optional[str], metrics: dict, now: datetime) -> dict:
+    """{bucket: {field: delta}} for one event."""
+    daily, hourly = _bucket_names(now)
+    fields = {daily: {}, hourly: {}}
+    for metric, value in metrics.items():
+        if not value:
+            continue
+        for subject in (GLOBAL_SUBJECT, user_id or ANONYMOUS_SUBJECT):
+            fields[daily][f"{subject}|{metric}"] = value
+        fields[hourly][metric] = value
+    return fields
+
+
+def record_usage(
+    user_id: Optional[str],
+    images: int = 0,
+    processing_seconds: float = 0.0,
+    bytes_in: int = 0,
+    bytes_out: int = 0,
+    failures: int = 0,
+    now: Optional[datetime] = None
+) -> None:
+    """
+    Count one processing request in the usage rollups.
+
+    Adds the deltas to today's row for the user (or the anonymous subject)
+    and the global row, plus the global hourly row. They are buffered in
+    this process and written to the rollup tables on the next flush.
+
+    Args:
+        user_id: Authenticated user id, or None for anonymous requests
+    """
+    metrics = {
+        "images": images,
+        "processing_seconds": processing_seconds,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "failures": failures
+    }
+    _hold_locally(_bucket_fields(user_id, metrics, now or datetime.now()))
+
+
+def _push(pipe, fields: dict) -> None:
+    """Queue {bucket: {field: delta}} onto a pipeline as increments of the parked buckets."""
+    for bucket, values in fields.items():
+        if not values:
+            continue
+        key = _bucket_key(bucket)
+        for field, value in values.items():
+            _increment(pipe, key, field, field.rsplit("|", 1)[-1], value)
+        pipe.sadd(BUCKETS_KEY, bucket)
+        pipe.expire(key, settings.USAGE_ROLLUP_KEY_TTL_SECONDS)
+
+
+def _hold_locally(fields: dict) -> None:
+    with _local_lock:
+        for bucket, values in fields.items():
+            for field, value in values.items():
+                _local_pending[bucket][field] += value
+
+
+def _take_local() -> dict:
+    global _local_pending
+    with _local_lock:
+        taken, _local_pending = _local_pending, defaultdict(lambda: defaultdict(float))
+    return taken
+
+
+def _processing_bucket(processing_key: str) -> str:
+    return processing_key[len(PROCESSING_KEY_PREFIX):].rsplit(":", 1)[0]
+
+
+async def _claim_bucket(client, bucket: str) -> Optional[str]:
+    """Rename the bucket's hash to a new processing key; None if another flusher took it first."""
+    global _claim_bucket_script
+    if _claim_bucket_script is None:
+        _claim_bucket_script = client.register_script(CLAIM_DAY_SCRIPT)
+    processing_key = f"{PROCESSING_KEY_PREFIX}{bucket}:{uuid.uuid4().hex}"
+    claimed = await _claim_bucket_script(
+        keys=[_bucket_key(bucket), BUCKETS_KEY, processing_key, PROCESSING_KEY],
+        args=[bucket, time.time()],
+        client=client
+    )
+    return processing_key if claimed else None
+
+
+async def _reclaim_stale(client) -> list:
+    """Processing keys left behind by a flusher that never finished."""
+    global _reclaim_script
+    if _reclaim_script is None:
+        _reclaim_script = client.register_script(RECLAIM_SCRIPT)
+    now = time.time()
+    return await _reclaim_script(
+        keys=[PROCESSING_KEY],
+        args=[now - settings.USAGE_ROLLUP_PROCESSING_STALE_SECONDS, now],
+        client=client
+    )
+
+
+async def _claim_all(client) -> tuple:
+    """(claimed processing keys, their {bucket: {field: delta}}): stale claims first, then every pending bucket."""
+    claims = await _reclaim_stale(client)
+    if claims:
+        logger.warning(f"Replaying {len(claims)} unfinished usage rollup flush(es)")
+    for bucket in await client.smembers(BUCKETS_KEY):
+        processing_key = await _claim_bucket(client, bucket)
+        if processing_key is not None:
+            claims.append(processing_key)
+    buckets = defaultdict(lambda: defaultdict(float))
+    for processing_key in claims:
+        for field, value in (await client.hgetall(processing_key)).items():
+            buckets[_processing_bucket(processing_key)][field] += float(value)
+    return claims, buckets
+
+
+async def _release_claims(client, claims: list, restore: Optional[dict] = None) -> None:
+    """Delete committed claims; with `restore`, put those deltas back into the buckets in the same transaction."""
+    pipe = client.pipeline(transaction=True)
+    _push(pipe, restore or {})
+    for processing_key in claims:
+        pipe.delete(processing_key)
+        pipe.zrem(PROCESSING_KEY, processing_key)
+    await pipe.execute()
+
+
+def _to_rows(buckets: dict) -> tuple:
+    """Turn {bucket: {field: delta}} into row dicts for crud.apply_usage_rollups."""
+    daily = {}
+    hourly = {}
+    for bucket, values in buckets.items():
+        kind, stamp = bucket.split(":", 1)
+        for field, value in values.items():
+            if kind == DAILY:
+                subject, metric = field.rsplit("|", 1)
+                row = daily.setdefault((stamp, subject), _empty_row(day=date.fromisoformat(stamp), subject=subject))
+            else:
+                metric = field
+                row = hourly.setdefault(stamp, _empty_row(hour=datetime.strptime(stamp, "%Y-%m-%dT%H")))
+            row[metric] += value if metric in FLOAT_METRICS else int(value)
+    return list(daily.values()), list(hourly.values())
+
+
+def _empty_row(**key) -> dict:
+    return {**key, "images": 0, "processing_seconds": 0.0, "bytes_in": 0, "bytes_out": 0, "failures": 0}
+
+
+async def flush_usage_rollups(session_factory=None) -> int:
+    """
+    Move buffered usage deltas (this process's, plus any parked in Redis)
+    into the rollup tables in one batched upsert.
+
+    Parked buckets are claimed, not popped: they leave Redis only after the
+    commit, so a worker dying mid-flush loses nothing. If the database write
+    fails, all the deltas are parked in Redis (or, if Redis is down too, this
+    process's are kept in-process and the claims wait to be replayed).
+
+    Returns:
+        Number of rollup rows written
+    """
+    if session_factory is None:
+        from app.db.base import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    client, claims = None, []
+    buckets = defaultdict(lambda: defaultdict(float))
+    try:
+        client = get_async_redis()
+        claims, buckets = await _claim_all(client)
+    except RedisError as e:
+        logger.warning(f"Usage rollup buffer unavailable during flush: {str(e)}")
+        client = None
+    local = _take_local()
+    for bucket, values in local.items():
+        for field, value in values.items():
+            buckets[bucket][field] += value
+    if not buckets:
+        return 0
+
+    daily, hourly = _to_rows(buckets)
+    try:
+        async with session_factory() as db:
+            await crud.apply_usage_rollups(db, daily, hourly)
+    except Exception:
+        try:
+            if client is None:
+                raise RedisError("no client")
+            await _release_claims(client, claims, restore=buckets)
+        except RedisError:
+            _hold_locally(local)  # Claimed deltas stay claimed in Redis and are replayed when stale
+        raise
+    if claims:
+        try:
+            await _release_claims(client, claims)
+        except RedisError as e:
+            # Committed, but the claims survive: they would be counted again when replayed
+            logger.error(f"Could not release usage rollup claims after commit: {str(e)}")
+    return len(daily) + len(hourly)
+
+
+async def compact_usage_rollups(session_factory=None) -> dict:
+    """Apply rollup retention (see crud.compact_usage_rollups)."""
+    if session_factory is None:
+        from app.db.base import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+    async with session_factory() as db:
+        deleted = await crud.compact_usage_rollups(db)
+    if any(deleted.values()):
+        logger.info(f"Compacted usage rollups: {deleted}")
+    return deleted
+
+
+async def run_flush_loop(interval: float = None) -> None:
+    """Background task: flush rollups every `interval` seconds and compact hourly-ish, until cancelled."""
+    interval = interval or settings.USAGE_ROLLUP_FLUSH_INTERVAL_SECONDS
+    last_compaction = 0.0
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_usage_rollups()
+        except Exception as e:
+            logger.error(f"Usage rollup flush failed: {str(e)}")
+        if time.monotonic() - last_compaction >= settings.USAGE_COMPACTION_INTERVAL_SECONDS:
+            try:
+                await compact_usage_rollups()
+                last_compaction = time.monotonic()
+            except Exception as e:
+                logger.error(f"Usage rollup compaction failed: {str(e)}")
@@ -0,0 +1,49 @@
+from typing import NamedTuple, Optional
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.models import User, UserRole
+
+# Per-process cache of the user fields authenticated endpoints need.
+# Writers that change these fields (password reset, role change, OAuth
+# linking) call invalidate_user(), which only clears this process's copy.
+# Other API workers - and every worker, when the change is made from another
+# process (a script, SQL) - keep the old fields until their entry expires:
+# a role change, including revoking admin, takes effect within
+# AUTH_USER_CACHE_TTL_SECONDS. Lower that TTL if this window is too long.
+_user_cache = TTLCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS
+)
+
+
+class CurrentUser(NamedTuple):
+    """Read-only projection of the authenticated user."""
+    id: str
+    email: str
+    name: Optional[str]
+    role: UserRole
+    oauth_provider: Optional[str] = None
+
+
+def get_cached_user(user_id: str) -> Optional[CurrentUser]:
+    return _user_cache.get(user_id)
+
+
+def cache_user(user: User) -> CurrentUser:
+    projection = CurrentUser(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        role=user.role,
+        oauth_provider=user.oauth_provider
+    )
+    _user_cache.set(user.id, projection)
+    return projection
+
+
+def invalidate_user(user_id: str) -> None:
+    _user_cache.pop(user_id)
+
+
+def clear_user_cache() -> None:
+    _user_cache.clear()
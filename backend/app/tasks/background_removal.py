@@ -9,6 +9,7 @@ from app.services.storage import (
     extract_s3_key_from_url
 )
 from app.services.background_removal import remove_background, validate_image
+from app.core.tracing import current_context
 import logging
 import time
 import traceback
@@ -242,6 +243,10 @@ def log_metrics(
     if metadata:
         metrics['metadata'] = metadata
     
+    trace = current_context()
+    if trace is not None:
+        metrics['trace_id'] = f"{trace.trace_id:032x}"
+    
     # Log as structured JSON for easy parsing
     logger.info(f"METRICS: {metrics}")
     
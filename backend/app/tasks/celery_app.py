@@ -1,5 +1,6 @@
 from celery import Celery
 from app.core.config import settings
+from app.core.tracing import instrument_celery
 import logging
 
 # Configure logging
@@ -30,3 +31,5 @@ celery_app.conf.update(
     task_reject_on_worker_lost=True,  # Reject tasks if worker dies
 )
 
+# Continue the publisher's trace (traceparent message header) in each task
+instrument_celery()
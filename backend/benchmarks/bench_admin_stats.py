@@ -0,0 +1,96 @@
+"""
+Admin dashboard stats at scale: full-table scans vs the running totals row.
+
+Seeds N synthetic users into SQLite, then times the old GET /admin/stats
+work (load every active user for normalization + three aggregates) against
+crud.get_usage_totals().
+
+    python -m benchmarks.bench_admin_stats --users 300000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from benchmarks.common import percentile, seed_users
+
+
+async def _old_stats(db):
+    from app.db.crud import _normalize_user_processing_time
+    from app.db.models import User
+
+    result = await db.execute(select(User).where(User.total_images_processed > 0))
+    if any([_normalize_user_processing_time(user) for user in result.scalars()]):
+        await db.commit()
+    total_users = await db.scalar(select(func.count(User.id)))
+    total_images = await db.scalar(select(func.sum(User.total_images_processed)))
+    total_time = await db.scalar(select(func.sum(User.total_processing_time)))
+    return total_users, total_images, total_time
+
+
+async def _new_stats(db):
+    from app.db import crud
+
+    totals = await crud.get_usage_totals(db)
+    return totals.total_users, totals.total_images_processed, totals.total_processing_time
+
+
+async def _time(session_factory, func, repeats: int) -> dict:
+    timings = []
+    for _ in range(repeats):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            result = await func(db)
+            timings.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(percentile(timings, 50) * 1000, 2),
+        "max_ms": round(max(timings) * 1000, 2),
+        "result": [round(float(v), 2) for v in result],
+    }
+
+
+async def run(users: int, repeats: int) -> dict:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    sync_engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Session = async_sessionmaker(async_engine, expire_on_commit=False)
+    try:
+        start = time.perf_counter()
+        seed_users(sync_engine, users)
+        seed_seconds = time.perf_counter() - start
+
+        old = await _time(Session, _old_stats, repeats)
+        # First call bootstraps the totals row (one scan), later calls are O(1)
+        async with Session() as db:
+            await _new_stats(db)
+        new = await _time(Session, _new_stats, repeats)
+    finally:
+        await async_engine.dispose()
+        sync_engine.dispose()
+        os.unlink(path)
+
+    return {
+        "users": users,
+        "seed_seconds": round(seed_seconds, 1),
+        "full_scan": old,
+        "running_totals": new,
+        "speedup": round(old["p50_ms"] / max(new["p50_ms"], 0.001), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=300000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.users, args.repeats)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Admin user listing at depth: OFFSET paging vs keyset cursors.
+
+Seeds N synthetic users (spread over three years of signups) into SQLite
+with the listing indexes, then times fetching a page at increasing depths
+the old way (ORDER BY created_at, id ... OFFSET k) and with
+crud.get_users_page() resuming from the (created_at, id) of the row just
+before that depth. Also times a filtered listing (role + email prefix).
+
+    python -m benchmarks.bench_admin_users --users 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from benchmarks.common import percentile, seed_users
+
+
+async def _offset_page(db, offset: int, limit: int):
+    from app.db.models import User
+
+    stmt = select(User).order_by(User.created_at.desc(), User.id.desc()).offset(offset).limit(limit)
+    return list((await db.execute(stmt)).scalars().all())
+
+
+async def _key_at(db, offset: int):
+    """(created_at, id) of the row just before `offset` - what a cursor would carry."""
+    from app.db.models import User
+
+    stmt = (
+        select(User.created_at, User.id)
+        .order_by(User.created_at.desc(), User.id.desc())
+        .offset(offset - 1)
+        .limit(1)
+    )
+    return tuple((await db.execute(stmt)).one())
+
+
+async def _time(session_factory, func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            await func(db)
+            timings.append(time.perf_counter() - start)
+    return round(percentile(timings, 50) * 1000, 2)
+
+
+async def run(users: int, limit: int, repeats: int) -> dict:
+    from app.db import crud
+    from app.db.models import UserRole
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    sync_engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Session = async_sessionmaker(async_engine, expire_on_commit=False)
+    try:
+        start = time.perf_counter()
+        seed_users(sync_engine, users)
+        seed_seconds = time.perf_counter() - start
+
+        depths = []
+        for offset in (0, users // 100, users // 10, users // 2, users - limit):
+            if offset <= 0:
+                offset_ms = await _time(Session, lambda db: _offset_page(db, 0, limit), repeats)
+                keyset_ms = await _time(Session, lambda db: crud.get_users_page(db, limit), repeats)
+            else:
+                async with Session() as db:
+                    key = await _key_at(db, offset)
+                offset_ms = await _time(Session, lambda db: _offset_page(db, offset, limit), repeats)
+                keyset_ms = await _time(Session, lambda db: crud.get_users_page(db, limit, key), repeats)
+            depths.append({"offset": offset, "offset_p50_ms": offset_ms, "keyset_p50_ms": keyset_ms})
+
+        filtered_ms = await _time(
+            Session,
+            lambda db: crud.get_users_page(db, limit, role=UserRole.ADMIN, email_prefix="user1"),
+            repeats
+        )
+    finally:
+        await async_engine.dispose()
+        sync_engine.dispose()
+        os.unlink(path)
+
+    return {
+        "users": users,
+        "page_size": limit,
+        "seed_seconds": round(seed_seconds, 1),
+        "pages": depths,
+        "filtered_first_page_p50_ms": filtered_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.users, args.limit, args.repeats)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
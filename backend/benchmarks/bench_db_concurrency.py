@@ -0,0 +1,137 @@
+"""
+Request throughput with blocking vs async database access.
+
+Drives concurrent GET /stats calls at the app in-process. Each SQL
+statement gets an artificial round-trip delay (--db-latency-ms) to stand
+in for a networked Postgres. The "sync" route reproduces the old pattern
+(a sync Session queried inside an async endpoint, which blocks the event
+loop); the "async" route is the real /stats endpoint on the async engine.
+
+    python -m benchmarks.bench_db_concurrency --concurrency 32 --requests 256
+"""
+from datetime import date
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from benchmarks.common import summarize, LoopLagMonitor
+
+
+def _add_latency(engine, seconds: float, is_async: bool):
+    """Sleep on every statement in the thread that executes it (like a network round trip)."""
+    def delay(statement):
+        time.sleep(seconds)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        if is_async:
+            # aiosqlite runs sqlite3 in its own thread; install the hook there
+            dbapi_connection.await_(dbapi_connection._connection.set_trace_callback(delay))
+        else:
+            dbapi_connection.set_trace_callback(delay)
+
+
+async def _drive(client, path, headers, concurrency, total):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+    result = summarize(latencies, elapsed)
+    result["max_event_loop_stall_ms"] = round(monitor.max_lag * 1000, 1)
+    return result
+
+
+async def run(concurrency: int, total: int, latency_ms: float, path: str) -> dict:
+    import os
+    import tempfile
+    from app.api.dependencies import get_current_user
+    from app.core.security import create_access_token
+    from app.db.base import Base, get_db
+    from app.db.models import User
+    from app.main import app
+
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    sync_engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}", poolclass=AsyncAdaptedQueuePool, pool_size=concurrency
+    )
+    _add_latency(sync_engine, latency_ms / 1000, is_async=False)
+    _add_latency(async_engine.sync_engine, latency_ms / 1000, is_async=True)
+    SyncSession = sessionmaker(bind=sync_engine)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    Base.metadata.create_all(bind=sync_engine)
+    with SyncSession() as db:
+        user = User(email="bench@example.com", hashed_password="x", total_images_processed=3,
+                    images_processed_today=1, total_processing_time=9.0, last_upload_date=date.today())
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+    async def override_get_db():
+        async with AsyncSession() as session:
+            yield session
+
+    async def sync_stats(current_user=Depends(get_current_user)):
+        # The pre-port pattern: blocking ORM query inside an async endpoint
+        with SyncSession() as db:
+            user = db.query(User).filter(User.id == current_user.id).first()
+            return {"total_images_processed": user.total_images_processed}
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.add_api_route("/bench/sync-stats", sync_stats, methods=["GET"])
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user_id})}"}
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            await client.get(path, headers=headers)  # Warm the auth caches
+            await client.get("/bench/sync-stats", headers=headers)
+            results = {
+                "sync": await _drive(client, "/bench/sync-stats", headers, concurrency, total),
+                "async": await _drive(client, path, headers, concurrency, total),
+            }
+    finally:
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+        sync_engine.dispose()
+        os.unlink(db_path)
+
+    results["concurrency"] = concurrency
+    results["db_latency_ms"] = latency_ms
+    results["speedup"] = round(
+        results["async"]["throughput_per_second"] / results["sync"]["throughput_per_second"], 2
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="simulated round trip per statement")
+    parser.add_argument("--path", default="/api/v1/stats")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.concurrency, args.requests, args.db_latency_ms, args.path)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Login latency under concurrent load.
+
+Fires concurrent POST /auth/login calls at the app in-process (ASGI
+transport, SQLite) and reports latency percentiles plus the worst event
+loop stall seen while they ran. --sync-hashing restores the old behaviour
+(bcrypt on the event loop) for comparison.
+
+    python -m benchmarks.bench_login --concurrency 16 --requests 64
+    python -m benchmarks.bench_login --concurrency 16 --requests 64 --sync-hashing
+"""
+from unittest.mock import patch
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.common import sqlite_app, summarize, LoopLagMonitor
+
+
+async def _sync_verify_and_update(plain_password, hashed_password):
+    from app.core.security import pwd_context
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def run(concurrency: int, total: int) -> dict:
+    from app.core.security import get_password_hash
+    from app.db.models import User
+
+    with sqlite_app() as (app, Session):
+        db = Session()
+        db.add(User(email="bench@example.com", hashed_password=get_password_hash("secret123")))
+        db.commit()
+        db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one_login():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/api/v1/auth/login",
+                        data={"username": "bench@example.com", "password": "secret123"}
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    response.raise_for_status()
+
+            with LoopLagMonitor() as monitor:
+                start = time.perf_counter()
+                await asyncio.gather(*(one_login() for _ in range(total)))
+                elapsed = time.perf_counter() - start
+
+    result = summarize(latencies, elapsed)
+    result["concurrency"] = concurrency
+    result["max_event_loop_stall_ms"] = round(monitor.max_lag * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--sync-hashing", action="store_true", help="verify bcrypt on the event loop (old behaviour)")
+    args = parser.parse_args()
+
+    if args.sync_hashing:
+        with patch("app.api.v1.endpoints.auth.verify_and_update_password", _sync_verify_and_update):
+            result = asyncio.run(run(args.concurrency, args.requests))
+    else:
+        result = asyncio.run(run(args.concurrency, args.requests))
+    result["mode"] = "sync" if args.sync_hashing else "executor"
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Sequence
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+@contextmanager
+def sqlite_app():
+    """The FastAPI app wired to a throwaway SQLite database (yields a sync Session for seeding)."""
+    from app.db.base import Base, get_db
+    from app.main import app
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+    # NullPool: nothing to dispose, so this works inside or outside a running loop
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield app, Session
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+        os.unlink(path)
+
+
+def seed_users(engine, count: int, seed: int = 42) -> None:
+    """Bulk-insert `count` synthetic users with spread-out signup dates and usage."""
+    from app.db.base import Base
+    from app.db.models import User
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    today = date.today()
+    start = datetime(2022, 1, 1)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(count):
+            images = rng.choice([0, 0, 1, 3, 10, 50])
+            google = rng.random() < 0.3
+            batch.append({
+                "id": str(uuid.uuid4()),
+                "email": f"user{i}@example.com",
+                "hashed_password": None if google else "x",
+                "oauth_provider": "google" if google else None,
+                "role": "ADMIN" if i % 5000 == 0 else "USER",
+                "total_images_processed": images,
+                "images_processed_today": 0,
+                "last_upload_date": today - timedelta(days=rng.randrange(365)) if images else None,
+                "total_processing_time": images * rng.uniform(1.0, 6.0),
+                "created_at": start + timedelta(seconds=rng.randrange(3 * 365 * 86400)),
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(User.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(User.__table__), batch)
+
+
+class LoopLagMonitor:
+    """Measures the worst event-loop stall while running (blocking calls show up here)."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, time.perf_counter() - start - self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
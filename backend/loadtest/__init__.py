@@ -0,0 +1,14 @@
+"""
+Load-test harness: the real API under realistic traffic, on one machine.
+
+    python -m loadtest run --duration 60 --users 16 --out results/head.json
+    python -m loadtest compare results/base.json results/head.json
+
+`run` starts local stand-ins for the external services (redis-server or
+fakeredis over TCP, an aiosmtpd sink, moto or MinIO for S3 when available),
+a throwaway SQLite database, and the app under uvicorn with several workers. It then drives a
+seeded mix of anonymous, authenticated, batch and contact-form traffic with
+generated images, and writes a JSON summary: throughput, p50/p95/p99 latency
+and error rates per traffic kind, and peak RSS per server process. `compare`
+diffs two summaries (e.g. from two commits) and can fail on regressions.
+"""
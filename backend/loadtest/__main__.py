@@ -0,0 +1,138 @@
+"""
+Command line: `python -m loadtest run ...` to load the app and write a JSON
+summary, `python -m loadtest compare base.json head.json` to diff two of them.
+Run from the backend directory.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from loadtest.images import generate_images
+from loadtest.report import ProcessMonitor, build_report, compare
+from loadtest.server import AppServer, create_sqlite_database
+from loadtest.standins import LocalRedis, LocalS3, SmtpSink
+from loadtest.traffic import DEFAULT_MIX, Recorder, VirtualUser, anonymous_ips, create_accounts, parse_mix
+
+
+async def drive(args: argparse.Namespace, base_url: str, mix: dict) -> tuple:
+    images = generate_images(args.images, args.seed)
+    ips = anonymous_ips(args.anonymous_ips)
+    limits = httpx.Limits(max_connections=args.users * args.batch_concurrency, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        tokens = await create_accounts(client, args.users)
+        recorder = Recorder(args.warmup)
+        users = [
+            VirtualUser(index, client, tokens[index], images, mix, ips, recorder, args.seed,
+                        batch_size=args.batch_size, batch_concurrency=args.batch_concurrency,
+                        think_time=args.think_ms / 1000)
+            for index in range(args.users)
+        ]
+        deadline = time.perf_counter() + args.warmup + args.duration
+        await asyncio.gather(*(user.run(deadline) for user in users))
+        # Users finish their in-flight request after the deadline; measure up to the last one
+        elapsed = time.perf_counter() - recorder.started - args.warmup
+    return recorder.samples, elapsed
+
+
+def run(args: argparse.Namespace) -> int:
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    redis, smtp = LocalRedis(args.redis_url), SmtpSink()
+    s3 = LocalS3(args.s3_endpoint, args.s3_access_key, args.s3_secret_key)
+    workdir = Path(tempfile.mkdtemp(prefix="quickbg-loadtest-"))
+    server = monitor = None
+    try:
+        env = {**redis.start(), **smtp.start(), **s3.start()}
+        env["DATABASE_URL"] = args.database_url or create_sqlite_database(workdir / "loadtest.db")
+        env["LOADTEST_FAKE_MODEL"] = "1" if args.fake_model else "0"
+        server = AppServer(env, workers=args.workers, log_path=Path(args.log) if args.log else workdir / "server.log")
+        print(f"Starting {args.workers} worker(s) (log: {server.log_path})", file=sys.stderr)
+        server.start()
+        monitor = ProcessMonitor(server.process.pid).start()
+        print(f"Running {args.users} users for {args.warmup:g}s warm-up + {args.duration:g}s", file=sys.stderr)
+        samples, elapsed = asyncio.run(drive(args, server.base_url, mix))
+        monitor.stop()
+    finally:
+        if monitor is not None:
+            monitor.stop()
+        if server is not None:
+            server.stop()
+        for standin in (s3, smtp, redis):
+            standin.stop()
+
+    config = {
+        "duration_s": args.duration, "warmup_s": args.warmup, "users": args.users, "workers": args.workers,
+        "mix": mix, "images": args.images, "seed": args.seed, "batch_size": args.batch_size,
+        "batch_concurrency": args.batch_concurrency, "think_ms": args.think_ms,
+        "anonymous_ips": args.anonymous_ips, "fake_model": args.fake_model,
+        "database": "external" if args.database_url else "sqlite",
+    }
+    services = {"redis": redis.describe(), "smtp": smtp.describe(), "s3": s3.describe()}
+    report = build_report(samples, elapsed, config, services, monitor.summary())
+    Path(args.out).write_text(json.dumps(report, indent=2) + "\n")
+
+    overall = report["overall"]
+    print(
+        f"{overall['requests']} requests, {overall['throughput_per_second']}/s ok, "
+        f"p50 {overall['p50_ms']}ms p95 {overall['p95_ms']}ms p99 {overall['p99_ms']}ms, "
+        f"error rate {overall['error_rate']:.2%}, peak RSS {report['rss_peak_total_mb']}MB -> {args.out}"
+    )
+    return 0
+
+
+def compare_command(args: argparse.Namespace) -> int:
+    base, head = (json.loads(Path(path).read_text()) for path in (args.base, args.head))
+    rows, regressions = compare(base, head, args.threshold)
+    print(f"{'metric':<32} {'base':>10} {'head':>10} {'change':>8}")
+    for row in rows:
+        change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        print(f"{row['metric']:<32} {row['base']:>10} {row['head']:>10} {change:>8}{'  REGRESSED' if row['regressed'] else ''}")
+    if base.get("meta", {}).get("cpus") != head.get("meta", {}).get("cpus"):
+        print("warning: runs are from machines with different CPU counts", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Start the app with local stand-ins and load it")
+    run_parser.add_argument("--duration", type=float, default=60.0, help="Measured seconds (default: 60)")
+    run_parser.add_argument("--warmup", type=float, default=10.0, help="Seconds of load before measuring (default: 10)")
+    run_parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users (default: 8)")
+    run_parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes (default: 2)")
+    run_parser.add_argument("--mix", help="Traffic weights, e.g. anonymous=0.35,authenticated=0.45,batch=0.15,contact=0.05")
+    run_parser.add_argument("--images", type=int, default=24, help="Distinct synthetic images (default: 24)")
+    run_parser.add_argument("--seed", type=int, default=1, help="Seed for images and user actions (default: 1)")
+    run_parser.add_argument("--batch-size", type=int, default=8, help="Images per batch burst (default: 8)")
+    run_parser.add_argument("--batch-concurrency", type=int, default=4, help="Parallel uploads in a burst (default: 4)")
+    run_parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a user's actions")
+    run_parser.add_argument("--anonymous-ips", type=int, default=200, help="Distinct anonymous visitors (default: 200)")
+    run_parser.add_argument("--fake-model", action="store_true", help="Replace ISNet with a cheap mask (no model needed)")
+    run_parser.add_argument("--redis-url", help="Use this Redis instead of a local redis-server/fakeredis")
+    run_parser.add_argument("--s3-endpoint", help="S3-compatible endpoint (e.g. MinIO) instead of moto")
+    run_parser.add_argument("--s3-access-key", default="minioadmin")
+    run_parser.add_argument("--s3-secret-key", default="minioadmin")
+    run_parser.add_argument("--database-url", help="Use this database instead of a fresh SQLite file")
+    run_parser.add_argument("--out", default="loadtest-summary.json", help="Summary path (default: loadtest-summary.json)")
+    run_parser.add_argument("--log", help="Server log path (default: a temp file)")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Diff two summaries; exit 1 on regression")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=10.0,
+                                help="Percent change counted as a regression (default: 10)")
+    compare_parser.set_defaults(func=compare_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+uvicorn entry point for load tests: the real app.
+
+With LOADTEST_FAKE_MODEL=1 the ISNet call is replaced by a cheap elliptical
+mask, so the API, database, Redis and mail paths can be loaded on machines
+without the model (or to isolate them from it). Everything else - decoding,
+post-processing, encoding, admission control - runs unchanged. Inference
+latencies from such a run say nothing about the model.
+"""
+import os
+
+from PIL import Image, ImageDraw
+
+from app.main import app  # noqa: F401
+from app.services import background_removal
+
+
+def _fake_remove(image, only_mask=False, **kwargs):
+    width, height = image.size
+    mask = Image.new("L", image.size, 0)
+    ImageDraw.Draw(mask).ellipse((width // 5, height // 8, width * 4 // 5, height * 7 // 8), fill=255)
+    return mask
+
+
+if os.getenv("LOADTEST_FAKE_MODEL") == "1":
+    background_removal.get_session = lambda: None
+    background_removal.remove = _fake_remove
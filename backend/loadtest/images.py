@@ -0,0 +1,52 @@
+"""Deterministic synthetic photos: a textured subject on a noisy gradient, at a realistic spread of sizes."""
+import random
+from io import BytesIO
+from typing import List, NamedTuple
+
+import numpy as np
+from PIL import Image
+
+# (width, height), weight: phone snapshots dominate, a few full-size camera images
+SIZES = [((640, 480), 0.3), ((1280, 960), 0.35), ((2048, 1536), 0.25), ((4000, 3000), 0.1)]
+# PNG only for small images: a noisy 12MP PNG would exceed MAX_IMAGE_SIZE_MB
+FORMATS = [("JPEG", 0.6), ("WEBP", 0.25), ("PNG", 0.15)]
+PNG_MAX_MEGAPIXELS = 2.0
+CONTENT_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class LoadImage(NamedTuple):
+    filename: str
+    data: bytes
+    content_type: str
+    megapixels: float
+
+
+def render(width: int, height: int, rng: np.random.Generator) -> Image.Image:
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    start, end = rng.uniform(40, 215, 3), rng.uniform(40, 215, 3)
+    t = (x / width * 0.6 + y / height * 0.4)[..., None]
+    image = start * (1 - t) + end * t
+    # Subject: an ellipse with its own color and a stripe texture
+    cx, cy = rng.uniform(0.35, 0.65) * width, rng.uniform(0.4, 0.6) * height
+    rx, ry = rng.uniform(0.15, 0.3) * width, rng.uniform(0.25, 0.4) * height
+    inside = ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2 <= 1
+    texture = 30 * np.sin((x + y) / rng.uniform(4, 12))[..., None]
+    image = np.where(inside[..., None], rng.uniform(0, 255, 3) + texture, image)
+    image += rng.normal(0, 6, (height, width, 1))
+    return Image.fromarray(np.clip(image, 0, 255).astype(np.uint8))
+
+
+def generate_images(count: int, seed: int = 1) -> List[LoadImage]:
+    """`count` images drawn from SIZES and FORMATS; the same seed gives the same bytes."""
+    picker = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    images = []
+    for index in range(count):
+        (width, height), = picker.choices([size for size, _ in SIZES], [w for _, w in SIZES])
+        megapixels = width * height / 1e6
+        formats = [(f, w) for f, w in FORMATS if f != "PNG" or megapixels <= PNG_MAX_MEGAPIXELS]
+        fmt, = picker.choices([f for f, _ in formats], [w for _, w in formats])
+        buffer = BytesIO()
+        render(width, height, rng).save(buffer, format=fmt, quality=88)
+        images.append(LoadImage(f"load_{index:03d}.{fmt.lower()}", buffer.getvalue(), CONTENT_TYPES[fmt], megapixels))
+    return images
@@ -0,0 +1,180 @@
+"""Run summaries (JSON, comparable across commits) and the process memory monitor."""
+import os
+import platform
+import subprocess
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import psutil
+
+from benchmarks.common import percentile
+from loadtest.traffic import KINDS, Sample
+
+RATE_LIMITED = 429
+
+
+class ProcessMonitor:
+    """Samples the RSS of a process tree (the uvicorn supervisor and its workers) until stopped."""
+
+    def __init__(self, root_pid: int, interval: float = 0.5):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak: Dict[int, float] = {}
+        self.last: Dict[int, float] = {}
+        self.roles: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+
+    def start(self) -> "ProcessMonitor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _processes(self) -> List[Tuple[psutil.Process, str]]:
+        root = psutil.Process(self.root_pid)
+        children = root.children(recursive=True)
+        # With --workers 1 uvicorn serves from the root process itself
+        found = [(root, "supervisor" if children else "worker")]
+        for child in children:
+            try:
+                # uvicorn also starts a multiprocessing resource tracker; only workers serve requests
+                role = "tracker" if "resource_tracker" in " ".join(child.cmdline()) else "worker"
+            except psutil.Error:
+                continue
+            found.append((child, role))
+        return found
+
+    def sample(self) -> None:
+        try:
+            processes = self._processes()
+        except psutil.Error:
+            return
+        for process, role in processes:
+            try:
+                rss = process.memory_info().rss / 1024 / 1024
+            except psutil.Error:
+                continue
+            self.roles[process.pid] = role
+            self.last[process.pid] = rss
+            self.peak[process.pid] = max(rss, self.peak.get(process.pid, 0.0))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def summary(self) -> List[dict]:
+        return [
+            {"pid": pid, "role": self.roles[pid], "rss_peak_mb": round(self.peak[pid], 1),
+             "rss_end_mb": round(self.last[pid], 1)}
+            for pid in sorted(self.peak)
+        ]
+
+
+def _latency_stats(latencies: Sequence[float]) -> dict:
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def summarize_samples(samples: Sequence[Sample], elapsed: float) -> dict:
+    """
+    Counts and rates over all samples; latency percentiles over successful
+    (2xx) responses only. 429 (free tries used up) is expected traffic, not
+    an error; everything else that is not 2xx is, including 503 load shedding
+    and connection errors (status 0).
+    """
+    statuses = Counter(sample.status for sample in samples)
+    ok = [sample.latency for sample in samples if 200 <= sample.status < 300]
+    errors = sum(count for status, count in statuses.items() if not 200 <= status < 300 and status != RATE_LIMITED)
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "rate_limited": statuses.get(RATE_LIMITED, 0),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_per_second": round(len(ok) / elapsed, 2) if elapsed else None,
+        **_latency_stats(ok),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def git_revision() -> Optional[str]:
+    """Short commit of the tree under test, '+dirty' when it has local changes (None outside git)."""
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], stderr=subprocess.DEVNULL).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("+dirty" if dirty else "")
+
+
+def build_report(samples: Sequence[Sample], elapsed: float, config: dict, services: dict,
+                 processes: List[dict]) -> dict:
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            **config,
+        },
+        "services": services,
+        "overall": summarize_samples(samples, elapsed),
+        "by_kind": {
+            kind: summarize_samples([sample for sample in samples if sample.kind == kind], elapsed)
+            for kind in KINDS
+            if any(sample.kind == kind for sample in samples)
+        },
+        "processes": processes,
+        "rss_peak_total_mb": round(sum(process["rss_peak_mb"] for process in processes), 1),
+    }
+
+
+# (path in the report, True if higher is better)
+COMPARED_METRICS = [
+    (("overall", "throughput_per_second"), True),
+    (("overall", "p50_ms"), False),
+    (("overall", "p95_ms"), False),
+    (("overall", "p99_ms"), False),
+    (("overall", "error_rate"), False),
+    (("rss_peak_total_mb",), False),
+] + [
+    (("by_kind", kind, metric), False) for kind in KINDS for metric in ("p50_ms", "p95_ms", "p99_ms", "error_rate")
+]
+ERROR_RATE_TOLERANCE = 0.01  # Absolute: error rates are compared in points, not percent
+
+
+def _lookup(report: dict, path: Tuple[str, ...]):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+
+def compare(base: dict, head: dict, threshold_pct: float) -> Tuple[List[dict], List[dict]]:
+    """(rows for every metric present in both, the rows that regressed beyond the threshold)."""
+    rows, regressions = [], []
+    for path, higher_is_better in COMPARED_METRICS:
+        before, after = _lookup(base, path), _lookup(head, path)
+        if before is None or after is None:
+            continue
+        change_pct = round((after - before) / before * 100, 1) if before else None
+        if path[-1] == "error_rate":
+            regressed = after - before > ERROR_RATE_TOLERANCE
+        elif change_pct is None:
+            regressed = False
+        else:
+            regressed = (-change_pct if higher_is_better else change_pct) > threshold_pct
+        row = {"metric": ".".join(path), "base": before, "head": after, "change_pct": change_pct, "regressed": regressed}
+        rows.append(row)
+        if regressed:
+            regressions.append(row)
+    return rows, regressions
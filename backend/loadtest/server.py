@@ -0,0 +1,93 @@
+"""The app under uvicorn in a subprocess, with its settings pointed at the stand-ins."""
+import os
+import secrets
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+from loadtest.standins import free_port
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+READY_PATH = "/api/v1/health/ready"
+
+
+def create_sqlite_database(path: Path) -> str:
+    """A fresh SQLite database with the current schema; returns its DATABASE_URL."""
+    from sqlalchemy import create_engine
+    from app.db.base import Base
+    import app.db.models  # noqa: F401 (registers the tables)
+
+    if path.exists():
+        path.unlink()
+    url = f"sqlite:///{path}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return url
+
+
+class AppServer:
+    """
+    `uvicorn loadtest.asgi:app` with `workers` processes. Proxy headers are
+    trusted from localhost, so the harness can give each simulated anonymous
+    visitor its own client IP through X-Forwarded-For.
+    """
+
+    def __init__(self, env: Dict[str, str], workers: int = 2, log_path: Optional[Path] = None):
+        self.env = env
+        self.workers = workers
+        self.port = free_port()
+        self.log_path = log_path
+        self.process: Optional[subprocess.Popen] = None
+        self._log = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, ready_timeout: float = 300.0) -> None:
+        self._log = open(self.log_path, "w") if self.log_path else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "loadtest.asgi:app",
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--workers", str(self.workers),
+                "--proxy-headers", "--forwarded-allow-ips", "127.0.0.1",
+                "--log-level", "warning", "--no-access-log",
+            ],
+            cwd=BACKEND_DIR,
+            env={**os.environ, "SECRET_KEY": secrets.token_hex(32), **self.env},
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+        )
+        self._wait_ready(ready_timeout)
+
+    def _wait_ready(self, timeout: float) -> None:
+        """Poll readiness (database reachable, model warm) until it answers 200."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode} (see {self.log_path})")
+            try:
+                if httpx.get(self.base_url + READY_PATH, timeout=2.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        self.stop()
+        raise RuntimeError(f"Server not ready after {timeout:.0f}s (model missing? see {self.log_path})")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self._log not in (None, subprocess.DEVNULL):
+            self._log.close()
@@ -0,0 +1,213 @@
+"""Local stand-ins for Redis, SMTP and S3, each exposing the settings the app needs to use it."""
+import logging
+import secrets
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _fakeredis_server():
+    """
+    fakeredis speaking the Redis protocol on a local port. Its stock handler
+    closes the connection after any error reply, and redis-py runs scripts by
+    EVALSHA first, loading them on the NOSCRIPT error; this handler sends the
+    error and keeps the connection, as a real server does.
+    """
+    from fakeredis import TcpFakeServer
+    from fakeredis._clients._tcp_server import TCPFakeRequestHandler
+    from redis.exceptions import ResponseError
+
+    class Handler(TCPFakeRequestHandler):
+        def setup(self) -> None:
+            super().setup()
+            read_response = self.current_client.read_response
+
+            def read_reply():
+                try:
+                    return read_response()
+                except ResponseError as e:
+                    return e  # Sent as an error reply
+
+            self.current_client.read_response = read_reply
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.RequestHandlerClass = Handler
+    return server
+
+
+class LocalRedis:
+    """
+    A Redis shared by all workers: `url` if given, else a throwaway
+    redis-server when one is installed, else fakeredis (with Lua).
+
+    start() checks that the server runs scripts the way redis-py calls them
+    (EVALSHA, then SCRIPT LOAD on NOSCRIPT) and raises if not: the rate
+    limiter fails open on Redis errors, so a broken stand-in would otherwise
+    look like a healthy run with no free-try limit.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url
+        self.kind = "external" if url else ("redis-server" if shutil.which("redis-server") else "fakeredis")
+        self._server = None
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self) -> Dict[str, str]:
+        if self._server is None and self.kind == "fakeredis":
+            self._server = _fakeredis_server()
+            threading.Thread(target=self._server.serve_forever, name="fakeredis", daemon=True).start()
+            self.url = f"redis://127.0.0.1:{self._server.server_address[1]}/0"
+        elif self._process is None and self.kind == "redis-server":
+            port = free_port()
+            self._process = subprocess.Popen(
+                ["redis-server", "--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            self.url = f"redis://127.0.0.1:{port}/0"
+        self._check_scripts()
+        return {"REDIS_URL": self.url}
+
+    def _check_scripts(self, timeout: float = 10.0) -> None:
+        import redis
+
+        client = redis.Redis.from_url(self.url, socket_timeout=5.0)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:  # A fresh redis-server needs a moment to listen
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+            # A script this server has never seen: EVALSHA -> NOSCRIPT -> SCRIPT LOAD -> EVALSHA
+            token = secrets.token_hex(8)
+            script = client.register_script(f"return redis.call('echo', ARGV[1]) .. '{token}'")
+            if script(args=["ok"]) != f"ok{token}".encode() or not client.ping():
+                raise redis.RedisError("unexpected script result")
+        except redis.RedisError as e:
+            self.stop()
+            raise RuntimeError(f"Redis stand-in ({self.kind}, {self.url}) cannot run Lua scripts: {e}") from e
+        finally:
+            client.close()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+
+    def describe(self) -> dict:
+        return {"kind": self.kind}
+
+
+class _CountingHandler:
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        self.bytes += len(envelope.content)
+        return "250 Message accepted"
+
+
+class SmtpSink:
+    """An SMTP server that accepts and counts every message (no TLS, no auth)."""
+
+    def __init__(self):
+        self.handler = _CountingHandler()
+        self._controller = None
+
+    def start(self) -> Dict[str, str]:
+        from aiosmtpd.controller import Controller
+        port = free_port()
+        self._controller = Controller(self.handler, hostname="127.0.0.1", port=port)
+        self._controller.start()
+        return {
+            "MAIL_SERVER": "127.0.0.1",
+            "MAIL_PORT": str(port),
+            "MAIL_STARTTLS": "false",
+            "MAIL_SSL_TLS": "false",
+            "USE_CREDENTIALS": "false",
+            "VALIDATE_CERTS": "false",
+            "MAIL_FROM": "loadtest@example.com",
+        }
+
+    def stop(self) -> None:
+        if self._controller is not None:
+            self._controller.stop()
+            self._controller = None
+
+    def describe(self) -> dict:
+        return {"kind": "aiosmtpd", "messages": self.handler.messages, "bytes": self.handler.bytes}
+
+
+class LocalS3:
+    """
+    An S3-compatible endpoint with a fresh bucket: an existing one (MinIO)
+    when `endpoint` is given, else moto's server if moto is installed, else
+    none (S3 stays disabled, as in a deployment without a bucket).
+    """
+
+    def __init__(self, endpoint: Optional[str] = None, access_key: str = "minioadmin",
+                 secret_key: str = "minioadmin", bucket: str = "quickbg-loadtest"):
+        self.endpoint = endpoint
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.bucket = bucket
+        self.kind = "external" if endpoint else "moto"
+        self._server = None
+
+    def start(self) -> Dict[str, str]:
+        if self.endpoint is None:
+            try:
+                from moto.server import ThreadedMotoServer
+            except ImportError:
+                logger.warning("moto is not installed and no --s3-endpoint given: S3 disabled")
+                self.kind = "disabled"
+                return {"S3_BUCKET_NAME": ""}
+            port = free_port()
+            self._server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+            self._server.start()
+            self.endpoint = f"http://127.0.0.1:{port}"
+
+        import boto3
+        client = boto3.client(
+            "s3", endpoint_url=self.endpoint, region_name="us-east-1",
+            aws_access_key_id=self.access_key, aws_secret_access_key=self.secret_key
+        )
+        existing = {bucket["Name"] for bucket in client.list_buckets().get("Buckets", [])}
+        if self.bucket not in existing:
+            client.create_bucket(Bucket=self.bucket)
+        return {
+            "AWS_S3_ENDPOINT_URL": self.endpoint,
+            "AWS_ACCESS_KEY_ID": self.access_key,
+            "AWS_SECRET_ACCESS_KEY": self.secret_key,
+            "AWS_REGION": "us-east-1",
+            "S3_BUCKET_NAME": self.bucket,
+        }
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+    def describe(self) -> dict:
+        return {"kind": self.kind, "bucket": self.bucket if self.kind != "disabled" else None}
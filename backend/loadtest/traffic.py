@@ -0,0 +1,154 @@
+"""
+Closed-loop virtual users driving a weighted mix of traffic kinds.
+
+- anonymous: /process-anonymous from one of a pool of client IPs (sent as
+  X-Forwarded-For), so the free-try limit bites per visitor as in production
+- authenticated: /process with a bearer token; some requests composite onto
+  a color background and ask for JPEG
+- batch: an authenticated burst of images sent with bounded concurrency, as
+  the CLI/SDK do; each image is one sample
+- contact: the contact form, which queues an email (to the SMTP sink)
+
+Each virtual user has its own seeded RNG, so the sequence of actions is
+reproducible; interleaving and timings are not.
+"""
+import asyncio
+import random
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import httpx
+
+from loadtest.images import LoadImage
+
+ANONYMOUS = "anonymous"
+AUTHENTICATED = "authenticated"
+BATCH = "batch"
+CONTACT = "contact"
+KINDS = (ANONYMOUS, AUTHENTICATED, BATCH, CONTACT)
+DEFAULT_MIX = {ANONYMOUS: 0.35, AUTHENTICATED: 0.45, BATCH: 0.15, CONTACT: 0.05}
+
+COMPOSITE_SHARE = 0.2  # Authenticated requests that ask for a background + JPEG
+PASSWORD = "load-test-password"
+
+
+class Sample(NamedTuple):
+    kind: str
+    status: int  # 0 = no response (connection error or timeout)
+    latency: float  # Seconds
+    started: float  # Seconds since the run started
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """'anonymous=0.4,authenticated=0.6' -> weights (kinds left out get 0)."""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in KINDS:
+            raise ValueError(f"Unknown traffic kind {kind!r} (one of {', '.join(KINDS)})")
+        mix[kind.strip()] = float(weight)
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one positive weight")
+    return mix
+
+
+def anonymous_ips(count: int) -> List[str]:
+    return [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(1, count + 1)]
+
+
+class Recorder:
+    """Collects samples, dropping those that started during the warm-up period."""
+
+    def __init__(self, warmup: float):
+        self.warmup = warmup
+        self.samples: List[Sample] = []
+        self.started = time.perf_counter()
+
+    async def timed(self, kind: str, request) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await request
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        offset = started - self.started
+        if offset >= self.warmup:
+            self.samples.append(Sample(kind, status, time.perf_counter() - started, offset))
+        return response
+
+
+async def create_accounts(client: httpx.AsyncClient, count: int) -> List[str]:
+    """Register and log in `count` users through the API; returns their access tokens."""
+    async def account(index: int) -> str:
+        email = f"load{index}@loadtest.example.com"
+        await client.post("/api/v1/auth/register", json={"email": email, "password": PASSWORD, "name": f"Load {index}"})
+        response = await client.post("/api/v1/auth/login", data={"username": email, "password": PASSWORD})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    return await asyncio.gather(*(account(index) for index in range(count)))
+
+
+def _upload(image: LoadImage) -> dict:
+    return {"file": (image.filename, image.data, image.content_type)}
+
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, token: str, images: Sequence[LoadImage],
+                 mix: Dict[str, float], ips: Sequence[str], recorder: Recorder, seed: int,
+                 batch_size: int = 8, batch_concurrency: int = 4, think_time: float = 0.0):
+        self.index = index
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.images = images
+        self.kinds = [kind for kind in KINDS if mix.get(kind)]
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.ips = ips
+        self.recorder = recorder
+        self.rng = random.Random(seed * 1000 + index)
+        self.batch_size = batch_size
+        self.batch_concurrency = batch_concurrency
+        self.think_time = think_time
+
+    async def run(self, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            await getattr(self, kind)()
+            if self.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+    async def anonymous(self) -> None:
+        headers = {"X-Forwarded-For": self.rng.choice(self.ips)}
+        await self.recorder.timed(ANONYMOUS, self.client.post(
+            "/api/v1/process-anonymous", headers=headers, files=_upload(self.rng.choice(self.images))
+        ))
+
+    def _process(self, kind: str, image: LoadImage):
+        params = {}
+        if kind == AUTHENTICATED and self.rng.random() < COMPOSITE_SHARE:
+            params = {"background": "color", "bg_color": "#ffffff", "output_format": "jpeg"}
+        return self.recorder.timed(kind, self.client.post(
+            "/api/v1/process", headers=self.headers, params=params, files=_upload(image)
+        ))
+
+    async def authenticated(self) -> None:
+        await self._process(AUTHENTICATED, self.rng.choice(self.images))
+
+    async def batch(self) -> None:
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        images = [self.rng.choice(self.images) for _ in range(self.batch_size)]
+
+        async def one(image: LoadImage) -> None:
+            async with semaphore:
+                await self._process(BATCH, image)
+
+        await asyncio.gather(*(one(image) for image in images))
+
+    async def contact(self) -> None:
+        await self.recorder.timed(CONTACT, self.client.post("/api/v1/contact/contact", json={
+            "name": f"Load {self.index}",
+            "email": f"visitor{self.index}@loadtest.example.com",
+            "subject": "Load test",
+            "message": "Hello from the load test harness.",
+        }))
@@ -0,0 +1,9 @@
+"""
+Python client for the QuickBG background removal API.
+
+Only depends on httpx; it does not import the backend's `app` package.
+"""
+from quickbg_client._common import BatchItem, QuickBGError, RateLimited, Result, RetryPolicy
+from quickbg_client.async_client import AsyncQuickBGClient
+from quickbg_client.client import QuickBGClient
+
@@ -0,0 +1,236 @@
+"""Request building, retry policy and token handling shared by the sync and async clients."""
+import base64
+import json
+import mimetypes
+import os
+import random
+import re
+import secrets
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import httpx
+
+API_PREFIX = "/api/v1"
+LOGIN_PATH = f"{API_PREFIX}/auth/login"
+PROCESS_PATH = f"{API_PREFIX}/process"
+PROCESS_ANONYMOUS_PATH = f"{API_PREFIX}/process-anonymous"
+
+# Shed load (503, with Retry-After from admission control) and rate limits
+# (429) are retried; every other error is returned to the caller at once
+RETRY_STATUSES = (429, 503)
+
+# Log in again this long before the access token expires
+TOKEN_REFRESH_MARGIN_SECONDS = 60.0
+
+CHUNK_SIZE = 64 * 1024
+
+_FILENAME = re.compile(r'filename="([^"]+)"')
+
+ImageInput = Union[str, os.PathLike, bytes]
+
+
+class QuickBGError(Exception):
+    """The API refused or failed a request."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class RateLimited(QuickBGError):
+    """Still 429/503 after the retries, or told to wait longer than max_retry_wait."""
+
+
+class Result(NamedTuple):
+    media_type: str
+    filename: str  # Suggested by the server: <name>_nobg.<ext>
+    content: Optional[bytes] = None  # When not streamed to disk
+    path: Optional[Path] = None  # When streamed to disk
+    remaining_tries: Optional[int] = None  # Anonymous requests only
+
+
+class BatchItem(NamedTuple):
+    source: ImageInput
+    result: Optional[Result] = None
+    error: Optional[Exception] = None
+
+
+class RetryPolicy(NamedTuple):
+    max_retries: int = 5
+    max_wait: float = 60.0  # Longest Retry-After honoured; beyond it RateLimited is raised
+    backoff: float = 0.5  # First delay without Retry-After; doubles per attempt, with jitter
+
+    def delay(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying `response`, or None to give up."""
+        if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        retry_after = retry_after_seconds(response)
+        if retry_after is None:
+            return min(self.max_wait, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        return retry_after if retry_after <= self.max_wait else None
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """The Retry-After header (delta-seconds or HTTP date) in seconds from now."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def error_for(response: httpx.Response) -> QuickBGError:
+    """QuickBGError (RateLimited for 429/503) from an error response; its body must have been read."""
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    kind = RateLimited if response.status_code in RETRY_STATUSES else QuickBGError
+    return kind(response.status_code, str(detail), retry_after_seconds(response))
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """The `exp` claim of a JWT (unverified: the server checks the signature), as a Unix time."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class Credentials:
+    """Account login and the current access token."""
+
+    def __init__(self, email: Optional[str], password: Optional[str], token: Optional[str]):
+        self.email = email
+        self.password = password
+        self.token = None
+        self.expires_at = None
+        if token:
+            self.set_token(token)
+
+    @property
+    def authenticated(self) -> bool:
+        return bool(self.token or self.email)
+
+    @property
+    def can_login(self) -> bool:
+        return bool(self.email and self.password)
+
+    def set_token(self, token: str) -> None:
+        self.token = token
+        self.expires_at = token_expiry(token)
+
+    def needs_login(self) -> bool:
+        if not self.can_login:
+            return False
+        if self.token is None:
+            return True
+        return self.expires_at is not None and self.expires_at - time.time() < TOKEN_REFRESH_MARGIN_SECONDS
+
+    def login_form(self) -> Dict[str, str]:
+        return {"username": self.email, "password": self.password}
+
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+
+def process_params(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Query parameters for /process from keyword options (background, bg_color, output_format, ...)."""
+    return {name: value for name, value in options.items() if value is not None}
+
+
+# The API only accepts parts sent as image/*; raw bytes are recognized by their signature
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def upload_name(image: ImageInput) -> str:
+    return "image" if isinstance(image, bytes) else Path(image).name
+
+
+def upload_content_type(image: ImageInput) -> str:
+    if not isinstance(image, bytes):
+        return mimetypes.guess_type(upload_name(image))[0] or "application/octet-stream"
+    if image[:4] == b"RIFF" and image[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in _SIGNATURES:
+        if image.startswith(signature):
+            return content_type
+    return "application/octet-stream"
+
+
+def upload_body(image: ImageInput):
+    """A fresh body for one attempt: bytes are reused, files are reopened (and streamed by httpx)."""
+    return image if isinstance(image, bytes) else open(image, "rb")
+
+
+def suggested_filename(response: httpx.Response, image: ImageInput) -> str:
+    match = _FILENAME.search(response.headers.get("Content-Disposition", ""))
+    return match.group(1) if match else f"{Path(upload_name(image)).stem}_nobg"
+
+
+def destination_path(destination: Union[str, os.PathLike], filename: str) -> Path:
+    """`destination` itself, or the server's filename inside it when it is a directory."""
+    path = Path(destination)
+    return path / filename if path.is_dir() else path
+
+
+def batch_stems(images: Sequence[ImageInput]) -> List[str]:
+    """
+    A distinct output stem per batch item, so results never overwrite each
+    other: the file's stem, or image-<position> for bytes. A stem shared by
+    several inputs (a.jpg and a.png, or the same name in two directories)
+    gets -<position> appended; compared case-insensitively for macOS/Windows.
+    """
+    stems = [f"image-{index}" if isinstance(image, bytes) else Path(image).stem for index, image in enumerate(images)]
+    counts = Counter(stem.lower() for stem in stems)
+    taken = {stem.lower() for stem in stems if counts[stem.lower()] == 1}
+    unique = []
+    for index, stem in enumerate(stems):
+        if counts[stem.lower()] > 1:
+            candidate = f"{stem}-{index}"
+            while candidate.lower() in taken:  # e.g. a real "a-1" next to two "a"
+                candidate += "_"
+            stem = candidate
+            taken.add(stem.lower())
+        unique.append(stem)
+    return unique
+
+
+def batch_filename(stem: str, filename: str) -> str:
+    """The server's suggested `filename` (<name>_nobg.<ext>) with <name> replaced by `stem`."""
+    return f"{stem}_nobg{Path(filename).suffix}"
+
+
+def temporary_path(path: Path) -> Path:
+    """Where a download is written before it is renamed to `path` (unique per request)."""
+    return path.with_name(f".{path.name}.{secrets.token_hex(4)}.part")
+
+
+def result_for(response: httpx.Response, image: ImageInput, content: Optional[bytes] = None, path: Optional[Path] = None) -> Result:
+    remaining = response.headers.get("X-Remaining-Tries")
+    return Result(
+        media_type=response.headers.get("Content-Type", ""),
+        filename=suggested_filename(response, image),
+        content=content,
+        path=path,
+        remaining_tries=int(remaining) if remaining is not None else None
+    )
@@ -0,0 +1,160 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import httpx
+
+from quickbg_client._common import (
+    CHUNK_SIZE, LOGIN_PATH, PROCESS_ANONYMOUS_PATH, PROCESS_PATH,
+    BatchItem, Credentials, ImageInput, QuickBGError, Result, RetryPolicy,
+    batch_filename, batch_stems, destination_path, error_for, process_params,
+    result_for, temporary_path, upload_body, upload_content_type, upload_name
+)
+
+
+class AsyncQuickBGClient:
+    """
+    asyncio QuickBG API client; same behavior as QuickBGClient.
+
+        async with AsyncQuickBGClient("https://api.quickbg.app", email=..., password=...) as client:
+            items = await client.process_many(paths, "out/", concurrency=16)
+
+    Pass `transport=httpx.ASGITransport(app=app)` to talk to an app in-process.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8002",
+        email: Optional[str] = None,
+        password: Optional[str] = None,
+        token: Optional[str] = None,
+        max_connections: int = 10,
+        timeout: float = 120.0,
+        retry: RetryPolicy = RetryPolicy(),
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            transport=transport
+        )
+        self._credentials = Credentials(email, password, token)
+        self._login_lock = asyncio.Lock()
+        self.retry = retry
+        self.max_connections = max_connections
+
+    async def __aenter__(self) -> "AsyncQuickBGClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self._http.aclose()
+
+    async def login(self) -> str:
+        """Fetch a new access token with the configured email and password."""
+        async with self._login_lock:
+            return await self._login()
+
+    async def _login(self) -> str:
+        response = await self._http.post(LOGIN_PATH, data=self._credentials.login_form())
+        if response.status_code != 200:
+            raise error_for(response)
+        self._credentials.set_token(response.json()["access_token"])
+        return self._credentials.token
+
+    async def _auth_headers(self) -> dict:
+        """Authorization header, logging in first if there is no token yet or it is about to expire."""
+        if self._credentials.needs_login():
+            async with self._login_lock:
+                if self._credentials.needs_login():  # Another task may have just done it
+                    await self._login()
+        return self._credentials.headers()
+
+    async def _refresh(self, rejected: dict) -> None:
+        """Log in again after a 401, unless another task already replaced the rejected token."""
+        async with self._login_lock:
+            if self._credentials.headers() == rejected:
+                await self._login()
+
+    async def process(self, image: ImageInput, destination: Union[str, os.PathLike, None] = None, **options) -> Result:
+        """Remove the background of one image; see QuickBGClient.process()."""
+        return await self._process(image, destination, options)
+
+    async def _process(self, image: ImageInput, destination, options: dict, stem: Optional[str] = None) -> Result:
+        credentials = self._credentials
+        path = PROCESS_PATH if credentials.authenticated else PROCESS_ANONYMOUS_PATH
+        params = process_params(options)
+        refreshed = False
+        attempt = 0
+        while True:
+            headers = await self._auth_headers() if credentials.authenticated else {}
+            body = upload_body(image)
+            try:
+                async with self._http.stream(
+                    "POST", path, params=params, headers=headers,
+                    files={"file": (upload_name(image), body, upload_content_type(image))}
+                ) as response:
+                    if response.status_code == 200:
+                        return await self._read_result(response, image, destination, stem)
+                    await response.aread()
+            finally:
+                if not isinstance(body, bytes):
+                    body.close()
+            if response.status_code == 401 and credentials.can_login and not refreshed:
+                await self._refresh(headers)
+                refreshed = True
+                continue
+            delay = self.retry.delay(response, attempt)
+            if delay is None:
+                raise error_for(response)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _read_result(self, response: httpx.Response, image: ImageInput, destination, stem: Optional[str] = None) -> Result:
+        if destination is None:
+            return result_for(response, image, content=await response.aread())
+        result = result_for(response, image)
+        filename = result.filename if stem is None else batch_filename(stem, result.filename)
+        path = destination_path(destination, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = temporary_path(path)
+        try:
+            # Chunk-sized writes to the page cache; not worth a thread hop each
+            with open(partial, "wb") as handle:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    handle.write(chunk)
+            os.replace(partial, path)
+        finally:
+            if partial.exists():
+                partial.unlink()
+        return result._replace(path=path)
+
+    async def process_many(
+        self,
+        images: Iterable[ImageInput],
+        output_dir: Union[str, os.PathLike],
+        concurrency: Optional[int] = None,
+        **options
+    ) -> List[BatchItem]:
+        """
+        Process many images with at most `concurrency` requests in flight
+        (default: the connection pool size), streaming each result into
+        `output_dir` under a name unique within the batch (see
+        QuickBGClient.process_many). Failures are reported per item, in input order.
+        """
+        images = list(images)
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def submit(image: ImageInput, stem: str) -> BatchItem:
+            async with semaphore:
+                try:
+                    return BatchItem(image, result=await self._process(image, output_dir, options, stem))
+                except (QuickBGError, httpx.HTTPError, OSError) as e:
+                    return BatchItem(image, error=e)
+
+        return list(await asyncio.gather(*map(submit, images, batch_stems(images))))
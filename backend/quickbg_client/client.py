@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import httpx
+
+from quickbg_client._common import (
+    CHUNK_SIZE, LOGIN_PATH, PROCESS_ANONYMOUS_PATH, PROCESS_PATH,
+    BatchItem, Credentials, ImageInput, QuickBGError, Result, RetryPolicy,
+    batch_filename, batch_stems, destination_path, error_for, process_params,
+    result_for, temporary_path, upload_body, upload_content_type, upload_name
+)
+
+
+class QuickBGClient:
+    """
+    Blocking QuickBG API client.
+
+    One client keeps a pool of keep-alive connections (`max_connections`)
+    and is safe to share between threads; create it once and reuse it. With
+    `email`/`password` it logs in on first use and again shortly before the
+    token expires (or on a 401); without credentials it uses the anonymous
+    endpoint. 429 and 503 responses are retried after their Retry-After.
+
+        with QuickBGClient("https://api.quickbg.app", email=..., password=...) as client:
+            client.process("photo.jpg", "out/")
+            client.process_many(paths, "out/", concurrency=8, output_format="webp")
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8002",
+        email: Optional[str] = None,
+        password: Optional[str] = None,
+        token: Optional[str] = None,
+        max_connections: int = 10,
+        timeout: float = 120.0,
+        retry: RetryPolicy = RetryPolicy(),
+        http_client: Optional[httpx.Client] = None
+    ):
+        self._http = http_client or httpx.Client(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout
+        )
+        self._owns_http = http_client is None
+        self._credentials = Credentials(email, password, token)
+        self._login_lock = threading.Lock()
+        self.retry = retry
+        self.max_connections = max_connections
+
+    def __enter__(self) -> "QuickBGClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._owns_http:
+            self._http.close()
+
+    def login(self) -> str:
+        """Fetch a new access token with the configured email and password."""
+        with self._login_lock:
+            return self._login()
+
+    def _login(self) -> str:
+        response = self._http.post(LOGIN_PATH, data=self._credentials.login_form())
+        if response.status_code != 200:
+            raise error_for(response)
+        self._credentials.set_token(response.json()["access_token"])
+        return self._credentials.token
+
+    def _auth_headers(self) -> dict:
+        """Authorization header, logging in first if there is no token yet or it is about to expire."""
+        if self._credentials.needs_login():
+            with self._login_lock:
+                if self._credentials.needs_login():  # Another thread may have just done it
+                    self._login()
+        return self._credentials.headers()
+
+    def _refresh(self, rejected: dict) -> None:
+        """Log in again after a 401, unless another thread already replaced the rejected token."""
+        with self._login_lock:
+            if self._credentials.headers() == rejected:
+                self._login()
+
+    def process(self, image: ImageInput, destination: Union[str, os.PathLike, None] = None, **options) -> Result:
+        """
+        Remove the background of one image (a path or bytes).
+
+        With `destination` (a file path, or a directory for the server's
+        <name>_nobg.<ext>) the result is streamed to disk and renamed into
+        place when complete; otherwise it is returned in `Result.content`.
+        `options` are the /process query parameters (background, bg_color,
+        output_format, ...).
+        """
+        return self._process(image, destination, options)
+
+    def _process(self, image: ImageInput, destination, options: dict, stem: Optional[str] = None) -> Result:
+        credentials = self._credentials
+        path = PROCESS_PATH if credentials.authenticated else PROCESS_ANONYMOUS_PATH
+        params = process_params(options)
+        refreshed = False
+        attempt = 0
+        while True:
+            headers = self._auth_headers() if credentials.authenticated else {}
+            body = upload_body(image)
+            try:
+                with self._http.stream(
+                    "POST", path, params=params, headers=headers,
+                    files={"file": (upload_name(image), body, upload_content_type(image))}
+                ) as response:
+                    if response.status_code == 200:
+                        return self._read_result(response, image, destination, stem)
+                    response.read()
+            finally:
+                if not isinstance(body, bytes):
+                    body.close()
+            if response.status_code == 401 and credentials.can_login and not refreshed:
+                # Revoked or expired early (e.g. server clock ahead): one fresh login
+                self._refresh(headers)
+                refreshed = True
+                continue
+            delay = self.retry.delay(response, attempt)
+            if delay is None:
+                raise error_for(response)
+            time.sleep(delay)
+            attempt += 1
+
+    def _read_result(self, response: httpx.Response, image: ImageInput, destination, stem: Optional[str] = None) -> Result:
+        if destination is None:
+            return result_for(response, image, content=response.read())
+        result = result_for(response, image)
+        filename = result.filename if stem is None else batch_filename(stem, result.filename)
+        path = destination_path(destination, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = temporary_path(path)
+        try:
+            with open(partial, "wb") as handle:
+                for chunk in response.iter_bytes(CHUNK_SIZE):
+                    handle.write(chunk)
+            os.replace(partial, path)
+        finally:
+            if partial.exists():
+                partial.unlink()
+        return result._replace(path=path)
+
+    def process_many(
+        self,
+        images: Iterable[ImageInput],
+        output_dir: Union[str, os.PathLike],
+        concurrency: Optional[int] = None,
+        **options
+    ) -> List[BatchItem]:
+        """
+        Process many images with at most `concurrency` requests in flight
+        (default: the connection pool size), streaming each result into
+        `output_dir`. Failures are reported per item, in input order.
+
+        Each result is written as <stem>_nobg.<ext>, with a stem unique within
+        the batch (see batch_stems): bytes inputs are image-0, image-1, ...,
+        and inputs sharing a stem get their position appended.
+        """
+        images = list(images)
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+        def submit(image: ImageInput, stem: str) -> BatchItem:
+            try:
+                return BatchItem(image, result=self._process(image, output_dir, options, stem))
+            except (QuickBGError, httpx.HTTPError, OSError) as e:
+                return BatchItem(image, error=e)
+
+        with ThreadPoolExecutor(max_workers=concurrency or self.max_connections) as executor:
+            return list(executor.map(submit, images, batch_stems(images)))
@@ -1,6 +1,9 @@
+import asyncio
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 from unittest.mock import Mock, patch
 
@@ -11,10 +14,14 @@ from app.core.config import settings
 
 # Test database URL
 TEST_DATABASE_URL = "sqlite:///./test.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
-# Create test engine
+# Create test engines: sync for fixtures/setup, async (same file) for the app.
+# NullPool because every TestClient runs its own event loop.
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 
 
 @pytest.fixture(scope="function")
@@ -32,11 +39,9 @@ def db():
 @pytest.fixture(scope="function")
 def client(db):
     """Create a test client with database override."""
-    def override_get_db():
-        try:
-            yield db
-        finally:
-            pass
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
     
     app.dependency_overrides[get_db] = override_get_db
     with TestClient(app) as test_client:
@@ -44,6 +49,17 @@ def client(db):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def run_db(db):
+    """Run an async CRUD call in a fresh async session: run_db(lambda session: crud.x(session, ...))."""
+    def runner(func):
+        async def run():
+            async with TestingAsyncSessionLocal() as session:
+                return await func(session)
+        return asyncio.run(run())
+    return runner
+
+
 @pytest.fixture
 def mock_s3():
     """Mock S3 operations."""
@@ -57,18 +73,16 @@ def mock_s3():
 
 @pytest.fixture
 def mock_rembg():
-    """Mock rembg background removal."""
+    """Mock rembg background removal (empty mask, or a fully transparent cutout)."""
     with patch('app.services.background_removal.remove') as mock:
         from PIL import Image
-        from io import BytesIO
         
-        # Return a fake transparent image
-        img = Image.new('RGBA', (100, 100), (0, 0, 0, 0))
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
+        def fake_remove(image, only_mask=False, **kwargs):
+            if only_mask:
+                return Image.new('L', image.size, 0)
+            return Image.new('RGBA', image.size, (0, 0, 0, 0))
         
-        mock.return_value = Image.open(buffer)
+        mock.side_effect = fake_remove
         yield mock
 
 
@@ -83,3 +97,44 @@ def sample_image_bytes():
     img.save(buffer, format='JPEG')
     return buffer.getvalue()
 
+
+@pytest.fixture
+def admin_overrides():
+    """Extra User columns for the admin_headers admin; override in a module to change them."""
+    return {}
+
+
+@pytest.fixture
+def admin_headers(db, admin_overrides):
+    """Auth headers for an admin user created in the test database."""
+    from app.core.security import create_access_token
+    from app.db.models import User, UserRole
+    
+    admin = User(email="admin@example.com", hashed_password="x", role=UserRole.ADMIN, **admin_overrides)
+    db.add(admin)
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': admin.id})}"}
+
+
+@pytest.fixture
+def fake_redis():
+    """Swap the shared Redis client for an in-memory fakeredis (with Lua)."""
+    import fakeredis
+    import fakeredis.aioredis
+    from app.core import redis as redis_module
+    from app.services.rate_limit import anonymous_limiter
+    from app.services.profiling import profiling_limiter
+    
+    previous = redis_module._client, redis_module._async_factory
+    # The sync client (returned for assertions) and the app's asyncio clients share one server
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    redis_module.set_redis(client, lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    for limiter in (anonymous_limiter, profiling_limiter):
+        limiter._acquire_script = None
+        limiter.clear_near_cache()
+    yield client
+    redis_module.set_redis(*previous)
+    for limiter in (anonymous_limiter, profiling_limiter):
+        limiter._acquire_script = None
+        limiter.clear_near_cache()
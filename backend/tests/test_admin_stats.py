@@ -0,0 +1,45 @@
+import pytest
+from datetime import date
+from unittest.mock import patch
+
+from app.db import crud
+from app.db.models import User, UsageTotals
+
+
+@pytest.fixture
+def admin_overrides():
+    return {"total_images_processed": 0, "images_processed_today": 0, "total_processing_time": 0.0}
+
+
+def test_totals_follow_user_writes(client, admin_headers, run_db):
+    """Totals are bumped by user creation and stats updates, not recomputed."""
+    assert client.get("/api/v1/admin/stats", headers=admin_headers).json()["total_users"] == 1
+
+    async def activity(session):
+        user = await crud.create_user(session, email="a@example.com", hashed_password="x")
+        await crud.create_oauth_user(session, email="b@example.com", name="B", google_id="g-b", avatar=None)
+        await crud.apply_user_stats_deltas(session, date.today(), [(user.id, 3, 6.0)])
+
+    with patch('app.db.crud.rebuild_usage_totals') as rebuild:
+        run_db(activity)
+        stats = client.get("/api/v1/admin/stats", headers=admin_headers).json()
+
+    rebuild.assert_not_called()
+    assert stats == {
+        "total_users": 3,
+        "total_images_processed": 3,
+        "total_processing_time": 6.0,
+        "avg_processing_time": 2.0
+    }
+
+
+def test_totals_bootstrap_on_empty_table(client, admin_headers, db):
+    """A database without the totals row gets it built once from the users table."""
+    db.add(User(email="c@example.com", hashed_password="x", total_images_processed=5, total_processing_time=10.0))
+    db.commit()
+
+    stats = client.get("/api/v1/admin/stats", headers=admin_headers).json()
+
+    assert stats["total_users"] == 2
+    assert stats["total_images_processed"] == 5
+    assert db.get(UsageTotals, 1) is not None
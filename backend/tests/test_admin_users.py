@@ -0,0 +1,73 @@
+import pytest
+from datetime import date, datetime, timedelta
+
+from app.db.models import User, UserRole
+
+
+@pytest.fixture
+def admin_overrides():
+    return {"created_at": datetime(2020, 1, 1)}
+
+
+@pytest.fixture
+def admin_id(db):
+    return db.query(User).filter(User.role == UserRole.ADMIN).one().id
+
+
+@pytest.fixture
+def users(db):
+    base = datetime(2024, 1, 1)
+    users = []
+    for i in range(7):
+        users.append(User(
+            id=f"user-{i}",
+            email=f"{'team' if i % 2 else 'user'}{i}@example.com",
+            hashed_password=None if i == 3 else "x",
+            oauth_provider="google" if i == 3 else None,
+            # Two users share a timestamp so the id tiebreaker is exercised
+            created_at=base + timedelta(days=min(i, 5)),
+            last_upload_date=date(2024, 6, i + 1) if i < 4 else None
+        ))
+    db.add_all(users)
+    db.commit()
+    return users
+
+
+def fetch_all(client, headers, **params):
+    ids, cursor = [], None
+    while True:
+        page = client.get("/api/v1/admin/users", headers=headers,
+                          params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        ids.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def test_keyset_pages_cover_every_user_once(client, admin_headers, users, admin_id):
+    ids = fetch_all(client, admin_headers, limit=2)
+
+    # user-5 and user-6 share created_at, so id breaks the tie
+    assert ids == ["user-6", "user-5", "user-4", "user-3", "user-2", "user-1", "user-0", admin_id]
+
+
+def test_filters(client, admin_headers, users, admin_id):
+    assert fetch_all(client, admin_headers, email_prefix="team") == ["user-5", "user-3", "user-1"]
+    assert fetch_all(client, admin_headers, oauth_provider="google") == ["user-3"]
+    assert fetch_all(client, admin_headers, role="admin") == [admin_id]
+    assert fetch_all(client, admin_headers, active_since="2024-06-02", active_until="2024-06-03") == ["user-2", "user-1"]
+
+
+def test_email_prefix_is_literal(client, admin_headers, users):
+    assert fetch_all(client, admin_headers, email_prefix="user_") == []
+
+
+def test_total_estimate_and_bad_cursor(client, admin_headers, users):
+    page = client.get("/api/v1/admin/users", headers=admin_headers,
+                      params={"limit": 1, "oauth_provider": "none", "include_total": True}).json()
+    assert page["total_estimate"] == 7
+    assert len(page["items"]) == 1
+    assert client.get("/api/v1/admin/users", headers=admin_headers).json()["total_estimate"] is None
+
+    response = client.get("/api/v1/admin/users", headers=admin_headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
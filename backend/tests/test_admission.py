@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import pytest
+
+from app.services.admission import AdmissionController, Overloaded, AUTHENTICATED, ANONYMOUS
+
+
+def make_controller(**overrides):
+    options = dict(
+        max_concurrency=1,
+        queue_limits={AUTHENTICATED: 4, ANONYMOUS: 2},
+        wait_budgets={AUTHENTICATED: 100.0, ANONYMOUS: 100.0},
+        initial_service_time=1.0
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+@pytest.mark.asyncio
+async def test_authenticated_served_before_anonymous():
+    """A freed slot goes to signed-in users even if anonymous ones queued first."""
+    controller = make_controller()
+    await controller.acquire(AUTHENTICATED)
+
+    order = []
+
+    async def wait_for(priority):
+        await controller.acquire(priority)
+        order.append(priority)
+        controller.release(1.0)
+
+    anonymous = asyncio.create_task(wait_for(ANONYMOUS))
+    await asyncio.sleep(0)
+    authenticated = asyncio.create_task(wait_for(AUTHENTICATED))
+    await asyncio.sleep(0)
+
+    controller.release(1.0)
+    await asyncio.gather(anonymous, authenticated)
+
+    assert order == [AUTHENTICATED, ANONYMOUS]
+    assert controller.metrics()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_with_retry_after():
+    """Requests beyond the queue bound fail fast instead of piling up."""
+    controller = make_controller(queue_limits={AUTHENTICATED: 4, ANONYMOUS: 1})
+    await controller.acquire(AUTHENTICATED)
+    waiter = asyncio.create_task(controller.acquire(ANONYMOUS))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as exc:
+        await controller.acquire(ANONYMOUS)
+
+    assert exc.value.retry_after >= 1
+    assert controller.metrics()["shed"][ANONYMOUS] == 1
+    assert controller.metrics()["queue_depth"][ANONYMOUS] == 1
+    waiter.cancel()
+
+
+@pytest.mark.asyncio
+async def test_wait_budget_uses_observed_service_time():
+    """Slow recent inferences push the expected wait over budget."""
+    controller = make_controller(wait_budgets={AUTHENTICATED: 100.0, ANONYMOUS: 5.0}, ewma_alpha=1.0)
+    await controller.acquire(AUTHENTICATED)
+    controller.release(10.0)  # One 10s inference observed
+    await controller.acquire(AUTHENTICATED)
+
+    assert controller.expected_wait(ANONYMOUS) == pytest.approx(10.0)
+    with pytest.raises(Overloaded) as exc:
+        await controller.acquire(ANONYMOUS)
+    assert exc.value.retry_after == 10
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    """Clients that disconnect while queued do not hold a queue slot."""
+    controller = make_controller()
+    await controller.acquire(AUTHENTICATED)
+    waiter = asyncio.create_task(controller.acquire(ANONYMOUS))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert controller.metrics()["queue_depth"][ANONYMOUS] == 0
+    controller.release(1.0)
+    assert controller.metrics()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_run_executes_in_threadpool():
+    controller = make_controller()
+
+    result = await controller.run(AUTHENTICATED, lambda x: x * 2, 21)
+
+    assert result == 42
+    assert controller.metrics()["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_budget_limits_concurrent_work():
+    """Calls wait while their memory cost would push the reserved total over budget."""
+    controller = make_controller(max_concurrency=4, memory_budget=100)
+    await controller.acquire(AUTHENTICATED, cost=60)
+
+    big = asyncio.create_task(controller.acquire(AUTHENTICATED, cost=60))
+    await asyncio.sleep(0)
+    small = asyncio.create_task(controller.acquire(AUTHENTICATED, cost=10))
+    await asyncio.sleep(0)
+
+    # Strict order: the small call fits but must not overtake the big one
+    assert not big.done() and not small.done()
+    assert controller.metrics()["in_flight"] == 1
+
+    controller.release(1.0, cost=60)
+    await asyncio.gather(big, small)
+    assert controller.metrics()["in_flight"] == 2
+    assert controller._reserved == 70
+
+
+@pytest.mark.asyncio
+async def test_over_budget_call_runs_alone():
+    """A call costing more than the whole budget still runs once nothing else does."""
+    controller = make_controller(max_concurrency=4, memory_budget=100)
+
+    await controller.acquire(AUTHENTICATED, cost=500)
+    waiter = asyncio.create_task(controller.acquire(ANONYMOUS, cost=1))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    controller.release(1.0, cost=500)
+    await waiter
+    assert controller._reserved == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_holds_slot_until_the_call_returns():
+    """The worker thread keeps running after a disconnect, so its slot is not freed early."""
+    controller = make_controller()
+    started, finish = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        finish.wait(5)
+
+    call = asyncio.create_task(controller.run(AUTHENTICATED, blocking))
+    await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    assert controller.metrics()["in_flight"] == 1
+
+    finish.set()
+    for _ in range(100):
+        if controller.metrics()["in_flight"] == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert controller.metrics()["in_flight"] == 0
+    assert controller.metrics()["completed"] == 1
@@ -0,0 +1,158 @@
+from io import BytesIO
+from unittest.mock import patch
+import weakref
+
+from PIL import Image, ImageFilter
+
+from app.services.animation import Frame, TemporalMasks, encode_animation, iter_frames
+from app.services.background_removal import remove_background
+
+
+def animated_gif(colors, size=(120, 80), durations=None) -> bytes:
+    """GIF with one frame per color; a frame-numbered pixel keeps Pillow from merging equal frames."""
+    frames = []
+    for index, color in enumerate(colors):
+        frame = Image.new('RGB', size, color)
+        frame.putpixel((index, 0), (0, 0, 0))
+        frames.append(frame)
+    buffer = BytesIO()
+    frames[0].save(
+        buffer, format='GIF', save_all=True, append_images=frames[1:],
+        duration=durations or [50] * len(frames), loop=0
+    )
+    return buffer.getvalue()
+
+
+def soft_mask(image, only_mask=False, **kwargs):
+    """Stand-in for rembg: a feathered box in the middle of the frame."""
+    width, height = image.size
+    mask = Image.new('L', image.size, 0)
+    mask.paste(255, (width // 4, height // 4, 3 * width // 4, 3 * height // 4))
+    return mask.filter(ImageFilter.GaussianBlur(2))
+
+
+def test_iter_frames_decodes_rgba_with_durations():
+    image = Image.open(BytesIO(animated_gif(['red', 'blue'], durations=[40, 120])))
+
+    frames = list(iter_frames(image))
+
+    assert [frame.duration for frame in frames] == [40, 120]
+    assert all(frame.image.mode == 'RGBA' for frame in frames)
+    assert frames[1].image.getpixel((60, 40)) == (0, 0, 255, 255)
+
+
+def test_temporal_masks_reuse_for_near_identical_frames():
+    calls = []
+
+    def infer(frame):
+        calls.append(frame)
+        return Image.new('L', frame.size, len(calls))
+
+    masks = TemporalMasks(infer, threshold=3.0)
+    red = Image.new('RGBA', (640, 640), (200, 0, 0, 255))
+    speck = red.copy()
+    speck.putpixel((10, 10), (0, 0, 0, 255))  # One pixel: lost in its block average
+    moved = red.copy()
+    moved.paste((0, 0, 200, 255), (0, 0, 100, 100))  # A subject entering the frame
+
+    first = masks.mask_for(red)
+    assert masks.mask_for(speck) is first
+    assert masks.mask_for(moved) is not first
+
+    assert (masks.inferred, masks.reused) == (2, 1)
+
+
+def test_webp_frames_are_encoded_as_they_are_produced():
+    """The animated WebP writer pulls frames one at a time; they are not collected first."""
+    alive = []
+    most_alive = []
+
+    def frames():
+        for index in range(12):
+            image = Image.new('RGBA', (64, 64), (index * 20, 0, 0, 128))
+            alive.append(index)
+            weakref.finalize(image, alive.remove, index)
+            most_alive.append(len(alive))
+            yield Frame(image, 30)
+            del image
+
+    output = encode_animation(frames(), 12, 'webp')
+
+    animation = Image.open(BytesIO(output))
+    assert animation.format == 'WEBP'
+    assert animation.n_frames == 12
+    assert max(most_alive) <= 3
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=soft_mask)
+def test_animated_gif_becomes_transparent_animated_webp(mock_remove, mock_session):
+    data = animated_gif(['red', 'red', 'red', 'blue', 'blue'], size=(320, 320), durations=[40, 50, 60, 70, 80])
+
+    output, metadata = remove_background(data, output_format='auto')
+
+    assert metadata['output_format'] == 'webp'
+    assert metadata['frames'] == 5
+    assert (metadata['frames_inferred'], metadata['masks_reused']) == (2, 3)
+    assert mock_remove.call_count == 2
+
+    animation = Image.open(BytesIO(output))
+    assert animation.format == 'WEBP'
+    assert animation.mode == 'RGBA'
+    # The encoder merges frames that came out identical (reused masks); timing is kept
+    total = 0
+    for index in range(animation.n_frames):
+        animation.seek(index)
+        animation.load()
+        total += animation.info['duration']
+        assert animation.getpixel((0, 0))[3] == 0
+        assert animation.getpixel((160, 160))[3] == 255
+    assert total == 300
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=soft_mask)
+def test_animated_output_as_apng(mock_remove, mock_session):
+    output, metadata = remove_background(animated_gif(['red', 'blue', 'green']), output_format='png')
+
+    animation = Image.open(BytesIO(output))
+    assert metadata['output_format'] == 'png'
+    assert animation.format == 'PNG'
+    assert animation.n_frames == 3
+
+
+@patch('app.services.background_removal.get_session')
+def test_endpoint_returns_animated_webp(mock_session, client, fake_redis, mock_rembg):
+    response = client.post(
+        "/api/v1/process-anonymous",
+        files={"file": ("dance.gif", animated_gif(['red', 'blue', 'green']), "image/gif")}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert 'dance_nobg.webp' in response.headers["content-disposition"]
+    assert Image.open(BytesIO(response.content)).format == 'WEBP'
+
+
+def test_endpoint_rejects_jpeg_for_animations(client, fake_redis):
+    response = client.post(
+        "/api/v1/process-anonymous?background=color&output_format=jpeg",
+        files={"file": ("dance.gif", animated_gif(['red', 'blue', 'green']), "image/gif")}
+    )
+
+    assert response.status_code == 400
+    assert "WebP" in response.json()["detail"]
+    assert client.get("/api/v1/anonymous-usage").json()["used"] == 0
+
+
+def test_endpoint_rejects_too_many_frames(monkeypatch, client, fake_redis):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, 'MAX_ANIMATION_FRAMES', 2)
+
+    response = client.post(
+        "/api/v1/process-anonymous",
+        files={"file": ("dance.gif", animated_gif(['red', 'blue', 'green']), "image/gif")}
+    )
+
+    assert response.status_code == 400
+    assert "too many frames" in response.json()["detail"]
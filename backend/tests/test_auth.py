@@ -0,0 +1,58 @@
+import pytest
+
+from app.core.security import pwd_context
+from app.db.models import User
+
+
+def login(client, email, password):
+    return client.post("/api/v1/auth/login", data={"username": email, "password": password})
+
+
+@pytest.fixture
+def weak_hash_user(db):
+    """User whose hash predates the current bcrypt work factor."""
+    user = User(email="old@example.com", hashed_password=pwd_context.hash("secret123", rounds=4))
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def test_register_then_login(client):
+    response = client.post(
+        "/api/v1/auth/register",
+        json={"email": "new@example.com", "password": "secret123", "name": "New"}
+    )
+    assert response.status_code == 200
+
+    response = login(client, "new@example.com", "secret123")
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+
+
+def test_login_rehashes_outdated_hash(client, weak_hash_user, db):
+    """A successful login upgrades hashes made with fewer rounds."""
+    old_hash = weak_hash_user.hashed_password
+
+    assert login(client, "old@example.com", "secret123").status_code == 200
+
+    db.refresh(weak_hash_user)
+    assert weak_hash_user.hashed_password != old_hash
+    assert not pwd_context.needs_update(weak_hash_user.hashed_password)
+    assert login(client, "old@example.com", "secret123").status_code == 200
+
+
+def test_wrong_password_keeps_hash(client, weak_hash_user, db):
+    old_hash = weak_hash_user.hashed_password
+
+    assert login(client, "old@example.com", "wrong").status_code == 401
+
+    db.refresh(weak_hash_user)
+    assert weak_hash_user.hashed_password == old_hash
+
+
+def test_oauth_user_cannot_password_login(client, db):
+    db.add(User(email="oauth@example.com", google_id="g-1", oauth_provider="google", hashed_password=None))
+    db.commit()
+
+    assert login(client, "oauth@example.com", "anything").status_code == 401
@@ -0,0 +1,95 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+
+from app.core import security
+from app.core.security import create_access_token, decode_token_cached
+from app.db import crud
+from app.db.models import User, UserRole
+from app.services.user_cache import clear_user_cache, get_cached_user
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    security._token_cache.clear()
+    clear_user_cache()
+    yield
+    security._token_cache.clear()
+    clear_user_cache()
+
+
+@pytest.fixture
+def stored_user(db):
+    user = User(email="cache@example.com", name="Cache", hashed_password="x", role=UserRole.USER)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+@pytest.fixture
+def auth_headers(stored_user):
+    token = create_access_token(data={"sub": stored_user.id})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_token_verified_once():
+    """A valid token is only signature-checked on first use."""
+    token = create_access_token(data={"sub": "user-1"})
+
+    with patch('app.core.security.jwt.decode', wraps=security.jwt.decode) as decode:
+        assert decode_token_cached(token)["sub"] == "user-1"
+        assert decode_token_cached(token)["sub"] == "user-1"
+
+    assert decode.call_count == 1
+
+
+def test_expired_and_invalid_tokens_not_cached():
+    expired = create_access_token(data={"sub": "user-1"}, expires_delta=timedelta(seconds=-1))
+
+    assert decode_token_cached(expired) is None
+    assert decode_token_cached("garbage") is None
+    assert len(security._token_cache) == 0
+
+
+def test_stats_skips_user_lookup_when_cached(client, auth_headers):
+    """The second authenticated request resolves the user from the cache."""
+    with patch('app.db.crud.get_user_by_id', wraps=crud.get_user_by_id) as lookup:
+        assert client.get("/api/v1/stats", headers=auth_headers).status_code == 200
+        assert lookup.call_count == 2  # Auth dependency + the stats query itself
+
+        assert client.get("/api/v1/stats", headers=auth_headers).status_code == 200
+        assert lookup.call_count == 3  # Only the stats query
+
+
+def test_role_change_invalidates_cached_user(client, auth_headers, stored_user, run_db):
+    client.get("/api/v1/stats", headers=auth_headers)
+    assert get_cached_user(stored_user.id).role == UserRole.USER
+
+    async def promote(session):
+        user = await crud.get_user_by_id(session, stored_user.id)
+        await crud.update_user_role(session, user, UserRole.ADMIN)
+
+    run_db(promote)
+
+    assert get_cached_user(stored_user.id) is None
+    response = client.get("/api/v1/admin/metrics", headers=auth_headers)
+    assert response.status_code == 200
+
+
+def test_password_reset_and_oauth_link_invalidate(client, auth_headers, stored_user, run_db):
+    async def reset(session):
+        user = await crud.get_user_by_id(session, stored_user.id)
+        await crud.reset_user_password(session, user, hashed_password="new-hash")
+
+    async def link(session):
+        user = await crud.get_user_by_id(session, stored_user.id)
+        await crud.link_google_account(session, user, google_id="g-1", avatar=None, name="Cache")
+
+    client.get("/api/v1/stats", headers=auth_headers)
+    run_db(reset)
+    assert get_cached_user(stored_user.id) is None
+
+    client.get("/api/v1/stats", headers=auth_headers)
+    run_db(link)
+    assert get_cached_user(stored_user.id) is None
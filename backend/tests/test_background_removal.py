@@ -1,8 +1,13 @@
 import pytest
+import tracemalloc
 from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
 from PIL import Image
 
 from app.services.background_removal import (
+    apply_mask,
     remove_background,
     validate_image,
     refine_mask_edges,
@@ -129,3 +134,107 @@ def test_refine_mask_edges():
     assert refined.mode == 'RGBA'
     assert refined.size == img.size
 
+
+
+def test_estimate_uses_in_memory_pixel_size():
+    """Multi-band modes take 4 bytes/pixel in Pillow; 16-bit grayscale takes 2."""
+    from app.services.image_budget import bytes_per_pixel, estimate_decode
+
+    assert bytes_per_pixel('RGB') == 4
+    assert bytes_per_pixel('L') == 1
+    assert bytes_per_pixel('P') == 1
+    assert bytes_per_pixel('I;16') == 2
+    assert bytes_per_pixel('I') == 4
+
+    estimate = estimate_decode(Image.new('I;16', (200, 100)))
+    assert estimate.pixels == 20_000
+    assert estimate.decoded_bytes == 40_000
+    assert estimate.peak_bytes > 2 * estimate.decoded_bytes
+
+
+def test_validate_image_pixel_budget_counts_frames(monkeypatch):
+    """Animated images are budgeted by total pixels across frames, read from the header."""
+    from app.core.config import settings
+    monkeypatch.setattr(settings, 'MAX_ANIMATION_PIXELS', 25_000)
+
+    frames = [Image.new('RGB', (100, 100), color) for color in ('red', 'green', 'blue')]
+    buffer = BytesIO()
+    frames[0].save(buffer, format='PNG', save_all=True, append_images=frames[1:])
+
+    is_valid, error_msg, info = validate_image(buffer.getvalue())
+
+    assert is_valid is False
+    assert "3 frame(s)" in error_msg
+    assert info['frames'] == 3
+
+
+def test_validate_image_memory_budget(monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, 'MAX_DECODE_MEMORY_MB', 1)
+
+    img = Image.new('RGB', (500, 500), color='blue')
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+
+    is_valid, error_msg, info = validate_image(buffer.getvalue())
+
+    assert is_valid is False
+    assert "of memory" in error_msg
+    assert info['estimated_memory_mb'] > 1
+
+
+def _gradient_jpeg(width: int, height: int) -> bytes:
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    y = np.linspace(0, 255, height, dtype=np.uint8)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = x
+    pixels[..., 1] = y[:, None]
+    pixels[..., 2] = 128
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _subject_mask(image, only_mask=False, **kwargs):
+    mask = Image.new('L', image.size, 0)
+    mask.paste(255, (image.width // 4, image.height // 4, 3 * image.width // 4, 3 * image.height // 4))
+    return mask
+
+
+def test_apply_mask_in_place():
+    """RGB becomes RGBA on the same Image; fully transparent pixels are zeroed."""
+    image = Image.new('RGB', (4, 1), (200, 100, 50))
+    mask = Image.frombytes('L', (4, 1), bytes([0, 64, 255, 255]))
+
+    result = apply_mask(image, mask)
+
+    assert result is image
+    assert result.mode == 'RGBA'
+    assert result.getpixel((0, 0)) == (0, 0, 0, 0)
+    assert result.getpixel((1, 0)) == (200, 100, 50, 64)
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=_subject_mask)
+def test_hot_path_peak_allocation_per_megapixel(mock_remove, mock_session):
+    """
+    Python-visible allocations (bytes, BytesIO, NumPy) stay near one alpha
+    plane per megapixel, even with refinement and trimming on. Full RGBA
+    copies would cost 4MB+ per megapixel each. (The guided filter has its
+    own bound in test_matting.py.)
+    """
+    width, height = 2000, 1500
+    image_bytes = _gradient_jpeg(width, height)
+    options = dict(refine_mask=True, trim_transparent=True, guided_filter=False)
+    remove_background(image_bytes, **options)  # Warm imports/caches
+
+    tracemalloc.start()
+    try:
+        output, metadata = remove_background(image_bytes, **options)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    megapixels = width * height / 1_000_000
+    assert metadata['trimmed'] is True
+    assert peak / megapixels < 2.5 * 1024 * 1024
@@ -0,0 +1,136 @@
+import json
+import os
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from app.cli import MANIFEST_NAME, Progress, find_images, main, write_atomic
+
+
+def _write_image(path: Path, color='red', size=(80, 60)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG')
+    path.write_bytes(buffer.getvalue())
+
+
+def _manifest(output: Path):
+    return [json.loads(line) for line in (output / MANIFEST_NAME).read_text().splitlines()]
+
+
+def test_find_images_from_directory_and_glob(tmp_path):
+    _write_image(tmp_path / 'in' / 'a.jpg')
+    _write_image(tmp_path / 'in' / 'nested' / 'b.jpg')
+    (tmp_path / 'in' / 'notes.txt').write_text('not an image')
+
+    from_dir = find_images([str(tmp_path / 'in')])
+    from_glob = find_images([str(tmp_path / 'in' / '**' / '*.jpg'), str(tmp_path / 'in' / 'a.jpg')])
+
+    assert [str(source.relative) for source in from_dir] == ['a.jpg', os.path.join('nested', 'b.jpg')]
+    assert [source.relative for source in from_glob] == [source.relative for source in from_dir]
+
+
+def test_find_images_keeps_outputs_apart(tmp_path):
+    for path in ('a/x.jpg', 'a/x.png', 'a/y.jpg', 'b/x.jpg', 'a/out/y_nobg.png'):
+        _write_image(tmp_path / path)
+
+    sources = find_images([str(tmp_path / 'a'), str(tmp_path / 'b')], exclude=tmp_path / 'a' / 'out')
+
+    assert [(str(source.relative), source.output_stem) for source in sources] == [
+        (os.path.join('a', 'x.jpg'), 'x_jpg'),
+        (os.path.join('a', 'x.png'), 'x_png'),
+        (os.path.join('a', 'y.jpg'), 'y'),
+        (os.path.join('b', 'x.jpg'), 'x'),
+    ]
+
+
+def test_write_atomic_leaves_no_partial_file(tmp_path):
+    target = tmp_path / 'out' / 'a.png'
+    write_atomic(target, b'first')
+    write_atomic(target, b'second')
+
+    assert target.read_bytes() == b'second'
+    assert os.listdir(target.parent) == ['a.png']
+
+
+def test_progress_rate_and_eta():
+    now = [100.0]
+    progress = Progress(10, clock=lambda: now[0])
+    now[0] = 104.0
+    progress.add({'status': 'done'})
+    progress.add({'status': 'failed'})
+
+    assert progress.rate == 0.5
+    assert progress.eta() == 16.0
+    assert progress.line() == '[2/10] 0.50 img/s, ETA 0m16s, 1 failed'
+
+
+@patch('app.services.background_removal.get_session')
+def test_batch_run_writes_outputs_and_resumes(mock_session, tmp_path, mock_rembg):
+    source_dir, output = tmp_path / 'photos', tmp_path / 'cutouts'
+    _write_image(source_dir / 'a.jpg')
+    _write_image(source_dir / 'shoot' / 'b.jpg', color='blue')
+
+    assert main([str(source_dir), '-o', str(output)]) == 0
+
+    assert (output / 'a_nobg.png').exists()
+    assert Image.open(output / 'shoot' / 'b_nobg.png').format == 'PNG'
+    assert [entry['status'] for entry in _manifest(output)] == ['done', 'done']
+    assert mock_rembg.call_count == 2
+
+    # Same command again: nothing to do. A changed file is processed again.
+    assert main([str(source_dir), '-o', str(output)]) == 0
+    assert mock_rembg.call_count == 2
+    _write_image(source_dir / 'a.jpg', color='green', size=(90, 60))
+    assert main([str(source_dir), '-o', str(output)]) == 0
+    assert mock_rembg.call_count == 3
+
+    # Different options are a different output
+    assert main([str(source_dir), '-o', str(output), '--format', 'webp']) == 0
+    assert (output / 'shoot' / 'b_nobg.webp').exists()
+    assert mock_rembg.call_count == 5
+
+
+@patch('app.services.background_removal.get_session')
+def test_batch_run_with_output_inside_input(mock_session, tmp_path, mock_rembg):
+    source_dir = tmp_path / 'photos'
+    output = source_dir / 'cutouts'
+    _write_image(source_dir / 'a.jpg')
+    _write_image(source_dir / 'a.png', color='blue')
+
+    assert main([str(source_dir), '-o', str(output)]) == 0
+    assert sorted(path.name for path in output.glob('*.png')) == ['a_jpg_nobg.png', 'a_png_nobg.png']
+
+    # The outputs are not picked up as new inputs on the next run
+    assert main([str(source_dir), '-o', str(output)]) == 0
+    assert mock_rembg.call_count == 2
+    assert len(_manifest(output)) == 2
+
+
+@patch('app.services.background_removal.get_session')
+def test_batch_run_records_failures_and_retries_them(mock_session, tmp_path, mock_rembg):
+    source_dir, output = tmp_path / 'photos', tmp_path / 'cutouts'
+    _write_image(source_dir / 'good.jpg')
+    (source_dir / 'broken.png').write_bytes(b'not a png')
+
+    assert main([str(source_dir), '-o', str(output)]) == 1
+
+    entries = {entry['source']: entry for entry in _manifest(output)}
+    assert entries['broken.png']['status'] == 'failed'
+    assert entries['good.jpg']['status'] == 'done'
+
+    (source_dir / 'broken.png').unlink()
+    _write_image(source_dir / 'broken.png')
+    assert main([str(source_dir), '-o', str(output)]) == 0
+    assert _manifest(output)[-1] == {**_manifest(output)[-1], 'source': 'broken.png', 'status': 'done'}
+
+
+def test_jpeg_output_needs_a_background(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main([str(tmp_path), '-o', str(tmp_path / 'out'), '--format', 'jpeg'])
+
+    assert exit_info.value.code == 2
+    assert '--background-color' in capsys.readouterr().err
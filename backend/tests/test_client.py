@@ -0,0 +1,171 @@
+import base64
+import json
+import time
+from io import BytesIO
+from unittest.mock import patch
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.db.base import get_db
+from app.main import app
+from quickbg_client import AsyncQuickBGClient, QuickBGClient, RateLimited, RetryPolicy
+from tests.conftest import TestingAsyncSessionLocal
+
+NO_WAIT = RetryPolicy(max_retries=3, max_wait=5.0, backoff=0.0)
+
+
+def _image_bytes(color='red') -> bytes:
+    buffer = BytesIO()
+    Image.new('RGB', (120, 90), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def _token(expires_in: float) -> str:
+    """Unsigned JWT-shaped token with an exp claim (the client never verifies signatures)."""
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+    return f"{encode({'alg': 'HS256'})}.{encode({'exp': time.time() + expires_in})}.signature"
+
+
+def _ok(request, name='photo'):
+    return httpx.Response(
+        200, content=b'png-bytes',
+        headers={'Content-Type': 'image/png', 'Content-Disposition': f'attachment; filename="{name}_nobg.png"'}
+    )
+
+
+def _mock_client(handler, **kwargs) -> QuickBGClient:
+    http = httpx.Client(base_url='http://quickbg.test', transport=httpx.MockTransport(handler))
+    return QuickBGClient(http_client=http, retry=NO_WAIT, **kwargs)
+
+
+def test_retries_503_after_retry_after():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if len(calls) == 1:
+            return httpx.Response(503, json={'detail': 'busy'}, headers={'Retry-After': '0'})
+        return _ok(request)
+
+    result = _mock_client(handler).process(b'image')
+
+    assert result.content == b'png-bytes'
+    assert result.filename == 'photo_nobg.png'
+    assert calls == ['/api/v1/process-anonymous'] * 2
+
+
+def test_gives_up_when_retry_after_exceeds_max_wait():
+    def handler(request):
+        return httpx.Response(429, json={'detail': 'Free tries used up'}, headers={'Retry-After': '3600'})
+
+    with pytest.raises(RateLimited) as error:
+        _mock_client(handler).process(b'image')
+
+    assert error.value.status_code == 429
+    assert error.value.retry_after == 3600
+    assert 'Free tries' in error.value.detail
+
+
+def test_logs_in_again_before_token_expires_and_after_401():
+    logins = []
+    rejected = set()
+
+    def handler(request):
+        if request.url.path == '/api/v1/auth/login':
+            # First token is about to expire; later ones are good for an hour
+            token = _token(10 if not logins else 3600)
+            logins.append(token)
+            return httpx.Response(200, json={'access_token': token, 'token_type': 'bearer'})
+        token = request.headers['Authorization'].removeprefix('Bearer ')
+        if token in rejected:
+            return httpx.Response(401, json={'detail': 'Could not validate credentials'})
+        return _ok(request)
+
+    client = _mock_client(handler, email='a@example.com', password='secret')
+    client.process(b'image')
+    client.process(b'image')
+    assert len(logins) == 2  # The first token expires within the refresh margin
+
+    rejected.add(logins[-1])  # Server-side revocation
+    client.process(b'image')
+    assert len(logins) == 3
+
+
+def test_process_many_streams_results_to_disk(tmp_path, client, fake_redis, mock_rembg):
+    with patch('app.services.background_removal.get_session'):
+        client.post('/api/v1/auth/register', json={'email': 'sdk@example.com', 'password': 'secret123'})
+        sources = []
+        for index, color in enumerate(['red', 'green', 'blue']):
+            source = tmp_path / f'photo{index}.jpg'
+            source.write_bytes(_image_bytes(color))
+            sources.append(source)
+
+        sdk = QuickBGClient(email='sdk@example.com', password='secret123', http_client=client)
+        items = sdk.process_many(sources, tmp_path / 'out', concurrency=3)
+
+    assert [item.error for item in items] == [None] * 3
+    assert [item.result.path.name for item in items] == ['photo0_nobg.png', 'photo1_nobg.png', 'photo2_nobg.png']
+    assert all(Image.open(item.result.path).format == 'PNG' for item in items)
+    assert not list((tmp_path / 'out').glob('.*.part'))
+
+
+def test_process_many_never_overwrites_results(tmp_path):
+    def handler(request):
+        # Like the API: <upload stem>_nobg.png, so all bytes inputs are "image_nobg.png"
+        name = request.content.split(b'filename="', 1)[1].split(b'"', 1)[0].decode().rsplit('.', 1)[0]
+        return _ok(request, name)
+
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    sources = [tmp_path / 'a' / 'cat.jpg', tmp_path / 'b' / 'cat.jpg', tmp_path / 'a' / 'cat.png', tmp_path / 'a' / 'dog.jpg']
+    for source in sources:
+        source.write_bytes(_image_bytes())
+
+    items = _mock_client(handler).process_many(sources + [_image_bytes(), _image_bytes()], tmp_path / 'out')
+
+    assert [item.result.path.name for item in items] == [
+        'cat-0_nobg.png', 'cat-1_nobg.png', 'cat-2_nobg.png', 'dog_nobg.png', 'image-4_nobg.png', 'image-5_nobg.png'
+    ]
+    assert items[4].result.filename == 'image_nobg.png'  # The server's suggestion is still reported
+    assert len(list((tmp_path / 'out').iterdir())) == 6
+
+
+@pytest.mark.asyncio
+async def test_async_batch_throughput_over_asgi(db, fake_redis, tmp_path):
+    """Concurrent submission overlaps inference on the in-process app; sequential does not."""
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
+    def slow_mask(image, only_mask=False, **kwargs):
+        time.sleep(0.05)  # Model time, spent in the inference threadpool
+        return Image.new('L', image.size, 255)
+
+    app.dependency_overrides[get_db] = override_get_db
+    sources = [_image_bytes() for _ in range(8)]
+    try:
+        with patch('app.services.background_removal.get_session'), \
+                patch('app.services.background_removal.remove', side_effect=slow_mask):
+            async with AsyncQuickBGClient(
+                base_url='http://quickbg.test',
+                email='async@example.com',
+                password='secret123',
+                transport=httpx.ASGITransport(app=app)
+            ) as sdk:
+                await sdk._http.post('/api/v1/auth/register', json={'email': 'async@example.com', 'password': 'secret123'})
+
+                timings = {}
+                for concurrency in (1, 4):
+                    started = time.perf_counter()
+                    items = await sdk.process_many(sources, tmp_path / str(concurrency), concurrency=concurrency)
+                    timings[concurrency] = time.perf_counter() - started
+                    assert all(item.error is None for item in items)
+                    assert len({item.result.path for item in items}) == len(sources)
+    finally:
+        app.dependency_overrides.clear()
+
+    # INFERENCE_MAX_CONCURRENCY (2) inferences overlap when requests are in flight together
+    assert timings[4] < timings[1] * 0.8
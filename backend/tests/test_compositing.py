@@ -0,0 +1,152 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.compositing import (
+    Background,
+    composite,
+    parse_color,
+    background_is_opaque,
+    COLOR,
+    GRADIENT,
+    BLUR,
+    IMAGE,
+    CONTAIN,
+)
+
+
+def cutout_row(*alphas, color=(200, 100, 50)):
+    """1-row RGBA cutout with the given alpha values."""
+    image = Image.new('RGBA', (len(alphas), 1), color + (0,))
+    image.putalpha(Image.frombytes('L', (len(alphas), 1), bytes(alphas)))
+    return image
+
+
+def png_bytes(image: Image.Image) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_parse_color():
+    assert parse_color("#ff8000") == (255, 128, 0)
+    assert parse_color("ff8000") == (255, 128, 0)
+    assert parse_color("white") == (255, 255, 255)
+    with pytest.raises(ValueError):
+        parse_color("not-a-color")
+    with pytest.raises(ValueError):
+        parse_color("#ff800080")  # Translucent
+
+
+def test_color_blend_is_alpha_weighted():
+    result = composite(cutout_row(0, 255, 128), Background(COLOR, color=(0, 0, 255)))
+
+    assert result.mode == 'RGB'
+    assert result.getpixel((0, 0)) == (0, 0, 255)
+    assert result.getpixel((1, 0)) == (200, 100, 50)
+    # 200*128/255 = 100.4, 255*127/255 = 127
+    assert result.getpixel((2, 0)) == (100, 50, 152)
+
+
+def test_gradient_runs_along_angle():
+    cutout = Image.new('RGBA', (100, 10), (0, 0, 0, 0))
+
+    result = composite(cutout, Background(GRADIENT, color=(0, 0, 0), color_to=(255, 255, 255), angle=0))
+
+    left, right = result.getpixel((0, 5)), result.getpixel((99, 5))
+    assert left[0] < 5 and right[0] > 250
+    assert result.getpixel((0, 0)) == result.getpixel((0, 9))
+
+
+def test_blur_uses_original_colors_under_the_mask():
+    """Hidden pixels keep their colors when compositing, so the blur shows the original scene."""
+    cutout = Image.new('RGBA', (64, 64), (10, 200, 30, 0))
+
+    result = composite(cutout, Background(BLUR, blur_radius=8))
+
+    assert result.getpixel((32, 32)) == (10, 200, 30)
+
+
+def test_image_background_fit_modes():
+    cutout = Image.new('RGBA', (100, 50), (0, 0, 0, 0))
+    background = png_bytes(Image.new('RGB', (50, 50), (0, 255, 0)))
+
+    covered = composite(cutout, Background(IMAGE, image=background))
+    contained = composite(cutout, Background(IMAGE, image=background, fit=CONTAIN, color=(255, 0, 0)))
+
+    assert covered.size == (100, 50)
+    assert covered.getpixel((0, 25)) == (0, 255, 0)
+    assert contained.getpixel((0, 25)) == (255, 0, 0)  # Letterbox padding
+    assert contained.getpixel((50, 25)) == (0, 255, 0)
+
+
+def test_translucent_background_keeps_alpha():
+    background = png_bytes(Image.new('RGBA', (2, 1), (0, 0, 255, 128)))
+    spec = Background(IMAGE, image=background, fit="stretch")
+
+    result = composite(cutout_row(0, 255), spec)
+
+    assert background_is_opaque(spec) is False
+    assert result.mode == 'RGBA'
+    assert result.getpixel((0, 0)) == (0, 0, 255, 128)
+    assert result.getpixel((1, 0)) == (200, 100, 50, 255)
+
+
+def test_large_composite_is_vectorized_by_strips():
+    """Strip boundaries must not show: every row of a flat input blends the same."""
+    cutout = Image.new('RGBA', (300, 1000), (255, 255, 255, 64))
+
+    result = np.asarray(composite(cutout, Background(COLOR, color=(0, 0, 0))))
+
+    assert (result == result[0, 0]).all()
+
+
+@patch('app.services.background_removal.get_session')
+def test_endpoint_composites_to_jpeg(mock_session, client, fake_redis, mock_rembg, sample_image_bytes):
+    response = client.post(
+        "/api/v1/process-anonymous?background=color&bg_color=%23ff0000",
+        files={"file": ("photo.jpg", sample_image_bytes, "image/jpeg")}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert 'photo_nobg.jpg' in response.headers["content-disposition"]
+    image = Image.open(BytesIO(response.content))
+    assert image.format == 'JPEG'
+    red, green, blue = image.getpixel((10, 10))  # The mocked mask is empty: all background
+    assert red > 240 and green < 15 and blue < 15
+
+
+@patch('app.services.background_removal.get_session')
+def test_endpoint_uploaded_background(mock_session, client, fake_redis, mock_rembg, sample_image_bytes):
+    background = png_bytes(Image.new('RGB', (300, 300), (0, 0, 255)))
+
+    response = client.post(
+        "/api/v1/process-anonymous?background=image&output_format=png",
+        files={
+            "file": ("photo.jpg", sample_image_bytes, "image/jpeg"),
+            "background": ("bg.png", background, "image/png")
+        }
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert Image.open(BytesIO(response.content)).getpixel((10, 10)) == (0, 0, 255)
+
+
+@pytest.mark.parametrize("query", [
+    "output_format=jpeg",  # Transparent result
+    "background=image",  # No background part
+    "background=color&bg_color=nope",
+])
+def test_endpoint_rejects_bad_options(query, client, fake_redis, sample_image_bytes):
+    response = client.post(
+        f"/api/v1/process-anonymous?{query}",
+        files={"file": ("photo.jpg", sample_image_bytes, "image/jpeg")}
+    )
+
+    assert response.status_code == 400
+    assert client.get("/api/v1/anonymous-usage").json()["used"] == 0
@@ -0,0 +1,136 @@
+import asyncio
+import socket
+import pytest
+from email import message_from_bytes
+from unittest.mock import patch
+
+from aiosmtpd.controller import Controller
+
+from app.services import email as email_service
+from app.services.mail_outbox import EmailOutbox, OutgoingEmail, OutboxFull
+
+
+class RecordingHandler:
+    """aiosmtpd handler that stores messages, counts sessions and can refuse the first N."""
+
+    def __init__(self, refuse=0):
+        self.messages = []
+        self.sessions = 0
+        self.refuse = refuse
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.refuse:
+            self.refuse -= 1
+            return "451 Try again later"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_stub():
+    handler = RecordingHandler()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, controller
+    controller.stop()
+
+
+def make_outbox(controller, **kwargs):
+    return EmailOutbox(
+        hostname=controller.hostname,
+        port=controller.port,
+        sender="QuickBG <contact@quickbg.app>",
+        **kwargs
+    )
+
+
+def reset_email(recipient):
+    return OutgoingEmail(
+        subject="Reset Your QuickBG Password",
+        recipients=[recipient],
+        template=email_service.PASSWORD_RESET_TEMPLATE,
+        context={"name": "<Ann>", "reset_link": "https://quickbg.app/reset-password?token=t"}
+    )
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_batch_goes_out_over_one_connection(smtp_stub):
+    handler, controller = smtp_stub
+    outbox = make_outbox(controller)
+    for i in range(5):
+        outbox.enqueue(reset_email(f"user{i}@example.com"))
+
+    outbox.start()
+    await wait_for(lambda: len(handler.messages) == 5)
+    await outbox.stop()
+
+    assert handler.sessions == 1
+    assert outbox.connections == 1
+    body = message_from_bytes(handler.messages[0].content).get_payload(decode=True).decode()
+    assert "&lt;Ann&gt;" in body  # Autoescaped
+    assert "token=t" in body
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_is_retried_with_backoff(smtp_stub):
+    handler, controller = smtp_stub
+    handler.refuse = 2
+    outbox = make_outbox(controller, backoff_base=0.01)
+
+    outbox.start()
+    outbox.enqueue(reset_email("retry@example.com"))
+    await wait_for(lambda: len(handler.messages) == 1)
+    await outbox.stop()
+
+    assert outbox.sent == 1
+    assert outbox.failed == 0
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts(smtp_stub):
+    handler, controller = smtp_stub
+    handler.refuse = 100
+    outbox = make_outbox(controller, backoff_base=0.01, max_attempts=3)
+
+    outbox.start()
+    outbox.enqueue(reset_email("never@example.com"))
+    await wait_for(lambda: outbox.failed == 1)
+    await outbox.stop()
+
+    assert handler.messages == []
+
+
+def test_full_queue_raises():
+    outbox = EmailOutbox(hostname="localhost", port=25, sender="x@example.com", queue_size=1)
+    outbox.enqueue(reset_email("a@example.com"))
+    with pytest.raises(OutboxFull):
+        outbox.enqueue(reset_email("b@example.com"))
+
+
+def test_contact_endpoint_only_queues(client):
+    with patch.object(email_service.settings, "MAIL_USERNAME", "user"), \
+         patch.object(email_service.settings, "MAIL_PASSWORD", "secret"), \
+         patch.object(email_service.outbox, "enqueue") as enqueue:
+        response = client.post("/api/v1/contact/contact", json={
+            "name": "Ann", "email": "ann@example.com", "subject": "Hi", "message": "Hello"
+        })
+
+    assert response.status_code == 200
+    assert [call.args[0].recipients for call in enqueue.call_args_list] == [
+        [email_service.settings.MAIL_FROM], ["ann@example.com"]
+    ]
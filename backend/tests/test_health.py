@@ -0,0 +1,99 @@
+import asyncio
+
+from app.services.health import HealthMonitor, health_monitor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_monitor(**probes):
+    clock = FakeClock()
+    monitor = HealthMonitor(timeout=0.05, stale_after=30.0, clock=clock)
+    for name, (probe, critical) in probes.items():
+        monitor.register(name, probe, critical=critical)
+    return monitor, clock
+
+
+async def ok():
+    return "ok"
+
+
+async def broken():
+    raise ConnectionError("refused")
+
+
+async def hangs():
+    await asyncio.sleep(10)
+
+
+def test_not_ready_until_warm_and_probed():
+    monitor, _ = make_monitor(database=(ok, True))
+    assert monitor.snapshot()["ready"] is False
+
+    asyncio.run(monitor.refresh())
+    assert monitor.snapshot()["ready"] is False  # Still cold
+
+    monitor.mark_warm()
+    assert monitor.snapshot()["ready"] is True
+
+
+def test_only_critical_failures_block_readiness():
+    monitor, _ = make_monitor(database=(ok, True), redis=(broken, False), slow=(hangs, False))
+    monitor.mark_warm()
+    asyncio.run(monitor.refresh())
+
+    snapshot = monitor.snapshot()
+    assert snapshot["ready"] is True
+    assert snapshot["checks"]["redis"] == {
+        "ok": False, "critical": False, "detail": "refused",
+        "latency_ms": 0.0, "age_seconds": 0.0
+    }
+    assert "timed out" in snapshot["checks"]["slow"]["detail"]
+
+    monitor.register("database", broken)
+    asyncio.run(monitor.refresh())
+    assert monitor.snapshot()["ready"] is False
+
+
+def test_stale_results_fail():
+    monitor, clock = make_monitor(database=(ok, True))
+    monitor.mark_warm()
+    asyncio.run(monitor.refresh())
+
+    clock.now += 31
+    snapshot = monitor.snapshot()
+    assert snapshot["ready"] is False
+    assert snapshot["checks"]["database"]["detail"] == "stale result"
+
+
+def test_endpoints_read_the_cache(client, monkeypatch):
+    calls = []
+
+    async def counted():
+        calls.append(1)
+        return "ok"
+
+    monitor, _ = make_monitor(database=(counted, True))
+    monkeypatch.setattr("app.api.v1.endpoints.health.health_monitor", monitor)
+
+    assert client.get("/api/v1/health/live").status_code == 200
+    response = client.get("/api/v1/health/ready")
+    assert response.status_code == 503
+    assert response.json()["warm"] is False
+
+    monitor.mark_warm()
+    asyncio.run(monitor.refresh())
+    for _ in range(20):
+        assert client.get("/api/v1/health/ready").status_code == 200
+    assert len(calls) == 1  # Polling never ran the probe
+
+    assert client.get("/api/v1/health").json()["checks"] == {"api": "ok", "database": "ok"}
+
+
+def test_app_registers_core_probes():
+    assert {"model", "database", "redis"} <= set(health_monitor.snapshot()["checks"])
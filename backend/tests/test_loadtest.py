@@ -0,0 +1,86 @@
+from io import BytesIO
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from loadtest.images import generate_images
+from loadtest.report import build_report, compare, summarize_samples
+from loadtest.server import AppServer, create_sqlite_database
+from loadtest.standins import LocalRedis
+from loadtest.traffic import ANONYMOUS, AUTHENTICATED, Sample, parse_mix
+
+
+def test_parse_mix():
+    assert parse_mix("anonymous=0.4, authenticated=0.6") == {ANONYMOUS: 0.4, AUTHENTICATED: 0.6}
+    with pytest.raises(ValueError, match="Unknown traffic kind"):
+        parse_mix("anonymous=1,uploads=1")
+    with pytest.raises(ValueError, match="positive weight"):
+        parse_mix("anonymous=0")
+
+
+def test_generated_images_are_reproducible():
+    first, second = generate_images(2, seed=7), generate_images(2, seed=7)
+    assert [image.data for image in first] == [image.data for image in second]
+    assert generate_images(1, seed=8)[0].data != first[0].data
+
+
+def test_summary_counts_rate_limits_apart_from_errors():
+    samples = [Sample(ANONYMOUS, 200, 0.1 * (i + 1), 0.0) for i in range(10)]
+    samples += [Sample(ANONYMOUS, 429, 0.001, 0.0), Sample(ANONYMOUS, 503, 0.001, 0.0), Sample(ANONYMOUS, 0, 5.0, 0.0)]
+
+    summary = summarize_samples(samples, elapsed=5.0)
+
+    assert summary["requests"] == 13
+    assert summary["ok"] == 10
+    assert summary["rate_limited"] == 1
+    assert summary["errors"] == 2
+    assert summary["throughput_per_second"] == 2.0
+    # Percentiles only over successful responses
+    assert summary["p50_ms"] == 600.0
+    assert summary["max_ms"] == 1000.0
+    assert summary["statuses"] == {"0": 1, "200": 10, "429": 1, "503": 1}
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    samples = [Sample(AUTHENTICATED, 200, 0.1, 0.0)] * 20
+    base = build_report(samples, 10.0, {}, {}, [{"pid": 1, "role": "worker", "rss_peak_mb": 500.0, "rss_end_mb": 450.0}])
+    slower = [Sample(AUTHENTICATED, 200, 0.105, 0.0)] * 18 + [Sample(AUTHENTICATED, 500, 0.01, 0.0)] * 2
+    head = build_report(slower, 10.0, {}, {}, [{"pid": 2, "role": "worker", "rss_peak_mb": 600.0, "rss_end_mb": 550.0}])
+
+    rows, regressions = compare(base, head, threshold_pct=10.0)
+
+    regressed = {row["metric"] for row in regressions}
+    assert "overall.p50_ms" not in regressed  # +5% is within the threshold
+    assert {"overall.error_rate", "rss_peak_total_mb", "by_kind.authenticated.error_rate"} <= regressed
+    assert compare(base, base, threshold_pct=10.0)[1] == []
+    assert len(rows) > len(regressions)
+
+
+def test_harness_enforces_the_free_try_limit(tmp_path):
+    """Smoke test of the harness stack: its Redis runs the limiter's Lua script, so anonymous tries run out."""
+    buffer = BytesIO()
+    Image.new('RGB', (120, 90), 'red').save(buffer, format='JPEG')
+    redis = LocalRedis()
+    server = AppServer({
+        **redis.start(),
+        "DATABASE_URL": create_sqlite_database(tmp_path / "loadtest.db"),
+        "LOADTEST_FAKE_MODEL": "1",
+        "S3_BUCKET_NAME": "",
+    }, workers=1, log_path=tmp_path / "server.log")
+    try:
+        server.start(ready_timeout=60.0)
+        statuses = [
+            httpx.post(server.base_url + "/api/v1/process-anonymous", timeout=30.0,
+                       headers={"X-Forwarded-For": "10.0.0.1"},
+                       files={"file": ("photo.jpg", buffer.getvalue(), "image/jpeg")}).status_code
+            for _ in range(settings.ANONYMOUS_FREE_TRIES + 1)
+        ]
+    finally:
+        server.stop()
+        redis.stop()
+
+    assert statuses == [200] * settings.ANONYMOUS_FREE_TRIES + [429]
+    log = (tmp_path / "server.log").read_text()
+    assert "unavailable" not in log and "Connection closed" not in log
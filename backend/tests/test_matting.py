@@ -0,0 +1,147 @@
+from io import BytesIO
+from unittest.mock import patch
+import tracemalloc
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from app.services.background_removal import remove_background
+from app.services.matting import guided_filter_mask, matting_tiles, narrow_band_matting, trimap_from_mask
+
+
+def step_scene(width=400, height=300):
+    """Left half dark, right half bright; the true mask is the right half."""
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, :width // 2] = (40, 60, 80)
+    pixels[:, width // 2:] = (220, 200, 160)
+    truth = np.zeros((height, width), dtype=np.uint8)
+    truth[:, width // 2:] = 255
+    return Image.fromarray(pixels), truth
+
+
+def blurred_mask(image, only_mask=False, **kwargs):
+    """Stand-in for rembg: the true mask, blurred like an upscaled model output."""
+    truth = np.zeros((image.height, image.width), dtype=np.uint8)
+    truth[:, image.width // 2:] = 255
+    return Image.fromarray(truth).filter(ImageFilter.GaussianBlur(6))
+
+
+def test_guided_filter_snaps_mask_to_image_edge():
+    """A blurred mask transition becomes a jump exactly where the image's edge is."""
+    image, _ = step_scene()
+    coarse = np.asarray(blurred_mask(image), dtype=np.int16)[150]
+
+    refined = np.asarray(guided_filter_mask(image, blurred_mask(image)), dtype=np.int16)[150]
+
+    assert coarse[200] - coarse[199] < 20
+    assert refined[200] - refined[199] > 100
+    assert refined[199] < 128 < refined[200]
+
+
+def test_guided_filter_upscales_small_mask():
+    image, _ = step_scene()
+    coarse = blurred_mask(image).resize((100, 75), Image.Resampling.BILINEAR)
+
+    refined = guided_filter_mask(image, coarse)
+
+    assert refined.mode == 'L'
+    assert refined.size == image.size
+    assert refined.getpixel((10, 150)) < 16
+    assert refined.getpixel((390, 150)) > 239
+
+
+def test_guided_filter_peak_allocation_per_megapixel():
+    """Coefficients live on the subsampled grid; full-resolution work is done in strips."""
+    image = Image.new('RGB', (2000, 1500), (128, 64, 32))
+    mask = Image.new('L', (1024, 768), 128)
+    guided_filter_mask(image, mask)  # Warm imports/caches
+
+    tracemalloc.start()
+    try:
+        guided_filter_mask(image, mask)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    megapixels = image.width * image.height / 1_000_000
+    assert peak / megapixels < 8 * 1024 * 1024
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=blurred_mask)
+def test_remove_background_applies_guided_filter_on_request(mock_remove, mock_session):
+    image, truth = step_scene()
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+
+    output, metadata = remove_background(buffer.getvalue(), guided_filter=True)
+    alpha = np.asarray(Image.open(BytesIO(output)).getchannel('A'), dtype=np.float32)
+
+    assert metadata['guided_filter'] is True
+    assert np.abs(alpha - truth).mean() < 4
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=blurred_mask)
+@patch('app.services.background_removal.guided_filter_mask')
+def test_guided_filter_is_off_by_default(mock_filter, mock_remove, mock_session):
+    image, _ = step_scene()
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+
+    _, metadata = remove_background(buffer.getvalue())
+
+    assert metadata['guided_filter'] is False
+    mock_filter.assert_not_called()
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.guided_filter_mask', side_effect=lambda image, mask: mask)
+def test_endpoint_guided_filter_is_opt_in(mock_filter, mock_session, client, fake_redis, mock_rembg, sample_image_bytes):
+    files = {"file": ("photo.jpg", sample_image_bytes, "image/jpeg")}
+
+    assert client.post("/api/v1/process-anonymous", files=files).status_code == 200
+    mock_filter.assert_not_called()
+    assert client.post("/api/v1/process-anonymous?guided_filter=true", files=files).status_code == 200
+    mock_filter.assert_called_once()
+
+
+def test_matting_tiles_follow_the_contour():
+    mask = np.zeros((512, 1024), dtype=np.uint8)
+    mask[:, 600:] = 255
+    mask[:, 590:610] = 128  # Uncertain edge
+
+    trimap = trimap_from_mask(mask)
+    tiles = matting_tiles(trimap, tile=128)
+
+    assert set(np.unique(trimap)) == {0, 128, 255}
+    assert tiles == [(512, top, 640, top + 128) for top in range(0, 512, 128)]
+
+
+def test_narrow_band_matting_solves_the_edge_only():
+    image, truth = step_scene()
+    coarse = blurred_mask(image)
+    original = image.copy()
+
+    matted = np.asarray(narrow_band_matting(image, coarse), dtype=np.float32)
+
+    assert np.abs(matted - truth).mean() < np.abs(np.asarray(coarse, dtype=np.float32) - truth).mean() / 2
+    assert (matted[:, :150] == 0).all() and (matted[:, 250:] == 255).all()
+    # Colors are re-estimated in the band only
+    assert np.array_equal(np.asarray(image)[:, :150], np.asarray(original)[:, :150])
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=blurred_mask)
+def test_remove_background_alpha_matting_uses_narrow_band(mock_remove, mock_session):
+    image, truth = step_scene()
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+
+    output, metadata = remove_background(buffer.getvalue(), alpha_matting=True)
+    alpha = np.asarray(Image.open(BytesIO(output)).getchannel('A'), dtype=np.float32)
+
+    assert metadata['alpha_matting'] is True
+    assert metadata['guided_filter'] is False
+    assert mock_remove.call_args.kwargs['only_mask'] is True
+    assert np.abs(alpha - truth).mean() < 4
@@ -0,0 +1,109 @@
+import hashlib
+import struct
+
+import numpy as np
+import onnxruntime as ort
+import pytest
+
+from app.core.config import settings
+from app.services import model_registry
+from app.services.model_registry import ChecksumMismatch, ModelSpec, ModelUnavailable, prepare, resolve
+
+WEIGHTS = 2048  # float32 elements: above EXTERNAL_WEIGHTS_MIN_BYTES, so stored externally
+
+
+def _field(number, value):
+    """Protobuf wire encoding of one field (varint, or length-delimited for str/bytes)."""
+    def varint(n):
+        out = bytearray()
+        while True:
+            byte, n = n & 0x7F, n >> 7
+            out.append(byte | (0x80 if n else 0))
+            if not n:
+                return bytes(out)
+
+    if isinstance(value, int):
+        return varint(number << 3) + varint(value)
+    if isinstance(value, str):
+        value = value.encode()
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def _tiny_model(size=WEIGHTS) -> bytes:
+    """ONNX model computing Y = X + W, W a float initializer of ones (no onnx package needed)."""
+    float_vector = _field(2, _field(1, _field(1, 1) + _field(2, _field(1, _field(1, size)))))
+    weight = _field(1, size) + _field(2, 1) + _field(8, "W") + _field(9, struct.pack(f"<{size}f", *[1.0] * size))
+    graph = (
+        _field(1, _field(1, "X") + _field(1, "W") + _field(2, "Y") + _field(4, "Add"))
+        + _field(2, "tiny") + _field(5, weight)
+        + _field(11, _field(1, "X") + float_vector) + _field(12, _field(1, "Y") + float_vector)
+    )
+    return _field(1, 8) + _field(7, graph) + _field(8, _field(2, 13))
+
+
+@pytest.fixture
+def bundle(tmp_path, monkeypatch):
+    """A bundle directory holding the tiny model, registered as isnet-general-use."""
+    data = _tiny_model()
+    spec = ModelSpec("isnet-general-use", "https://example.invalid/tiny.onnx", f"md5:{hashlib.md5(data).hexdigest()}")
+    monkeypatch.setitem(model_registry.MODELS, spec.name, spec)
+    monkeypatch.setattr(settings, "MODEL_DIR", str(tmp_path))
+    (tmp_path / spec.filename).write_bytes(data)
+    return spec, tmp_path
+
+
+def _run(session):
+    return session.run(None, {"X": np.full(WEIGHTS, 2.0, np.float32)})[0]
+
+
+def test_prepare_externalizes_weights_and_resolve_verifies_them(bundle):
+    spec, directory = bundle
+
+    entry = prepare(spec, directory)
+
+    assert entry["source_checksum"] == spec.checksum
+    assert (directory / spec.weights_filename).stat().st_size == WEIGHTS * 4
+    assert (directory / spec.prepared_filename).stat().st_size < WEIGHTS
+    assert model_registry.read_manifest(directory)[spec.name] == entry
+    path = resolve(spec.name)
+    assert path == directory / spec.prepared_filename
+    assert _run(ort.InferenceSession(str(path), providers=["CPUExecutionProvider"]))[0] == 3.0
+
+    # A corrupted weights file is refused rather than loaded
+    with open(directory / spec.weights_filename, "r+b") as handle:
+        handle.write(b"\x00\x00\x00\x00")
+    with pytest.raises(ChecksumMismatch):
+        resolve(spec.name)
+
+
+def test_resolve_falls_back_to_verified_download(bundle):
+    spec, directory = bundle
+    assert resolve(spec.name) == directory / spec.filename
+
+    (directory / spec.filename).write_bytes(_tiny_model(WEIGHTS + 1))
+    with pytest.raises(ChecksumMismatch):
+        resolve(spec.name)
+
+    (directory / spec.filename).unlink()
+    with pytest.raises(ModelUnavailable, match="model_registry fetch"):
+        resolve(spec.name)
+    with pytest.raises(ModelUnavailable, match="Unknown model"):
+        resolve("u2net")
+
+
+def test_load_session_uses_bundle_without_downloading(bundle, monkeypatch):
+    spec, directory = bundle
+    prepare(spec, directory)
+    monkeypatch.setattr("pooch.retrieve", lambda *args, **kwargs: pytest.fail("downloaded"))
+
+    session = model_registry.load_session(spec.name)
+
+    assert session.model_name == spec.name
+    assert _run(session.inner_session)[0] == 3.0
+
+
+def test_load_session_without_bundle_uses_rembg(monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_DIR", "")
+    monkeypatch.setattr("rembg.new_session", lambda name: f"rembg:{name}")
+
+    assert model_registry.load_session("isnet-general-use") == "rembg:isnet-general-use"
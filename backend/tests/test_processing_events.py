@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+from app.db import crud
+from app.db.models import ProcessingEvent
+from app.services import processing_events
+from tests.conftest import TestingAsyncSessionLocal
+
+HOUR = datetime(2026, 3, 14, 9)
+
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    processing_events._buffer.clear()
+    yield
+    processing_events._buffer.clear()
+    processing_events._dropped = 0
+    processing_events._failed_attempts = 0
+
+
+def flush():
+    return asyncio.run(processing_events.flush_events(TestingAsyncSessionLocal))
+
+
+def record(total_ms, minute=0, status="ok", user_id="u1"):
+    metadata = {"model": "isnet-general-use", "output_format": "png", "megapixels": 0.04,
+                "timings_ms": {"queue": total_ms / 10, "inference": total_ms / 2}}
+    processing_events.record_event(user_id, status, total_ms, metadata, bytes_in=10, bytes_out=20,
+                                   created_at=HOUR + timedelta(minutes=minute))
+
+
+def test_events_are_batched_off_the_request_path(db):
+    with patch.object(processing_events.settings, "PROCESSING_EVENTS_BATCH_SIZE", 3):
+        with patch('app.services.processing_events.crud.insert_processing_events',
+                   wraps=crud.insert_processing_events) as insert:
+            for total in range(1, 8):
+                record(total * 100.0)
+            assert db.query(ProcessingEvent).count() == 0
+
+            assert flush() == 7
+
+    assert insert.call_count == 3  # 3 + 3 + 1
+    event = db.query(ProcessingEvent).order_by(ProcessingEvent.total_ms).first()
+    assert (event.total_ms, event.queue_ms, event.inference_ms, event.model) == (100.0, 10.0, 50.0, "isnet-general-use")
+
+
+def test_failed_flush_keeps_events(db):
+    record(100.0)
+    with patch('app.services.processing_events.crud.insert_processing_events', side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            flush()
+    assert processing_events.pending_count() == 1
+    assert flush() == 1
+
+
+def test_batch_that_never_inserts_is_dropped_after_max_attempts(db):
+    record(100.0)
+    with patch.object(processing_events.settings, "PROCESSING_EVENTS_MAX_ATTEMPTS", 3), \
+            patch('app.services.processing_events.crud.insert_processing_events', side_effect=RuntimeError("no partition")):
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                flush()
+    assert processing_events.pending_count() == 0
+
+    record(200.0)
+    assert flush() == 1
+
+
+def test_requeue_into_a_full_buffer_counts_evicted_events(db):
+    def insert_while_requests_arrive(db, batch):
+        # Requests keep recording events while the insert is in flight
+        record(100.0, minute=10)
+        record(100.0, minute=11)
+        raise RuntimeError("db down")
+
+    with patch.object(processing_events, "_buffer", processing_events.deque(maxlen=3)), \
+            patch.object(processing_events.settings, "PROCESSING_EVENTS_BATCH_SIZE", 2), \
+            patch('app.services.processing_events.crud.insert_processing_events', side_effect=insert_while_requests_arrive):
+        for minute in range(3):
+            record(100.0, minute=minute)
+        with pytest.raises(RuntimeError):
+            flush()
+
+        # The requeued batch pushed the two newest events out
+        assert [event["created_at"].minute for event in processing_events._buffer] == [0, 1, 2]
+        assert processing_events._dropped == 2
+
+
+def test_percentiles_show_the_tail(db, run_db):
+    # 99 fast requests and one pathological one: the mean hides it, p99 does not
+    for i in range(99):
+        record(100.0, minute=i % 60)
+    record(60000.0)
+    record(5.0, status="failed")
+    flush()
+
+    stats = run_db(lambda session: crud.get_latency_percentiles(session, HOUR, HOUR + timedelta(hours=2)))
+
+    assert stats["count"] == 100
+    assert stats["total_ms"]["p50"] == 100.0
+    assert stats["total_ms"]["p99"] == pytest.approx(100.0 + 0.01 * (60000.0 - 100.0))
+    assert stats["total_ms"]["max"] == 60000.0
+    assert stats["decode_ms"] == {"p50": None, "p95": None, "p99": None, "max": None}
+
+
+def test_prune_respects_retention(db, run_db):
+    record(100.0)
+    processing_events.record_event("u1", "ok", 100.0, created_at=datetime(2020, 1, 1))
+    flush()
+
+    assert run_db(lambda session: crud.prune_processing_events(session, date(2026, 3, 15))) == 1
+    assert db.query(ProcessingEvent).count() == 1
+
+
+def test_admin_latency_endpoints(client, admin_headers, db):
+    for minute, total in [(0, 100.0), (10, 200.0), (70, 300.0)]:
+        record(total, minute=minute)
+    flush()
+    window = {"start": HOUR.isoformat(), "end": (HOUR + timedelta(hours=3)).isoformat()}
+
+    summary = client.get("/api/v1/admin/latency", headers=admin_headers, params=window).json()
+    assert summary["count"] == 3
+    assert summary["total_ms"]["p50"] == 200.0
+
+    series = client.get("/api/v1/admin/latency/series", headers=admin_headers, params=window).json()
+    assert [(point["count"], point["max"]) for point in series] == [(2, 200.0), (1, 300.0)]
+
+    bad = client.get("/api/v1/admin/latency/series", headers=admin_headers, params={**window, "timing": "bogus"})
+    assert bad.status_code == 400
@@ -0,0 +1,156 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from app.core.security import create_access_token
+from app.db.models import User, UserRole
+from app.services import profiling
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def make_user(db, role):
+    user = User(email=f"{role.value}@example.com", hashed_password="x", role=role)
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def admin(db):
+    return make_user(db, UserRole.ADMIN)
+
+
+def auth(user):
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.id})}"}
+
+
+def test_sampler_collapses_stacks_by_thread(busy_thread):
+    sampler = profiling.StackSampler(0.002, thread_ids={busy_thread.ident}).start()
+    time.sleep(0.2)
+    samples = sampler.stop()
+
+    assert sampler.sample_count > 10
+    stack, count = samples.most_common(1)[0]
+    assert stack[0] == "busy"
+    assert any(label.startswith("busy_loop (tests/test_profiling.py:") for label in stack)
+
+    collapsed = profiling.to_collapsed(samples)
+    assert collapsed.startswith(f"{';'.join(stack)} {count}\n")
+    assert profiling.parse_collapsed(collapsed) == samples
+
+    speedscope = profiling.to_speedscope(samples, "test", 0.002)
+    frames = [frame["name"] for frame in speedscope["shared"]["frames"]]
+    profile = speedscope["profiles"][0]
+    assert [frames[i] for i in profile["samples"][0]] == list(stack)
+    assert profile["weights"][0] == pytest.approx(count * 0.002)
+
+
+def test_profile_tokens_are_bound_to_user_and_expire():
+    token, _ = profiling.sign_profile_token("admin-1")
+    assert profiling.verify_profile_token(token, "admin-1")
+    assert not profiling.verify_profile_token(token, "admin-2")
+    assert not profiling.verify_profile_token(token[:-1] + ("0" if token[-1] != "0" else "1"), "admin-1")
+    expired, _ = profiling.sign_profile_token("admin-1", ttl_seconds=-1)
+    assert not profiling.verify_profile_token(expired, "admin-1")
+    assert not profiling.verify_profile_token("garbage", "admin-1")
+
+
+def test_sample_endpoint_is_admin_only(client, fake_redis, db):
+    user = make_user(db, UserRole.USER)
+    assert client.post("/api/v1/admin/profiling/sample?seconds=0.1", headers=auth(user)).status_code == 403
+    assert client.post("/api/v1/admin/profiling/token", headers=auth(user)).status_code == 403
+
+
+def test_sample_endpoint_returns_flame_graph(client, fake_redis, admin, busy_thread):
+    response = client.post("/api/v1/admin/profiling/sample?seconds=0.3&interval_ms=2", headers=auth(admin))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert ".collapsed.txt" in response.headers["content-disposition"]
+    assert any(line.startswith("busy;") and "busy_loop" in line for line in response.text.splitlines())
+
+    response = client.post("/api/v1/admin/profiling/sample?seconds=0.1&format=speedscope", headers=auth(admin))
+    assert response.json()["profiles"][0]["type"] == "sampled"
+
+
+def test_sample_endpoint_busy_and_rate_limited(client, fake_redis, admin, monkeypatch):
+    monkeypatch.setattr(profiling.profiling_limiter, "limit", 1)
+    with profiling._session_lock:
+        response = client.post("/api/v1/admin/profiling/sample?seconds=0.1", headers=auth(admin))
+    assert response.status_code == 409  # Does not use up the hourly budget
+
+    assert client.post("/api/v1/admin/profiling/sample?seconds=0.1", headers=auth(admin)).status_code == 200
+    response = client.post("/api/v1/admin/profiling/sample?seconds=0.1", headers=auth(admin))
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+
+def slow_remove(image, only_mask=False, **kwargs):
+    deadline = time.perf_counter() + 0.15
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+    return Image.new('L', image.size, 0)
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=slow_remove)
+def test_profile_header_profiles_one_request(mock_remove, mock_session, client, fake_redis, admin, sample_image_bytes):
+    token = client.post("/api/v1/admin/profiling/token", headers=auth(admin)).json()["token"]
+    response = client.post(
+        "/api/v1/process",
+        headers={**auth(admin), profiling.PROFILE_TOKEN_HEADER: token},
+        files={"file": ("photo.jpg", sample_image_bytes, "image/jpeg")}
+    )
+    assert response.status_code == 200
+    profile_id = response.headers[profiling.PROFILE_ID_HEADER]
+
+    result = client.get(f"/api/v1/admin/profiling/results/{profile_id}", headers=auth(admin))
+    assert result.status_code == 200
+    assert "slow_remove" in result.text
+    assert all("remove_background" in line for line in result.text.splitlines())
+
+    assert client.get("/api/v1/admin/profiling/results/missing", headers=auth(admin)).status_code == 404
+
+
+@patch('app.services.background_removal.get_session')
+def test_invalid_profile_token_is_ignored(mock_session, client, fake_redis, admin, mock_rembg, sample_image_bytes):
+    response = client.post(
+        "/api/v1/process",
+        headers={**auth(admin), profiling.PROFILE_TOKEN_HEADER: "123.forged"},
+        files={"file": ("photo.jpg", sample_image_bytes, "image/jpeg")}
+    )
+    assert response.status_code == 200
+    assert response.headers[profiling.PROFILE_SKIPPED_HEADER] == "invalid token"
+    assert profiling.PROFILE_ID_HEADER not in response.headers
+
+
+@patch('app.services.background_removal.get_session')
+@patch('app.services.background_removal.remove', side_effect=slow_remove)
+def test_rejected_request_gives_back_its_profile_slot(mock_remove, mock_session, client, fake_redis, admin,
+                                                      sample_image_bytes, monkeypatch):
+    monkeypatch.setattr(profiling.profiling_limiter, "limit", 1)
+    token = client.post("/api/v1/admin/profiling/token", headers=auth(admin)).json()["token"]
+    headers = {**auth(admin), profiling.PROFILE_TOKEN_HEADER: token}
+
+    response = client.post("/api/v1/process", headers=headers, files={"file": ("notes.txt", b"not an image", "text/plain")})
+    assert response.status_code == 400
+
+    response = client.post("/api/v1/process", headers=headers, files={"file": ("photo.jpg", sample_image_bytes, "image/jpeg")})
+    assert response.status_code == 200
+    assert profiling.PROFILE_ID_HEADER in response.headers
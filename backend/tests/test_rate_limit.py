@@ -0,0 +1,108 @@
+import pytest
+from io import BytesIO
+from PIL import Image
+from unittest.mock import patch
+
+from app.services.rate_limit import SlidingWindowLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(fake_redis, clock):
+    return SlidingWindowLimiter("test", limit=3, window_seconds=60, near_cache_seconds=0, clock=clock)
+
+
+@pytest.mark.asyncio
+async def test_acquire_until_limit(limiter):
+    """Hits are allowed up to the limit, then rejected with a retry hint."""
+    results = [await limiter.acquire("1.2.3.4") for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert results[2].remaining == 0
+    assert results[3].retry_after == 60
+
+
+@pytest.mark.asyncio
+async def test_window_slides(limiter, clock):
+    """Old hits fall out of the window and free their slots."""
+    await limiter.acquire("ip")
+    clock.now += 30
+    await limiter.acquire("ip")
+    await limiter.acquire("ip")
+    assert (await limiter.acquire("ip")).allowed is False
+
+    clock.now += 31  # First hit is now older than 60s
+    assert (await limiter.peek("ip")).used == 2
+    assert (await limiter.acquire("ip")).allowed is True
+
+
+@pytest.mark.asyncio
+async def test_release_gives_back_hit(limiter):
+    """A released reservation no longer counts against the key."""
+    first = await limiter.acquire("ip")
+    await limiter.release("ip", first.token)
+
+    assert (await limiter.peek("ip")).used == 0
+
+
+@pytest.mark.asyncio
+async def test_keys_expire_in_redis(limiter, fake_redis):
+    """Idle keys carry a TTL so Redis never grows without bound."""
+    await limiter.acquire("ip")
+
+    ttl = fake_redis.pttl("ratelimit:test:ip")
+    assert 0 < ttl <= 60_000
+
+
+@pytest.mark.asyncio
+async def test_near_cache_skips_redis_for_exhausted_key(fake_redis, clock):
+    """Once a key is exhausted, rejections are served from the local cache."""
+    limiter = SlidingWindowLimiter("cached", limit=1, window_seconds=60, near_cache_seconds=5, clock=clock)
+    await limiter.acquire("ip")
+    assert (await limiter.acquire("ip")).allowed is False
+
+    with patch.object(limiter, "_scripts", side_effect=AssertionError("Redis was called")):
+        assert (await limiter.acquire("ip")).allowed is False
+        assert (await limiter.peek("ip")).remaining == 0
+
+
+@patch('app.services.background_removal.get_session')
+def test_anonymous_endpoints_share_limiter(mock_session, client, fake_redis, mock_rembg):
+    """/process-anonymous consumes tries and /anonymous-usage reports them."""
+    buffer = BytesIO()
+    Image.new('RGB', (100, 100), color='red').save(buffer, format='JPEG')
+
+    response = client.post(
+        "/api/v1/process-anonymous",
+        files={"file": ("test.jpg", buffer.getvalue(), "image/jpeg")}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Remaining-Tries"] == "4"
+
+    usage = client.get("/api/v1/anonymous-usage").json()
+    assert usage["used"] == 1
+    assert usage["remaining"] == 4
+
+
+def test_failed_anonymous_request_does_not_consume_try(client, fake_redis):
+    """Rejected uploads hand their reserved try back."""
+    response = client.post(
+        "/api/v1/process-anonymous",
+        files={"file": ("test.txt", b"not an image", "text/plain")}
+    )
+    assert response.status_code == 400
+
+    usage = client.get("/api/v1/anonymous-usage").json()
+    assert usage["used"] == 0
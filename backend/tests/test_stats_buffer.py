@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.db.models import User
+from app.services import stats_buffer
+from tests.conftest import TestingAsyncSessionLocal
+
+
+@pytest.fixture
+def user(db):
+    user = User(
+        email="stats@example.com",
+        hashed_password="x",
+        total_images_processed=10,
+        images_processed_today=4,
+        last_upload_date=date.today() - timedelta(days=1),
+        total_processing_time=20.0
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def record(user_id, seconds, day=None):
+    async def run():
+        async with TestingAsyncSessionLocal() as session:
+            await stats_buffer.record_processing(session, user_id, seconds, day=day)
+    asyncio.run(run())
+
+
+def flush():
+    return asyncio.run(stats_buffer.flush_pending_stats(TestingAsyncSessionLocal))
+
+
+def pending(user_id):
+    return asyncio.run(stats_buffer.get_pending_stats(user_id))
+
+
+def test_record_buffers_until_flush(fake_redis, user, db):
+    """Increments stay in Redis until the flush applies them in one batch."""
+    for _ in range(3):
+        record(user.id, 2.0)
+
+    db.refresh(user)
+    assert user.total_images_processed == 10
+    assert pending(user.id) == {"images": 3, "seconds": 6.0}
+
+    assert flush() == 1
+
+    db.refresh(user)
+    assert user.total_images_processed == 13
+    assert user.images_processed_today == 3  # Rolled over from yesterday's 4
+    assert user.last_upload_date == date.today()
+    assert user.total_processing_time == pytest.approx(26.0)
+    assert fake_redis.smembers(stats_buffer.DAYS_KEY) == set()
+    assert fake_redis.zcard(stats_buffer.PROCESSING_KEY) == 0
+
+
+def test_flush_applies_days_in_order(fake_redis, user, db):
+    today = date.today()
+    record(user.id, 1.0, day=today - timedelta(days=1))
+    record(user.id, 1.0, day=today)
+    record(user.id, 1.0, day=today)
+
+    flush()
+
+    db.refresh(user)
+    assert user.total_images_processed == 13
+    assert user.images_processed_today == 2
+    assert user.last_upload_date == today
+
+
+def test_stats_endpoint_includes_pending(client, fake_redis, user):
+    from app.core.security import create_access_token
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user.id})}"}
+    record(user.id, 3.0)
+
+    stats = client.get("/api/v1/stats", headers=headers).json()
+
+    assert stats["total_images_processed"] == 11
+    assert stats["images_processed_today"] == 1
+
+
+def test_failed_flush_restores_deltas(fake_redis, user):
+    record(user.id, 2.0)
+
+    with patch('app.services.stats_buffer.crud.apply_user_stats_deltas', side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            flush()
+
+    assert pending(user.id) == {"images": 1, "seconds": 2.0}
+
+
+def test_writes_through_when_redis_down(fake_redis, user, db):
+    with patch('app.services.stats_buffer.get_async_redis', side_effect=RedisConnectionError("down")):
+        record(user.id, 2.0)
+
+    db.refresh(user)
+    assert user.total_images_processed == 11
+    assert user.images_processed_today == 1
+
+
+def test_claim_left_by_dead_flusher_is_replayed_once_stale(fake_redis, user, db, monkeypatch):
+    """Deltas claimed by a flusher that died before its commit are not lost."""
+    record(user.id, 2.0)
+
+    async def claim_and_die():
+        client = stats_buffer.get_async_redis()
+        return await stats_buffer._claim_day(client, date.today().isoformat())
+    processing_key = asyncio.run(claim_and_die())
+
+    assert flush() == 0  # A fresh claim may still be in flight elsewhere
+    db.refresh(user)
+    assert user.total_images_processed == 10
+
+    monkeypatch.setattr(stats_buffer.settings, "STATS_PROCESSING_STALE_SECONDS", 0.0)
+    assert flush() == 1
+    db.refresh(user)
+    assert user.total_images_processed == 11
+    assert not fake_redis.exists(processing_key)
+    assert flush() == 0
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.concurrency import run_in_threadpool
+
+from app.core import tracing
+from app.core.tracing import (
+    FileExporter, InMemoryExporter, SpanContext, instrument_celery, instrument_sqlalchemy,
+    parse_traceparent, record_span, span, tracer
+)
+
+
+@pytest.fixture
+def spans():
+    """Record every trace in memory for the duration of the test."""
+    exporter = InMemoryExporter()
+    previous = (tracer.exporter, tracer.sample_ratio)
+    tracer.configure(exporter, 1.0)
+    yield exporter.spans
+    tracer.configure(*previous)
+
+
+def by_name(spans, name):
+    return next(s for s in spans if s["name"] == name)
+
+
+def test_traceparent_round_trip():
+    context = SpanContext(0x4BF92F3577B34DA6A3CE929D0E0E4736, 0x00F067AA0BA902B7, True)
+    header = context.traceparent()
+    assert header == "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    assert parse_traceparent(header) == context
+    assert parse_traceparent(header[:-2] + "00").sampled is False
+    for bad in (None, "", "00-xyz-00f067aa0ba902b7-01", "00-" + "0" * 32 + "-00f067aa0ba902b7-01", "garbage"):
+        assert parse_traceparent(bad) is None
+
+
+def test_spans_nest_across_threadpool_and_record_stages(spans):
+    async def handler():
+        with span("request"):
+            def work():
+                with span("inner"):
+                    started = time.perf_counter()
+                    record_span("stage", started, started + 0.01)
+            await run_in_threadpool(work)
+
+    asyncio.run(handler())
+    request, inner, stage = by_name(spans, "request"), by_name(spans, "inner"), by_name(spans, "stage")
+    assert request["parent_span_id"] is None
+    assert inner["parent_span_id"] == request["span_id"]
+    assert stage["parent_span_id"] == inner["span_id"]
+    assert {request["trace_id"], inner["trace_id"], stage["trace_id"]} == {request["trace_id"]}
+    assert stage["duration_ms"] == pytest.approx(10, abs=0.1)
+
+
+def test_exception_marks_span_failed(spans):
+    with pytest.raises(ValueError):
+        with span("s3.get_object"):
+            raise ValueError("NoSuchKey")
+    failed = by_name(spans, "s3.get_object")
+    assert failed["status"] == "error"
+    assert failed["attributes"]["exception.type"] == "ValueError"
+
+
+def test_unsampled_traces_record_nothing_but_propagate(spans):
+    tracer.configure(tracer.exporter, 0.0)
+    with span("request") as root:
+        assert not root.recording
+        with span("child") as child:
+            assert child.context.trace_id == root.context.trace_id
+            assert tracing.inject({})["traceparent"].endswith("-00")
+    assert spans == []
+
+    # A sampled caller's decision wins over the local ratio
+    parent = SpanContext(1, 2, True)
+    with tracer.span("request", parent):
+        pass
+    assert by_name(spans, "request")["parent_span_id"] == f"{2:016x}"
+
+
+def test_unsampled_span_overhead_is_negligible():
+    tracer_ = tracing.Tracer(InMemoryExporter(), 0.0)
+    started = time.perf_counter()
+    for _ in range(10000):
+        with tracer_.span("request"):
+            pass
+    assert (time.perf_counter() - started) / 10000 < 50e-6
+
+
+def test_http_requests_continue_the_callers_trace(client, spans):
+    parent = SpanContext(0xABC, 0xDEF, True)
+    response = client.get("/", headers={"traceparent": parent.traceparent()})
+    assert response.status_code == 200
+    server = by_name(spans, "GET /")
+    assert server["trace_id"] == f"{0xABC:032x}"
+    assert server["parent_span_id"] == f"{0xDEF:016x}"
+    assert server["attributes"]["http.status_code"] == 200
+    assert response.headers["X-Trace-Id"] == server["trace_id"]
+
+
+def test_trace_crosses_celery_headers(spans):
+    from celery import signals
+    instrument_celery()
+
+    # Publisher side: the API enqueues inside its request span
+    headers = {}
+    with span("POST /api/v1/upload"):
+        signals.before_task_publish.send(sender="process_background_removal", headers=headers, body=None)
+    assert "traceparent" in headers
+
+    # Worker side: Celery exposes custom message headers on task.request
+    class Task:
+        name = "process_background_removal"
+        request = SimpleNamespace(traceparent=headers["traceparent"], headers=None, retries=1)
+
+    task = Task()
+    signals.task_prerun.send(sender=task, task_id="t-1", task=task, args=(), kwargs={})
+    with span("s3.get_object"):
+        pass
+    signals.task_postrun.send(sender=task, task_id="t-1", task=task, args=(), kwargs={}, retval=None, state="SUCCESS")
+    assert tracing.current_context() is None
+
+    api = by_name(spans, "POST /api/v1/upload")
+    task_span = by_name(spans, "celery.task process_background_removal")
+    assert task_span["trace_id"] == api["trace_id"]
+    assert task_span["parent_span_id"] == api["span_id"]
+    assert task_span["attributes"]["celery.state"] == "SUCCESS"
+    assert task_span["attributes"]["celery.retries"] == 1
+    assert by_name(spans, "s3.get_object")["parent_span_id"] == task_span["span_id"]
+
+
+def test_async_queries_are_children_of_the_current_span(spans, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'trace.db'}")
+    instrument_sqlalchemy(engine.sync_engine)
+
+    async def query():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))  # No current span: not traced
+            with span("request"):
+                await conn.execute(text("SELECT 2"))
+        await engine.dispose()
+
+    asyncio.run(query())
+    queries = [s for s in spans if s["name"] == "db.query"]
+    assert [q["attributes"]["db.statement"] for q in queries] == ["SELECT 2"]
+    assert queries[0]["parent_span_id"] == by_name(spans, "request")["span_id"]
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer_ = tracing.Tracer(FileExporter(str(path)), 1.0)
+    with tracer_.span("request", **{"http.method": "GET"}):
+        with tracer_.span("encode"):
+            pass
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["encode", "request"]
+    assert lines[1]["attributes"] == {"http.method": "GET"}
@@ -0,0 +1,156 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from starlette.requests import Request
+
+from app.services.upload import read_image_upload
+
+BOUNDARY = "testboundary"
+CHUNK = 16 * 1024
+
+
+def image_bytes(size=(100, 100), format="PNG") -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", size, color="red").save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def multipart_body(data: bytes, content_type: str = "image/png", filename: str = "test.png") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class StreamedBody:
+    """ASGI receive() that hands out the body in chunks and counts how many were read."""
+
+    def __init__(self, body: bytes):
+        self.chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)]
+        self.read = 0
+
+    async def __call__(self):
+        self.read += 1
+        more = self.read < len(self.chunks)
+        return {"type": "http.request", "body": self.chunks[self.read - 1], "more_body": more}
+
+
+def make_request(body: bytes, content_length: bool = True):
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    receive = StreamedBody(body)
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive), receive
+
+
+def read(request, **kwargs):
+    return asyncio.run(read_image_upload(request, **kwargs))
+
+
+def test_valid_upload_returns_data_and_info():
+    data = image_bytes((120, 80))
+    request, _ = make_request(multipart_body(data))
+
+    upload = read(request)
+
+    assert upload.data == data
+    assert upload.filename == "test.png"
+    assert upload.info["format"] == "PNG"
+    assert (upload.info["width"], upload.info["height"]) == (120, 80)
+
+
+def test_content_length_over_limit_rejected_before_reading():
+    request, receive = make_request(multipart_body(b"\0" * 300_000))
+
+    with pytest.raises(HTTPException) as exc:
+        read(request, max_bytes=100_000)
+
+    assert exc.value.status_code == 413
+    assert receive.read == 0
+
+
+def test_oversized_stream_aborts_at_the_limit():
+    """Without a Content-Length the limit is enforced as the image part grows."""
+    data = image_bytes() + b"\0" * 300_000
+    request, receive = make_request(multipart_body(data), content_length=False)
+
+    with pytest.raises(HTTPException) as exc:
+        read(request, max_bytes=100_000)
+
+    assert exc.value.status_code == 413
+    assert receive.read < len(receive.chunks)
+
+
+def test_bad_dimensions_rejected_from_header_bytes():
+    """A PNG's size is in its first bytes; the rest of the body is never read."""
+    data = image_bytes((5000, 60)) + b"\0" * 200_000
+    request, receive = make_request(multipart_body(data))
+
+    with pytest.raises(HTTPException) as exc:
+        read(request)
+
+    assert exc.value.status_code == 400
+    assert "too large" in exc.value.detail
+    assert receive.read == 1
+
+
+def test_non_image_part_rejected_at_part_headers():
+    request, receive = make_request(multipart_body(b"x" * 200_000, content_type="text/plain"))
+
+    with pytest.raises(HTTPException) as exc:
+        read(request)
+
+    assert exc.value.status_code == 400
+    assert receive.read == 1
+
+
+def test_unidentifiable_file_rejected():
+    request, _ = make_request(multipart_body(b"not an image"))
+
+    with pytest.raises(HTTPException) as exc:
+        read(request)
+
+    assert exc.value.status_code == 400
+    assert "Invalid image file" in exc.value.detail
+
+
+def test_endpoint_rejects_oversized_upload(client, fake_redis, monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "MAX_IMAGE_SIZE_MB", 1)
+
+    response = client.post(
+        "/api/v1/process-anonymous",
+        files={"file": ("big.png", b"\0" * (2 * 1024 * 1024), "image/png")}
+    )
+
+    assert response.status_code == 413
+    assert client.get("/api/v1/anonymous-usage").json()["used"] == 0
+
+
+def test_webp_is_checked_once_complete(monkeypatch):
+    """WebP cannot be opened from a prefix, so it is not failed by the sniff limit."""
+    monkeypatch.setattr("app.services.upload.SNIFF_LIMIT_BYTES", 100)
+    data = image_bytes((100, 100), format="WEBP")
+    request, _ = make_request(multipart_body(data, content_type="image/webp", filename="test.webp"))
+
+    upload = read(request)
+
+    assert upload.info["format"] == "WEBP"
+    assert upload.estimate.pixels == 10_000
+
+
+def test_pixel_budget_rejected_from_header(monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "MAX_IMAGE_PIXELS", 5_000)
+    request, receive = make_request(multipart_body(image_bytes((100, 100)) + b"\0" * 100_000))
+
+    with pytest.raises(HTTPException) as exc:
+        read(request)
+
+    assert exc.value.status_code == 400
+    assert "megapixels" in exc.value.detail
+    assert receive.read == 1
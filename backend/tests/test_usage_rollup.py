@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.db import crud
+from app.db.models import User, UsageDaily, UsageHourly, GLOBAL_SUBJECT, ANONYMOUS_SUBJECT
+from app.services import usage_rollup
+from tests.conftest import TestingAsyncSessionLocal
+
+NOW = datetime(2026, 3, 14, 9, 30)
+
+
+@pytest.fixture(autouse=True)
+def empty_local_buffer():
+    usage_rollup._take_local()
+    yield
+    usage_rollup._take_local()
+
+
+def flush():
+    return asyncio.run(usage_rollup.flush_usage_rollups(TestingAsyncSessionLocal))
+
+
+def daily(db, subject, day=NOW.date()):
+    db.expire_all()
+    return db.get(UsageDaily, (day, subject))
+
+
+def test_flush_upserts_per_user_anonymous_and_global(fake_redis, db):
+    usage_rollup.record_usage("u1", images=1, processing_seconds=2.0, bytes_in=100, bytes_out=300, now=NOW)
+    usage_rollup.record_usage("u1", images=1, processing_seconds=1.0, bytes_in=50, bytes_out=150, now=NOW)
+    usage_rollup.record_usage(None, failures=1, bytes_in=10, now=NOW)
+
+    assert flush() == 4  # u1, anonymous, global daily + one hour
+
+    user = daily(db, "u1")
+    assert (user.images, user.processing_seconds, user.bytes_in, user.bytes_out, user.failures) == (2, 3.0, 150, 450, 0)
+    assert daily(db, ANONYMOUS_SUBJECT).failures == 1
+    total = daily(db, GLOBAL_SUBJECT)
+    assert (total.images, total.bytes_in, total.failures) == (2, 160, 1)
+    assert db.get(UsageHourly, datetime(2026, 3, 14, 9)).images == 2
+    assert fake_redis.smembers(usage_rollup.BUCKETS_KEY) == set()
+
+    # A second flush adds to the existing rows instead of replacing them
+    usage_rollup.record_usage("u1", images=1, processing_seconds=1.0, now=NOW)
+    flush()
+    assert daily(db, "u1").images == 3
+    assert daily(db, GLOBAL_SUBJECT).images == 3
+
+
+def test_failed_flush_keeps_deltas(fake_redis, db):
+    usage_rollup.record_usage("u1", images=1, processing_seconds=2.0, now=NOW)
+
+    with patch('app.services.usage_rollup.crud.apply_usage_rollups', side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            flush()
+
+    flush()
+    assert daily(db, "u1").images == 1
+
+
+def test_claim_left_by_dead_flusher_is_replayed_once_stale(fake_redis, db, monkeypatch):
+    """Parked deltas claimed by a flusher that died before its commit are not lost."""
+    usage_rollup.record_usage("u1", images=1, now=NOW)
+    with patch('app.services.usage_rollup.crud.apply_usage_rollups', side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            flush()  # Parks the deltas in Redis
+    assert fake_redis.smembers(usage_rollup.BUCKETS_KEY)
+
+    async def claim_and_die():
+        client = usage_rollup.get_async_redis()
+        return [await usage_rollup._claim_bucket(client, bucket) for bucket in await client.smembers(usage_rollup.BUCKETS_KEY)]
+    processing_keys = asyncio.run(claim_and_die())
+
+    assert flush() == 0  # A fresh claim may still be in flight elsewhere
+    assert daily(db, "u1") is None
+
+    monkeypatch.setattr(usage_rollup.settings, "USAGE_ROLLUP_PROCESSING_STALE_SECONDS", 0.0)
+    assert flush() == 3
+    assert daily(db, "u1").images == 1
+    assert not any(fake_redis.exists(key) for key in processing_keys)
+    assert flush() == 0
+
+
+def test_redis_down_holds_deltas_locally(fake_redis, db):
+    usage_rollup.record_usage("u1", images=1, bytes_in=5, now=NOW)
+    with patch('app.services.usage_rollup.get_async_redis', side_effect=RedisConnectionError("down")):
+        with patch('app.services.usage_rollup.crud.apply_usage_rollups', side_effect=RuntimeError("db down")):
+            with pytest.raises(RuntimeError):
+                flush()
+        flush()
+
+    assert daily(db, "u1").bytes_in == 5
+
+
+def test_record_usage_does_no_redis_io(fake_redis, db):
+    with patch('app.services.usage_rollup.get_async_redis', side_effect=AssertionError("Redis on the request path")):
+        usage_rollup.record_usage("u1", images=1, now=NOW)
+
+    assert flush() == 3
+    assert daily(db, "u1").images == 1
+
+
+def test_compaction_keeps_global_history(db, run_db):
+    today = date(2026, 3, 14)
+    old_day = today - timedelta(days=400)
+    db.add_all([
+        UsageDaily(day=old_day, subject="u1", images=1, processing_seconds=1.0, bytes_in=0, bytes_out=0, failures=0),
+        UsageDaily(day=old_day, subject=GLOBAL_SUBJECT, images=1, processing_seconds=1.0, bytes_in=0, bytes_out=0, failures=0),
+        UsageDaily(day=today, subject="u1", images=1, processing_seconds=1.0, bytes_in=0, bytes_out=0, failures=0),
+        UsageHourly(hour=datetime(2026, 1, 1, 5), images=1, processing_seconds=1.0, bytes_in=0, bytes_out=0, failures=0),
+        UsageHourly(hour=datetime(2026, 3, 14, 5), images=1, processing_seconds=1.0, bytes_in=0, bytes_out=0, failures=0),
+    ])
+    db.commit()
+
+    deleted = run_db(lambda session: crud.compact_usage_rollups(session, today))
+
+    assert deleted == {"usage_hourly": 1, "usage_daily": 1}
+    assert daily(db, GLOBAL_SUBJECT, old_day) is not None
+    assert daily(db, "u1", old_day) is None
+
+
+def test_admin_usage_endpoints(client, admin_headers, fake_redis, db):
+    today = date.today()
+    user = User(email="heavy@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    usage_rollup.record_usage(user.id, images=1, processing_seconds=4.0)
+    usage_rollup.record_usage(user.id, images=1, processing_seconds=2.0)
+    usage_rollup.record_usage(None, images=1, processing_seconds=1.0)
+    flush()
+
+    series = client.get("/api/v1/admin/usage/daily", headers=admin_headers).json()
+    assert series == [{
+        "day": today.isoformat(), "images": 3, "processing_seconds": 7.0, "bytes_in": 0,
+        "bytes_out": 0, "failures": 0, "avg_processing_seconds": 2.333
+    }]
+    anonymous = client.get("/api/v1/admin/usage/daily", headers=admin_headers, params={"subject": "anonymous"}).json()
+    assert anonymous[0]["images"] == 1
+
+    hourly = client.get("/api/v1/admin/usage/hourly", headers=admin_headers).json()
+    assert sum(point["images"] for point in hourly) == 3
+
+    top = client.get("/api/v1/admin/usage/top-users", headers=admin_headers).json()
+    assert [(row["email"], row["images"]) for row in top] == [("heavy@example.com", 2)]
+
+    response = client.get("/api/v1/admin/usage/daily", headers=admin_headers,
+                          params={"start": today.isoformat(), "end": (today - timedelta(days=1)).isoformat()})
+    assert response.status_code == 400
@@ -38,11 +38,11 @@ export default function AdminDashboard() {
       
       const [statsData, usersData] = await Promise.all([
         adminApi.getStats(),
-        adminApi.getUsers(0, 10), // Get 10 most recent users
+        adminApi.getUsers({ limit: 10 }), // First page = 10 most recent users
       ]);
       
       setStats(statsData);
-      setRecentUsers(usersData);
+      setRecentUsers(usersData.items);
       setLastRefresh(new Date());
     } catch (err: any) {
       console.error("Failed to fetch admin data:", err);
@@ -19,35 +19,77 @@ import {
   MoreVertical,
 } from "lucide-react";
 
+const PAGE_SIZE = 50;
+const SEARCH_DEBOUNCE_MS = 300;
+
 export default function UsersManagement() {
   const [users, setUsers] = useState<AdminUser[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [totalUsers, setTotalUsers] = useState<number | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchQuery, setSearchQuery] = useState("");
+  const [emailPrefix, setEmailPrefix] = useState("");
+
+  useEffect(() => {
+    const timer = setTimeout(() => setEmailPrefix(searchQuery.trim()), SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
 
   useEffect(() => {
+    // A new query starts from the first page; a slower response for an older query is ignored
+    let cancelled = false;
+    setNextCursor(null);
+
+    const fetchUsers = async () => {
+      try {
+        const page = await adminApi.getUsers({
+          limit: PAGE_SIZE,
+          emailPrefix,
+          includeTotal: !emailPrefix,
+        });
+        if (cancelled) return;
+        setUsers(page.items);
+        setNextCursor(page.next_cursor);
+        if (!emailPrefix) {
+          setTotalUsers(page.total_estimate);
+        }
+      } catch (err: any) {
+        if (cancelled) return;
+        console.error("Failed to fetch users:", err);
+        if (err.response?.status !== 401) {
+          alert("Failed to load users");
+        }
+      } finally {
+        if (!cancelled) {
+          setLoading(false);
+        }
+      }
+    };
+
     fetchUsers();
-  }, []);
+    return () => {
+      cancelled = true;
+    };
+  }, [emailPrefix]);
 
-  const fetchUsers = async () => {
+  const loadMoreUsers = async () => {
+    if (!nextCursor) return;
     try {
-      setLoading(true);
-      const data = await adminApi.getUsers(0, 100);
-      setUsers(data);
+      setLoadingMore(true);
+      const page = await adminApi.getUsers({ limit: PAGE_SIZE, cursor: nextCursor, emailPrefix });
+      setUsers((loaded) => [...loaded, ...page.items]);
+      setNextCursor(page.next_cursor);
     } catch (err: any) {
-      console.error("Failed to fetch users:", err);
+      console.error("Failed to fetch more users:", err);
       if (err.response?.status !== 401) {
-        alert("Failed to load users");
+        alert("Failed to load more users");
       }
     } finally {
-      setLoading(false);
+      setLoadingMore(false);
     }
   };
 
-  const filteredUsers = users.filter((user) =>
-    user.email.toLowerCase().includes(searchQuery.toLowerCase()) ||
-    user.name?.toLowerCase().includes(searchQuery.toLowerCase())
-  );
-
   const handleDeleteUser = async (userId: string) => {
     if (!confirm("Are you sure you want to delete this user? This action cannot be undone.")) {
       return;
@@ -56,6 +98,7 @@ export default function UsersManagement() {
     try {
       await adminApi.deleteUser(userId);
       setUsers(users.filter((u) => u.id !== userId));
+      setTotalUsers((total) => (total === null ? null : total - 1));
       alert("User deleted successfully");
     } catch (err) {
       console.error("Failed to delete user:", err);
@@ -80,7 +123,7 @@ export default function UsersManagement() {
           <p className="text-gray-600 dark:text-gray-400 mt-1">Manage all registered users</p>
         </div>
         <div className="text-right">
-          <p className="text-3xl font-bold text-gray-900 dark:text-gray-100">{users.length}</p>
+          <p className="text-3xl font-bold text-gray-900 dark:text-gray-100">{totalUsers ?? users.length}</p>
           <p className="text-sm text-gray-600 dark:text-gray-400">Total Users</p>
         </div>
       </div>
@@ -92,7 +135,7 @@ export default function UsersManagement() {
             {/* Search */}
             <div className="flex-1">
               <Input
-                placeholder="Search users by email or name..."
+                placeholder="Search users by email..."
                 value={searchQuery}
                 onChange={(e) => setSearchQuery(e.target.value)}
                 icon={<Search className="w-5 h-5" />}
@@ -119,14 +162,14 @@ export default function UsersManagement() {
       </Card>
 
       {/* Users Table */}
-      {filteredUsers.length === 0 ? (
+      {users.length === 0 ? (
         <Card>
           <CardContent className="p-12">
             <EmptyState
               icon={Users}
-              title={searchQuery ? "No users found" : "No users yet"}
+              title={emailPrefix ? "No users found" : "No users yet"}
               description={
-                searchQuery
+                emailPrefix
                   ? "Try adjusting your search query"
                   : "Users will appear here once they register"
               }
@@ -156,7 +199,7 @@ export default function UsersManagement() {
                   </tr>
                 </thead>
                 <tbody className="divide-y divide-gray-200 dark:divide-gray-700">
-                  {filteredUsers.map((user) => (
+                  {users.map((user) => (
                     <tr
                       key={user.id}
                       className="hover:bg-gray-50 dark:hover:bg-gray-800 transition-colors"
@@ -229,7 +272,7 @@ export default function UsersManagement() {
 
             {/* Mobile Card View */}
             <div className="md:hidden divide-y divide-gray-200 dark:divide-gray-700">
-              {filteredUsers.map((user) => (
+              {users.map((user) => (
                 <div key={user.id} className="p-6 space-y-4">
                   <div className="flex items-start justify-between">
                     <div className="flex items-center gap-3">
@@ -272,6 +315,15 @@ export default function UsersManagement() {
           </CardContent>
         </Card>
       )}
+
+      {/* Pagination (search filters the users loaded so far) */}
+      {nextCursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={loadMoreUsers} disabled={loadingMore}>
+            {loadingMore ? "Loading..." : `Load more users (${users.length} shown)`}
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
@@ -16,6 +16,20 @@ export interface AdminUser {
   created_at: string;
 }
 
+// One page of GET /admin/users (newest first, keyset-paginated)
+export interface AdminUserPage {
+  items: AdminUser[];
+  next_cursor: string | null; // Pass back as `cursor` for the next page
+  total_estimate: number | null; // Only when includeTotal is set
+}
+
+export interface AdminUserQuery {
+  limit?: number; // Max 200
+  cursor?: string | null;
+  emailPrefix?: string;
+  includeTotal?: boolean;
+}
+
 export interface AdminUpload {
   id: string;
   user_id: string;
@@ -36,10 +50,15 @@ export const adminApi = {
     return response.data;
   },
 
-  // Get all users
-  async getUsers(skip = 0, limit = 100): Promise<AdminUser[]> {
+  // Get one page of users; pass the returned next_cursor to get the next one
+  async getUsers({ limit = 50, cursor, emailPrefix, includeTotal = false }: AdminUserQuery = {}): Promise<AdminUserPage> {
     const response = await apiClient.get("/admin/users", {
-      params: { skip, limit },
+      params: {
+        limit,
+        cursor: cursor || undefined,
+        email_prefix: emailPrefix || undefined,
+        include_total: includeTotal || undefined,
+      },
     });
     return response.data;
   },
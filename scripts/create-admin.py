@@ -4,6 +4,7 @@ Script to create an admin user in the database.
 Usage: python scripts/create-admin.py
 """
 
+import asyncio
 import sys
 import os
 from getpass import getpass
@@ -11,12 +12,12 @@ from getpass import getpass
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from app.db.base import SessionLocal
+from app.db.base import AsyncSessionLocal, async_engine
 from app.db import crud
 from app.db.models import UserRole
 
 
-def create_admin_user():
+async def create_admin_user():
     """Create an admin user interactively."""
     print("=== Create Admin User ===\n")
     
@@ -39,40 +40,45 @@ def create_admin_user():
         print("Error: Password must be at least 8 characters")
         return
     
-    # Create user
-    db = SessionLocal()
+    # Create user (the CRUD layer is async, like the API that shares it)
+    async with AsyncSessionLocal() as db:
+        try:
+            # Check if user already exists
+            existing_user = await crud.get_user_by_email(db, email)
+            if existing_user:
+                print(f"Error: User with email {email} already exists")
+                return
+
+            # Create admin user
+            admin = await crud.create_user(
+                db=db,
+                email=email,
+                password=password,
+                name=name,
+                role=UserRole.ADMIN
+            )
+
+            print(f"\n✓ Admin user created successfully!")
+            print(f"  Email: {admin.email}")
+            print(f"  Name: {admin.name or 'N/A'}")
+            print(f"  Role: {admin.role}")
+            print(f"  ID: {admin.id}")
+
+        except Exception as e:
+            print(f"Error creating admin user: {e}")
+
+
+async def main():
     try:
-        # Check if user already exists
-        existing_user = crud.get_user_by_email(db, email)
-        if existing_user:
-            print(f"Error: User with email {email} already exists")
-            return
-        
-        # Create admin user
-        admin = crud.create_user(
-            db=db,
-            email=email,
-            password=password,
-            name=name,
-            role=UserRole.ADMIN
-        )
-        
-        print(f"\n✓ Admin user created successfully!")
-        print(f"  Email: {admin.email}")
-        print(f"  Name: {admin.name or 'N/A'}")
-        print(f"  Role: {admin.role}")
-        print(f"  ID: {admin.id}")
-        
-    except Exception as e:
-        print(f"Error creating admin user: {e}")
+        await create_admin_user()
     finally:
-        db.close()
+        # Close pooled connections inside the loop that opened them
+        await async_engine.dispose()
 
 
 if __name__ == "__main__":
     try:
-        create_admin_user()
+        asyncio.run(main())
     except KeyboardInterrupt:
         print("\n\nOperation cancelled by user")
         sys.exit(0)
-